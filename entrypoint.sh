@@ -17,5 +17,5 @@ python manage.py makemigrations
 python manage.py migrate
 python manage.py collectstatic --noinput
 
-# Start the server
-exec python manage.py runserver 0.0.0.0:8000
\ No newline at end of file
+# Start the ASGI server so streaming endpoints hold connections without tying up threads
+exec uvicorn file_processor.asgi:application --host 0.0.0.0 --port 8000
\ No newline at end of file
@@ -1,9 +1,26 @@
 import os
 from celery import Celery
+from celery.signals import worker_init, worker_process_shutdown
 
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "file_processor.settings")
 
 app = Celery("file_processor")
 app.config_from_object("django.conf:settings", namespace="CELERY")
-app.autodiscover_tasks()
\ No newline at end of file
+app.autodiscover_tasks()
+
+
+@worker_init.connect
+def start_metrics_exporter(**kwargs):
+    from django.conf import settings
+    from files.metrics import start_worker_exporter
+
+    if settings.WORKER_METRICS_PORT:
+        start_worker_exporter(settings.WORKER_METRICS_PORT)
+
+
+@worker_process_shutdown.connect
+def release_process_metrics(pid=None, **kwargs):
+    from files.metrics import mark_process_dead
+
+    mark_process_dead(pid or os.getpid())
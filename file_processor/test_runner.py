@@ -0,0 +1,32 @@
+from unittest.mock import patch
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from .celery import app
+
+
+class IsolatedTestRunner(DiscoverRunner):
+    # Keeps the suite off the live Redis and broker: tasks run in-process,
+    # uploads skip the fair queue unless a test turns it on, and every
+    # get_redis() call hands back an empty in-memory fake.
+    REDIS_CLIENTS = ("files.events.get_redis", "files.scheduling.get_redis", "users.blacklist.get_redis")
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        from files.tests.fakes import FakeRedis
+
+        self._overrides = override_settings(FAIR_SCHEDULING_ENABLED=False, CELERY_TASK_ALWAYS_EAGER=True)
+        self._overrides.enable()
+        self._eager = app.conf.task_always_eager
+        app.conf.task_always_eager = True
+        self._patchers = [patch(target, new=FakeRedis) for target in self.REDIS_CLIENTS]
+        for patcher in self._patchers:
+            patcher.start()
+
+    def teardown_test_environment(self, **kwargs):
+        for patcher in reversed(self._patchers):
+            patcher.stop()
+        app.conf.task_always_eager = self._eager
+        self._overrides.disable()
+        super().teardown_test_environment(**kwargs)
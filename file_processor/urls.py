@@ -24,6 +24,7 @@ from rest_framework_simplejwt.views import (
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib.staticfiles.urls import staticfiles_urlpatterns
+from files.metrics import metrics_view
 
 
 urlpatterns = [
@@ -31,7 +32,8 @@ urlpatterns = [
     path('api/login/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/login/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/user/', include("users.urls")),
-    path('api/file/', include("files.urls"))
+    path('api/file/', include("files.urls")),
+    path('metrics', metrics_view, name='metrics'),
 ]+ static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
 urlpatterns += staticfiles_urlpatterns()
\ No newline at end of file
@@ -0,0 +1,192 @@
+import logging
+import math
+import time
+from collections import Counter
+from dataclasses import dataclass
+import redis
+from celery import current_app
+from django.conf import settings
+from django.utils import timezone
+from .choices import PENDING
+from .metrics import DESIRED_WORKERS
+from .models import FileUpload
+from .scheduling import broker_queue_depth, deferred_depth
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ScalingPolicy:
+    queue: str
+    min_workers: int
+    max_workers: int
+    # Backlog one worker process is expected to clear within target_wait
+    jobs_per_worker: int
+    # Add capacity whenever the oldest waiting job is older than this (seconds)
+    target_wait: float
+    # Seconds after the last scale-up before capacity may be removed again
+    scale_down_cooldown: float
+
+
+@dataclass
+class QueueSample:
+    queue: str
+    depth: int
+    oldest_wait: float
+    # Taken off the broker by a worker, running or prefetched
+    in_flight: int = 0
+
+
+def policy_for(queue):
+    return ScalingPolicy(
+        queue=queue,
+        min_workers=settings.AUTOSCALE_MIN_WORKERS,
+        max_workers=settings.AUTOSCALE_MAX_WORKERS,
+        jobs_per_worker=settings.AUTOSCALE_JOBS_PER_WORKER,
+        target_wait=settings.AUTOSCALE_TARGET_WAIT,
+        scale_down_cooldown=settings.AUTOSCALE_SCALE_DOWN_COOLDOWN,
+    )
+
+
+def desired_workers(policy, sample, current):
+    # Jobs already on a worker still hold a process, so they count towards the
+    # pool and it does not shrink under them
+    desired = math.ceil((sample.depth + sample.in_flight) / policy.jobs_per_worker)
+    if sample.depth and sample.oldest_wait > policy.target_wait:
+        # Jobs are already late: grow even if the backlog looks small
+        desired = max(desired, current + 1)
+    return max(policy.min_workers, min(policy.max_workers, desired))
+
+
+def _size_filter(queue):
+    if queue == settings.CSV_LARGE_QUEUE:
+        return {'file_size__gt': settings.CSV_SMALL_FILE_MAX_BYTES}
+    return {'file_size__lte': settings.CSV_SMALL_FILE_MAX_BYTES}
+
+
+def in_flight_counts(app=None, timeout=1.0):
+    """
+    Tasks per queue that workers have taken off the broker, running or
+    prefetched. The broker no longer counts them as ready.
+    """
+    app = app or current_app
+    counts = Counter()
+    if app.conf.task_always_eager:
+        return counts
+    inspect = app.control.inspect(timeout=timeout)
+    for tasks in (inspect.active() or {}, inspect.reserved() or {}):
+        for worker_tasks in tasks.values():
+            counts.update(task.get('delivery_info', {}).get('routing_key') for task in worker_tasks)
+    return counts
+
+
+def sample_queue(queue, app=None, in_flight=0):
+    depth = broker_queue_depth(queue, app=app)
+    if settings.FAIR_SCHEDULING_ENABLED:
+        try:
+            depth += sum(deferred_depth(queue).values())
+        except redis.RedisError as e:
+            logger.warning(f"[AUTOSCALE] Could not read fair queue depth for {queue}: {str(e)}")
+    oldest = (
+        FileUpload.objects.filter(status=PENDING, **_size_filter(queue))
+        .order_by('created_at').values_list('created_at', flat=True).first()
+    )
+    oldest_wait = (timezone.now() - oldest).total_seconds() if oldest else 0.0
+    return QueueSample(queue=queue, depth=depth, oldest_wait=oldest_wait, in_flight=in_flight)
+
+
+class ReplicaActuator:
+    """
+    Only records the desired worker count; an external scaler (an HPA on the
+    files_desired_workers metric, KEDA) applies it to the Deployment.
+    """
+
+    def __init__(self):
+        self.current = {}
+
+    def current_workers(self, queue, policy):
+        return self.current.get(queue, policy.min_workers)
+
+    def apply(self, queue, desired):
+        self.current[queue] = desired
+        logger.info(f"[AUTOSCALE] Desired workers for {queue}: {desired}")
+
+
+class PoolActuator:
+    """
+    Resizes the prefork pools of the running workers that consume a queue with
+    the pool_grow/pool_shrink remote control commands, spreading the desired
+    process count evenly across them.
+    """
+
+    def __init__(self, app=None, timeout=1.0):
+        self.app = app or current_app
+        self.timeout = timeout
+
+    def _pools(self, queue):
+        inspect = self.app.control.inspect(timeout=self.timeout)
+        consumers = [
+            worker for worker, queues in (inspect.active_queues() or {}).items()
+            if any(q['name'] == queue for q in queues)
+        ]
+        stats = inspect.stats() or {}
+        return {worker: len(stats.get(worker, {}).get('pool', {}).get('processes', [])) for worker in consumers}
+
+    def current_workers(self, queue, policy):
+        return sum(self._pools(queue).values())
+
+    def apply(self, queue, desired):
+        pools = self._pools(queue)
+        if not pools:
+            logger.warning(f"[AUTOSCALE] No workers are consuming {queue}")
+            return
+        per_worker = max(1, math.ceil(desired / len(pools)))
+        for worker, processes in pools.items():
+            if per_worker > processes:
+                self.app.control.pool_grow(per_worker - processes, destination=[worker])
+            elif per_worker < processes:
+                self.app.control.pool_shrink(processes - per_worker, destination=[worker])
+        logger.info(f"[AUTOSCALE] Resized {queue} to {per_worker} process(es) on {len(pools)} worker(s)")
+
+
+class AutoscaleController:
+    """
+    Samples each queue's backlog, the jobs its workers are holding and the age
+    of its oldest waiting job, and asks the actuator for the number of workers the policy calls for. Scale-up
+    is immediate; scale-down waits out the policy's cooldown so a short lull
+    between bursts does not thrash the pool.
+    """
+
+    def __init__(self, policies, actuator, app=None, clock=time.monotonic, in_flight=in_flight_counts):
+        self.policies = policies
+        self.actuator = actuator
+        self.app = app
+        self.clock = clock
+        self.in_flight = in_flight
+        self.last_scale_up = {}
+
+    def step(self):
+        decisions = {}
+        # One inspect round trip covers every queue
+        in_flight = self.in_flight(app=self.app)
+        for policy in self.policies:
+            sample = sample_queue(policy.queue, app=self.app, in_flight=in_flight[policy.queue])
+            current = self.actuator.current_workers(policy.queue, policy)
+            desired = desired_workers(policy, sample, current)
+            now = self.clock()
+            if desired > current:
+                self.last_scale_up[policy.queue] = now
+            elif desired < current and now - self.last_scale_up.get(policy.queue, float('-inf')) < policy.scale_down_cooldown:
+                desired = current
+            if desired != current:
+                logger.info(
+                    f"[AUTOSCALE] {policy.queue}: depth={sample.depth} in_flight={sample.in_flight} "
+                    f"oldest_wait={sample.oldest_wait:.0f}s "
+                    f"workers {current} -> {desired}"
+                )
+                self.actuator.apply(policy.queue, desired)
+            DESIRED_WORKERS.labels(queue=policy.queue).set(desired)
+            decisions[policy.queue] = {'depth': sample.depth, 'in_flight': sample.in_flight,
+                                       'oldest_wait': sample.oldest_wait, 'current': current, 'desired': desired}
+        return decisions
@@ -0,0 +1,185 @@
+import asyncio
+import json
+import math
+import queue
+import threading
+import time
+from django.db import connections
+
+
+def synthetic_csv(rows, columns=8, tag=''):
+    # ``tag`` makes the content unique per run so uploads are never deduplicated
+    # against files left behind by earlier runs.
+    header = ",".join(f"col{i}" for i in range(columns))
+    lines = [header]
+    for n in range(rows):
+        lines.append(",".join(f"{tag}{n}-{i}" for i in range(columns)))
+    return ("\n".join(lines) + "\n").encode()
+
+
+def percentile(sorted_values, pct):
+    # Nearest-rank percentile of an already sorted list.
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies, elapsed, errors=0, rows=None):
+    latencies = sorted(latencies)
+    summary = {
+        'count': len(latencies),
+        'errors': errors,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'mean': sum(latencies) / len(latencies) if latencies else None,
+        'requests_per_sec': len(latencies) / elapsed if elapsed else None,
+    }
+    if rows is not None:
+        summary['rows'] = rows
+        summary['rows_per_sec'] = rows / elapsed if elapsed else None
+    return summary
+
+
+def run_concurrently(func, items, concurrency):
+    """
+    Call ``func(item)`` for every item from ``concurrency`` threads. ``func``
+    returns True on success. Returns (latencies, errors, elapsed seconds).
+    """
+    latencies, errors = [], []
+    lock = threading.Lock()
+    pending = queue.SimpleQueue()
+    for item in items:
+        pending.put(item)
+
+    def worker():
+        try:
+            while True:
+                try:
+                    item = pending.get_nowait()
+                except queue.Empty:
+                    return
+                started = time.perf_counter()
+                try:
+                    ok = func(item)
+                except Exception:
+                    ok = False
+                took = time.perf_counter() - started
+                with lock:
+                    latencies.append(took)
+                    if not ok:
+                        errors.append(item)
+        finally:
+            if threading.current_thread() is not threading.main_thread():
+                connections.close_all()
+
+    started = time.perf_counter()
+    if concurrency <= 1:
+        # Stay on the calling thread so the run shares its connection (and any
+        # open transaction, as in tests).
+        worker()
+    else:
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return latencies, len(errors), time.perf_counter() - started
+
+
+async def run_concurrently_async(func, items, concurrency):
+    """
+    Await ``func(item)`` for every item with at most ``concurrency`` in flight.
+    Returns (latencies, errors, elapsed seconds, peak thread count).
+    """
+    latencies, errors = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+    peak_threads = threading.active_count()
+
+    async def one(item):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                ok = await func(item)
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            if not ok:
+                errors += 1
+
+    async def sample_threads():
+        nonlocal peak_threads
+        while True:
+            peak_threads = max(peak_threads, threading.active_count())
+            await asyncio.sleep(0.005)
+
+    sampler = asyncio.create_task(sample_threads())
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(one(item) for item in items))
+    finally:
+        sampler.cancel()
+    return latencies, errors, time.perf_counter() - started, peak_threads
+
+
+async def asgi_request(app, method, path, query_string='', headers=None, body=b''):
+    """
+    Send one HTTP request straight to the ASGI application ``app``, the way an
+    ASGI server would, and return (status, body).
+    """
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': method, 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+        'query_string': query_string.encode(), 'root_path': '',
+        'headers': [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+        'client': ('127.0.0.1', 0), 'server': ('localhost', 8000),
+    }
+    delivered = False
+
+    async def receive():
+        nonlocal delivered
+        if not delivered:
+            delivered = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        # The client never disconnects; the handler cancels this once it responds
+        await asyncio.Future()
+
+    response = {'status': None, 'body': []}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+        elif message['type'] == 'http.response.body':
+            response['body'].append(message.get('body', b''))
+
+    await app(scope, receive, send)
+    return response['status'], b''.join(response['body'])
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """
+    Return a description of every phase whose p95 latency grew, or whose
+    rows/sec fell, by more than ``tolerance`` (a fraction) against ``baseline``.
+    """
+    regressions = []
+    for phase, current in results.items():
+        previous = baseline.get(phase)
+        if not previous:
+            continue
+        if current.get('p95') and previous.get('p95') and current['p95'] > previous['p95'] * (1 + tolerance):
+            regressions.append(
+                f"{phase}: p95 {current['p95'] * 1000:.1f}ms vs baseline {previous['p95'] * 1000:.1f}ms"
+            )
+        if (current.get('rows_per_sec') and previous.get('rows_per_sec')
+                and current['rows_per_sec'] < previous['rows_per_sec'] * (1 - tolerance)):
+            regressions.append(
+                f"{phase}: {current['rows_per_sec']:,.0f} rows/sec vs baseline {previous['rows_per_sec']:,.0f}"
+            )
+    return regressions
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)['results']
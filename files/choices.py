@@ -1,9 +1,21 @@
 PENDING = "pending"
+PROCESSING = "processing"
+COMPLETED = "completed"
+FAILED = "failed"
 
 
 UPLOAD_STATUS_CHOICES = (
     (PENDING, "Pending"),
-    ("processing", "Processing"),
-    ("completed", "Completed"),
-    ("failed", "Failed"),  
-)
\ No newline at end of file
+    (PROCESSING, "Processing"),
+    (COMPLETED, "Completed"),
+    (FAILED, "Failed"),  
+)
+
+# Allowed status transitions. PROCESSING -> PROCESSING is a re-run taking over
+# an upload whose lease has expired or been reclaimed.
+STATUS_TRANSITIONS = {
+    PENDING: {PROCESSING, FAILED},
+    PROCESSING: {PROCESSING, COMPLETED, FAILED},
+    COMPLETED: set(),
+    FAILED: set(),
+}
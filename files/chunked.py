@@ -0,0 +1,48 @@
+import re
+from django.core.files.storage import default_storage
+
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (?P<start>\d+)-(?P<end>\d+)/(?P<total>\d+|\*)$')
+COPY_BUFFER_SIZE = 64 * 1024
+
+
+class ChunkError(Exception):
+    pass
+
+
+def parse_content_range(header):
+    """
+    Parse ``Content-Range: bytes <start>-<end>/<total|*>`` into
+    (start, length, total). ``total`` is None when sent as ``*``.
+    """
+    match = CONTENT_RANGE_RE.match(header or '')
+    if not match:
+        raise ChunkError("A 'Content-Range: bytes <start>-<end>/<total>' header is required.")
+    start, end = int(match['start']), int(match['end'])
+    if end < start:
+        raise ChunkError("Content-Range end must not be before its start.")
+    total = None if match['total'] == '*' else int(match['total'])
+    return start, end - start + 1, total
+
+
+def append_chunk(chunked, stream, length):
+    # Writes ``length`` bytes from the request stream directly after the last
+    # acknowledged offset, a buffer at a time. Bytes past the offset left behind
+    # by a dropped connection are truncated first so a retried chunk lands cleanly.
+    if stream is None:
+        raise ChunkError("The request body is empty.")
+    path = default_storage.path(chunked.file.name)
+    written = 0
+    with open(path, 'r+b') as destination:
+        destination.seek(chunked.offset)
+        destination.truncate()
+        while written < length:
+            data = stream.read(min(COPY_BUFFER_SIZE, length - written))
+            if not data:
+                break
+            destination.write(data)
+            written += len(data)
+        if written != length:
+            destination.truncate(chunked.offset)
+            raise ChunkError(f"Expected {length} bytes but received {written}.")
+    return chunked.offset + written
@@ -0,0 +1,132 @@
+import gzip
+import hashlib
+import io
+import tempfile
+import zlib
+from django.conf import settings
+from django.core.files import File
+from django.db.models import Count, Sum
+from .models import FileUpload
+
+try:
+    import zstandard
+except ImportError:  # optional: .csv.zst uploads are rejected without it
+    zstandard = None
+
+
+GZIP, ZSTD = 'gzip', 'zstd'
+SUFFIXES = {'.gz': GZIP, '.zst': ZSTD}
+READ_SIZE = 64 * 1024
+# Raised by the decompressors on corrupt or truncated input
+DECOMPRESSION_ERRORS = (OSError, EOFError, zlib.error) + ((zstandard.ZstdError,) if zstandard else ())
+
+
+class CompressionError(Exception):
+    pass
+
+
+def compression_for(name):
+    for suffix, compression in SUFFIXES.items():
+        if name.lower().endswith(suffix):
+            return compression
+    return None
+
+
+def available_compressions():
+    return [GZIP, ZSTD] if zstandard else [GZIP]
+
+
+def is_supported_upload(name):
+    name = name.lower()
+    if name.endswith('.csv'):
+        return True
+    compression = compression_for(name)
+    return compression in available_compressions() and name[:name.rindex('.')].endswith('.csv')
+
+
+def open_decompressed(raw, compression):
+    """
+    Wrap the binary file ``raw`` in a reader that decompresses it incrementally,
+    so only one buffer of decompressed data is held at a time.
+    """
+    if compression == GZIP:
+        return io.BufferedReader(gzip.GzipFile(fileobj=raw, mode='rb'), READ_SIZE)
+    if compression == ZSTD:
+        if zstandard is None:
+            raise CompressionError("zstd support is not installed.")
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(raw), READ_SIZE)
+    raise CompressionError(f"Unsupported compression: {compression}")
+
+
+def inspect_compressed(file, compression, limit):
+    """
+    Stream ``file`` through the decompressor and return the decompressed size
+    and SHA-256. Stops as soon as the output passes ``limit`` bytes, so a
+    decompression bomb costs at most ``limit`` bytes of work.
+    """
+    file.seek(0)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        stream = open_decompressed(file, compression)
+        while True:
+            data = stream.read(READ_SIZE)
+            if not data:
+                break
+            size += len(data)
+            if size > limit:
+                raise CompressionError(f"Decompressed file size must not exceed {limit} bytes.")
+            digest.update(data)
+    except DECOMPRESSION_ERRORS as e:
+        raise CompressionError(f"Could not decompress file: {e}") from e
+    finally:
+        file.seek(0)
+    return size, digest.hexdigest()
+
+
+def gzip_file(file, name):
+    """
+    Gzip ``file`` chunk by chunk into a spooled temporary file and return it as
+    a Django File named ``name``.
+    """
+    spooled = tempfile.SpooledTemporaryFile(max_size=READ_SIZE * 16)
+    compressor = zlib.compressobj(settings.UPLOAD_GZIP_LEVEL, zlib.DEFLATED, 31)
+    for chunk in file.chunks():
+        spooled.write(compressor.compress(chunk))
+    spooled.write(compressor.flush())
+    spooled.seek(0)
+    return File(spooled, name=name)
+
+
+def storage_fields(file):
+    """
+    FileUpload fields for keeping ``file`` at rest. Compressed uploads are
+    stored as sent. Plain CSVs are gzipped unless they are large enough to be
+    sharded, because shards read byte ranges of the plain file.
+    """
+    compression = compression_for(file.name)
+    shardable = settings.CSV_SHARDING_ENABLED and file.size > settings.CSV_SHARD_SIZE
+    if compression is None and settings.UPLOAD_COMPRESS_AT_REST and not shardable:
+        file, compression = gzip_file(file, f"{file.name}.gz"), GZIP
+    return {'file': file, 'compression': compression or '', 'stored_size': file.size}
+
+
+def compression_stats():
+    """Bytes as decompressed, as sent and as stored, per compression."""
+    rows = (
+        FileUpload.objects.values('compression')
+        .annotate(uploads=Count('fileId'), csv_bytes=Sum('file_size'),
+                  transfer_bytes=Sum('transfer_size'), stored_bytes=Sum('stored_size'))
+        .order_by('compression')
+    )
+    stats = {}
+    for row in rows:
+        csv_bytes = row['csv_bytes'] or 0
+        stats[row['compression'] or 'none'] = {
+            'uploads': row['uploads'],
+            'csv_bytes': csv_bytes,
+            'transfer_bytes': row['transfer_bytes'] or 0,
+            'stored_bytes': row['stored_bytes'] or 0,
+            'saved_bytes': csv_bytes - (row['stored_bytes'] or 0),
+        }
+    return stats
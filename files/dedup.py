@@ -0,0 +1,84 @@
+import hashlib
+import json
+from django.db.models import Count, Q, Sum
+from .choices import COMPLETED
+from .models import FileUpload, ProcessedRow
+
+
+def hash_file(file):
+    # Fallback for files that did not pass through the hashing upload handlers
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+# FileUpload fields that change what processing produces
+SPEC_FIELDS = ('validation_rules', 'transform')
+
+
+def spec_digest(specs):
+    # '' for uploads without specs, so they keep matching each other. Unset
+    # specs are left out, so adding a spec field keeps existing digests.
+    specs = {field: specs[field] for field in SPEC_FIELDS if specs.get(field)}
+    if not specs:
+        return ''
+    canonical = json.dumps(specs, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def find_completed_original(content_sha256, spec_sha256=''):
+    # Only first-generation uploads are linked to, so duplicates never chain.
+    # The same content processed with different specs gives different results.
+    return (
+        FileUpload.objects.filter(
+            content_sha256=content_sha256, spec_sha256=spec_sha256, status=COMPLETED, duplicate_of__isnull=True,
+        )
+        .order_by('created_at')
+        .first()
+    )
+
+
+def duplicate_fields(original):
+    # Fields a duplicate copies so it reads exactly like its original
+    return {
+        'duplicate_of': original, 'status': COMPLETED, 'schema': original.schema,
+        'rows_processed': original.rows_processed, 'rows_rejected': original.rows_rejected,
+        'error_report': original.error_report.name, 'error_count': original.error_count,
+    }
+
+
+def promote_duplicate(original):
+    """
+    Hand the results of ``original``, which is about to be deleted, to its
+    oldest duplicate: the processed rows move over and the other duplicates
+    link to it instead. Duplicates already copy everything else, including a
+    shared blob's name, so the heir reads the same as before. Returns the
+    heir, or None when there are no duplicates.
+    """
+    duplicates = FileUpload.objects.filter(duplicate_of=original.pk).order_by('created_at')
+    heir = duplicates.first()
+    if heir is None:
+        return None
+    ProcessedRow.objects.filter(upload_id=original.pk).update(upload_id=heir.pk)
+    duplicates.exclude(pk=heir.pk).update(duplicate_of=heir.pk)
+    FileUpload.objects.filter(pk=heir.pk).update(duplicate_of=None)
+    return heir
+
+
+def dedup_stats():
+    totals = FileUpload.objects.filter(content_sha256__isnull=False).aggregate(
+        uploads=Count('fileId'),
+        duplicates=Count('fileId', filter=Q(duplicate_of__isnull=False)),
+        bytes_total=Sum('file_size'),
+        bytes_deduplicated=Sum('file_size', filter=Q(duplicate_of__isnull=False)),
+    )
+    uploads = totals['uploads'] or 0
+    duplicates = totals['duplicates'] or 0
+    return {
+        'uploads': uploads,
+        'duplicates': duplicates,
+        'hit_rate': duplicates / uploads if uploads else 0.0,
+        'bytes_total': totals['bytes_total'] or 0,
+        'bytes_deduplicated': totals['bytes_deduplicated'] or 0,
+    }
@@ -0,0 +1,46 @@
+import json
+import logging
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+from django.utils import timezone
+from .choices import COMPLETED, FAILED
+
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = {COMPLETED, FAILED}
+
+_client = None
+
+
+def status_channel(file_id):
+    return f"file_status:{file_id}"
+
+
+def get_redis():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.REDIS_URL)
+    return _client
+
+
+def publish_status(file_id, status, **extra):
+    # Publishing is best effort: subscribers re-read the record when they connect,
+    # so a lost message only delays a push, never the job itself.
+    message = {'fileId': str(file_id), 'status': status, 'at': timezone.now().isoformat(), **extra}
+    try:
+        get_redis().publish(status_channel(file_id), json.dumps(message))
+    except redis.RedisError as e:
+        logger.warning(f"[EVENTS] Could not publish status for file {file_id}: {str(e)}")
+
+
+def format_sse(data, event='status'):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def subscribe_status(file_id):
+    client = aioredis.Redis.from_url(settings.REDIS_URL)
+    pubsub = client.pubsub()
+    await pubsub.subscribe(status_channel(file_id))
+    return client, pubsub
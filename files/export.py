@@ -0,0 +1,169 @@
+import csv
+import io
+import json
+import re
+import zlib
+from django.conf import settings
+from django.core.cache import cache
+from .models import ProcessedRow
+from .processing import read_header
+from .transforms import parse_transform
+
+
+CSV, NDJSON = 'csv', 'ndjson'
+CONTENT_TYPES = {CSV: 'text/csv; charset=utf-8', NDJSON: 'application/x-ndjson'}
+_RANGE = re.compile(r'bytes=(\d*)-(\d*)')
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def accepts_gzip(accept_encoding):
+    # An explicit q=0 refuses the encoding
+    for part in accept_encoding.split(','):
+        coding, *params = [item.strip() for item in part.split(';')]
+        if coding.lower() == 'gzip':
+            return not any(re.fullmatch(r'q=0(\.0*)?', param.replace(' ', '')) for param in params)
+    return False
+
+
+def parse_range(header, length):
+    """
+    Return the inclusive (start, end) of a single ``bytes=`` range, or None
+    when the header should be ignored and the whole body sent. Raises
+    RangeNotSatisfiable when the range lies past the end of the body.
+    """
+    match = _RANGE.fullmatch(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes
+        if not last:
+            return None
+        if int(last) == 0 or length == 0:
+            raise RangeNotSatisfiable()
+        return max(length - int(last), 0), length - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= length:
+        raise RangeNotSatisfiable()
+    return start, min(int(last), length - 1) if last else length - 1
+
+
+def _text_chunks(rows, output, columns=None):
+    # Encodes rows into chunks of about EXPORT_CHUNK_SIZE bytes, so only one
+    # chunk is held no matter how many rows there are. A CSV always starts
+    # with its ``columns`` header, even when there are no rows.
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if output == CSV:
+        writer.writerow(columns)
+    for row in rows:
+        if output == NDJSON:
+            buffer.write(json.dumps(row))
+            buffer.write('\n')
+        else:
+            writer.writerow([row.get(column) for column in columns])
+        if buffer.tell() >= settings.EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def _gzipped(chunks):
+    # The gzip header carries no timestamp, so the same rows always compress
+    # to the same bytes and ranges stay valid across requests
+    compressor = zlib.compressobj(settings.EXPORT_GZIP_LEVEL, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _byte_range(chunks, start, end):
+    position = 0
+    for chunk in chunks:
+        chunk_end = position + len(chunk)
+        if chunk_end > start:
+            yield chunk[max(start - position, 0):end + 1 - position]
+        position = chunk_end
+        if position > end:
+            return
+
+
+class Export:
+    """
+    The processed rows of a completed upload, encoded as CSV or NDJSON and
+    optionally gzipped. The body is generated on every request; rows are read
+    with a server-side cursor and encoded a chunk at a time.
+    """
+
+    def __init__(self, upload, output, gzip=False):
+        self.upload = upload.results_upload
+        self.output = output
+        self.gzip = gzip
+
+    @property
+    def content_type(self):
+        return CONTENT_TYPES[self.output]
+
+    @property
+    def etag(self):
+        # Completed rows never change, so the results upload and encoding
+        # identify the bytes
+        version = int(self.upload.updated_at.timestamp() * 1_000_000)
+        encoding = '-gzip' if self.gzip else ''
+        return f'"{self.upload.fileId}-{version}-{self.output}{encoding}"'
+
+    def _length_key(self):
+        return f"export_length:{self.etag}"
+
+    def columns(self):
+        # jsonb does not keep the key order of the rows, so CSV columns come
+        # from the file's header and the transform's output
+        upload = self.upload
+        header = [column['name'] for column in upload.schema] if upload.schema else read_header(upload.file)[0]
+        if upload.transform:
+            header = parse_transform(upload.transform).compile(header).output_columns
+        return header
+
+    def _encoded(self):
+        rows = (
+            ProcessedRow.objects.filter(upload_id=self.upload.pk).order_by('row_number')
+            .values_list('data', flat=True).iterator(chunk_size=settings.EXPORT_FETCH_SIZE)
+        )
+        yield from _text_chunks(rows, self.output, self.columns() if self.output == CSV else None)
+
+    def chunks(self, byte_range=None):
+        chunks = self._encoded()
+        if self.gzip:
+            chunks = _gzipped(chunks)
+        if byte_range is not None:
+            return _byte_range(chunks, *byte_range)
+        return self._counted(chunks)
+
+    def _counted(self, chunks):
+        # A complete download records the length for later range requests
+        length = 0
+        for chunk in chunks:
+            length += len(chunk)
+            yield chunk
+        cache.set(self._length_key(), length, settings.EXPORT_LENGTH_CACHE_TIMEOUT)
+
+    def cached_length(self):
+        return cache.get(self._length_key())
+
+    def length(self):
+        # Range responses need the full length up front. Without a cached one
+        # the body is generated once and counted, which costs a pass over the
+        # rows but no memory.
+        length = self.cached_length()
+        if length is None:
+            length = sum(len(chunk) for chunk in self.chunks())
+        return length
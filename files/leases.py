@@ -0,0 +1,47 @@
+import time
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from .choices import PROCESSING
+from .models import FileUpload
+
+
+class LeaseLost(Exception):
+    pass
+
+
+class Lease:
+    """
+    Time-bound ownership of an upload by one worker. The worker renews the lease
+    as it makes progress; a lease that is not renewed expires and the upload
+    becomes claimable by retry_stuck_files. Renewals are conditional on the
+    token, so a worker whose lease was reclaimed finds out on its next heartbeat.
+    """
+
+    def __init__(self, file_id, token=None, duration=None):
+        self.file_id = file_id
+        self.token = token or uuid.uuid4()
+        self.duration = duration or settings.FILE_LEASE_DURATION
+        self._renew_at = 0.0
+
+    def expiry(self):
+        return timezone.now() + timedelta(seconds=self.duration)
+
+    def _schedule_renewal(self):
+        # Renew once a third of the lease has elapsed to leave room for slow batches
+        self._renew_at = time.monotonic() + self.duration / 3
+
+    def fields(self):
+        self._schedule_renewal()
+        return {'lease_token': self.token, 'lease_expires_at': self.expiry()}
+
+    def heartbeat(self, force=False):
+        if not force and time.monotonic() < self._renew_at:
+            return
+        renewed = FileUpload.objects.filter(
+            fileId=self.file_id, status=PROCESSING, lease_token=self.token
+        ).update(lease_expires_at=self.expiry())
+        if not renewed:
+            raise LeaseLost(f"Lease on file {self.file_id} is no longer held by this worker.")
+        self._schedule_renewal()
@@ -0,0 +1,67 @@
+import time
+from django.conf import settings
+from django.core.cache import cache
+
+
+def _version_key(user_id):
+    return f"user_files_version:{user_id}"
+
+
+def _initial_version():
+    # Seeding from the clock means a version key lost to eviction comes back with
+    # a value no previously cached page was stored under.
+    return time.time_ns() // 1000
+
+
+def get_user_files_version(user_id):
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        cache.add(_version_key(user_id), _initial_version(), timeout=None)
+        version = cache.get(_version_key(user_id))
+    return version
+
+
+async def aget_user_files_version(user_id):
+    version = await cache.aget(_version_key(user_id))
+    if version is None:
+        await cache.aadd(_version_key(user_id), _initial_version(), timeout=None)
+        version = await cache.aget(_version_key(user_id))
+    return version
+
+
+def bump_user_files_version(user_id):
+    # Changing the version orphans every cached page for the user at once; the
+    # old entries simply age out through their TTL.
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        cache.add(_version_key(user_id), _initial_version(), timeout=None)
+
+
+def _page_key(user_id, version, query_params):
+    query = '&'.join(f"{name}={query_params[name]}" for name in sorted(query_params))
+    return f"user_files_page:{user_id}:v{version}:{query}"
+
+
+def user_files_page_key(user_id, query_params):
+    return _page_key(user_id, get_user_files_version(user_id), query_params)
+
+
+async def auser_files_page_key(user_id, query_params):
+    return _page_key(user_id, await aget_user_files_version(user_id), query_params)
+
+
+def get_user_files_page(key):
+    return cache.get(key)
+
+
+async def aget_user_files_page(key):
+    return await cache.aget(key)
+
+
+def set_user_files_page(key, data):
+    cache.set(key, data, timeout=settings.MY_FILES_CACHE_TIMEOUT)
+
+
+async def aset_user_files_page(key, data):
+    await cache.aset(key, data, timeout=settings.MY_FILES_CACHE_TIMEOUT)
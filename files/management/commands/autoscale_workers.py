@@ -0,0 +1,35 @@
+import json
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from files.autoscaling import AutoscaleController, PoolActuator, ReplicaActuator, policy_for
+from files.metrics import start_worker_exporter
+from files.scheduling import processing_queues
+
+
+class Command(BaseCommand):
+    help = (
+        "Scale processing workers from queue depth and waiting time, either by resizing "
+        "the running worker pools (--mode pool) or by publishing desired replica counts "
+        "(--mode replicas)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=['pool', 'replicas'], default='pool')
+        parser.add_argument('--interval', type=int, default=settings.AUTOSCALE_INTERVAL)
+        parser.add_argument('--once', action='store_true', help="Take one decision and exit.")
+        parser.add_argument('--metrics-port', type=int, default=0,
+                            help="Serve files_desired_workers and queue metrics on this port.")
+
+    def handle(self, *args, **options):
+        actuator = PoolActuator() if options['mode'] == 'pool' else ReplicaActuator()
+        controller = AutoscaleController([policy_for(queue) for queue in processing_queues()], actuator)
+        if options['metrics_port']:
+            start_worker_exporter(options['metrics_port'])
+
+        while True:
+            decisions = controller.step()
+            self.stdout.write(json.dumps(decisions))
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,164 @@
+import json
+import random
+import threading
+import uuid
+from unittest import mock
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.core.handlers.base import reset_urlconf
+from django.core.signals import request_finished
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from file_processor.celery import app
+from files.benchmark import compare_to_baseline, load_baseline, run_concurrently, summarize, synthetic_csv
+from files.choices import COMPLETED
+from files.models import FileUpload
+from files.tasks import process_csv_file
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the upload, status and my-files endpoints in-process and report "
+        "p50/p95/p99 latency and rows/sec. Point DATABASE_URL, CACHE_URL and "
+        "CELERY_BROKER_URL at local stand-ins to run without the full stack."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--uploads', type=int, default=20, help="Number of CSV files to upload.")
+        parser.add_argument('--requests', type=int, default=200, help="Requests per read endpoint.")
+        parser.add_argument('--sizes', default='100,1000,10000', help="Comma separated CSV row counts.")
+        parser.add_argument('--columns', type=int, default=8)
+        parser.add_argument('--output', help="Write the results as a baseline JSON file.")
+        parser.add_argument('--compare', help="Baseline JSON file to compare the results against.")
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help="Allowed regression as a fraction of the baseline.")
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError("--sizes must be a comma separated list of row counts.")
+        concurrency = options['concurrency']
+        tag = uuid.uuid4().hex[:12]
+        self._clients = threading.local()
+        self.user = User.objects.create_user(
+            username=f"bench-{tag}", email=f"bench-{tag}@example.com", password=None
+        )
+        # reset_urlconf deletes a shared asgiref ContextVar after every request,
+        # which races between client threads. The benchmark never sets a
+        # per-request urlconf, so it is safe to skip while the clients run.
+        request_finished.disconnect(reset_urlconf)
+        try:
+            results = self._run(sizes, options, concurrency, tag)
+        finally:
+            request_finished.connect(reset_urlconf)
+            for upload in FileUpload.objects.filter(user=self.user):
+                upload.file.delete(save=False)
+            self.user.delete()
+
+        for phase, summary in results.items():
+            self._report(phase, summary)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({
+                    'created_at': timezone.now().isoformat(),
+                    'options': {
+                        'concurrency': concurrency, 'uploads': options['uploads'],
+                        'requests': options['requests'], 'sizes': sizes, 'columns': options['columns'],
+                    },
+                    'database': connection.vendor,
+                    'cache': settings.CACHES['default']['BACKEND'],
+                    'results': results,
+                }, f, indent=2)
+            self.stdout.write(f"Baseline written to {options['output']}")
+
+        if options['compare']:
+            regressions = compare_to_baseline(results, load_baseline(options['compare']), options['tolerance'])
+            if regressions:
+                raise CommandError("Regressions against baseline:\n" + "\n".join(regressions))
+            self.stdout.write(f"No regressions against {options['compare']}")
+
+    def _client(self):
+        client = getattr(self._clients, 'client', None)
+        if client is None:
+            client = self._clients.client = APIClient()
+            client.force_authenticate(user=self.user)
+        return client
+
+    def _run(self, sizes, options, concurrency, tag):
+        results = {}
+        payloads = [
+            (n, synthetic_csv(sizes[n % len(sizes)], options['columns'], tag=f"{tag}-{n}-"))
+            for n in range(options['uploads'])
+        ]
+        file_ids = []
+
+        def upload(item):
+            n, content = item
+            response = self._client().post(
+                reverse('file-upload'),
+                {'file': SimpleUploadedFile(f"bench-{n}.csv", content, content_type="text/csv")},
+                format='multipart',
+            )
+            if response.status_code != 201:
+                return False
+            file_ids.append(response.data['fileId'])
+            return True
+
+        # Uploads are measured without the broker round trip; the processing
+        # phase below runs the task directly so its rows/sec is comparable
+        # across environments.
+        with mock.patch('files.views.enqueue_upload'):
+            latencies, errors, elapsed = run_concurrently(upload, payloads, concurrency)
+        results['upload'] = summarize(latencies, elapsed, errors)
+
+        # Shards of large files are run in-process as well, so no worker is needed.
+        eager = app.conf.task_always_eager
+        app.conf.task_always_eager = True
+        try:
+            latencies, _, elapsed = run_concurrently(
+                lambda file_id: process_csv_file(file_id) or True, list(file_ids), concurrency
+            )
+        finally:
+            app.conf.task_always_eager = eager
+        processed = FileUpload.objects.filter(user=self.user)
+        results['process'] = summarize(
+            latencies, elapsed, errors=processed.exclude(status=COMPLETED).count(),
+            rows=sum(upload.rows_processed for upload in processed),
+        )
+
+        if file_ids:
+            status_ids = [random.choice(file_ids) for _ in range(options['requests'])]
+            latencies, errors, elapsed = run_concurrently(
+                lambda file_id: self._client().get(
+                    reverse('file-status-view', kwargs={'fileId': file_id})
+                ).status_code == 200,
+                status_ids, concurrency,
+            )
+            results['status'] = summarize(latencies, elapsed, errors)
+
+        latencies, errors, elapsed = run_concurrently(
+            lambda _: self._client().get(reverse('user-file-list')).status_code == 200,
+            range(options['requests']), concurrency,
+        )
+        results['list'] = summarize(latencies, elapsed, errors)
+        return results
+
+    def _report(self, phase, summary):
+        if not summary['count']:
+            self.stdout.write(f"{phase:<8} no requests")
+            return
+        line = (
+            f"{phase:<8} n={summary['count']} errors={summary['errors']} "
+            f"p50={summary['p50'] * 1000:.1f}ms p95={summary['p95'] * 1000:.1f}ms "
+            f"p99={summary['p99'] * 1000:.1f}ms {summary['requests_per_sec']:,.1f} req/s"
+        )
+        if 'rows_per_sec' in summary:
+            line += f" {summary['rows_per_sec']:,.0f} rows/sec"
+        self.stdout.write(line)
@@ -0,0 +1,151 @@
+import asyncio
+import json
+import random
+import uuid
+from unittest import mock
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.base import reset_urlconf
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished
+from django.db import connection
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+from files.benchmark import (
+    asgi_request, compare_to_baseline, load_baseline, run_concurrently_async, summarize, synthetic_csv,
+)
+from files.models import FileUpload
+from users.models import User
+
+
+# url names of the sync (DRF) and async views for each endpoint
+ENDPOINTS = {
+    'upload': ('file-upload', 'file-upload-async'),
+    'status': ('file-status-view', 'file-status-async'),
+    'list': ('user-file-list', 'user-file-list-async'),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the sync and async upload, status and my-files views under the "
+        "ASGI handler at increasing numbers of concurrent connections. Reports "
+        "latency, req/s and the peak number of threads used."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', default='10,50,200',
+                            help="Comma separated numbers of concurrent connections.")
+        parser.add_argument('--requests', type=int, default=400, help="Requests per endpoint and level.")
+        parser.add_argument('--uploads', type=int, default=50, help="Uploads per variant and level.")
+        parser.add_argument('--rows', type=int, default=100, help="Rows per uploaded CSV.")
+        parser.add_argument('--endpoints', default='upload,status,list')
+        parser.add_argument('--output', help="Write the results as a baseline JSON file.")
+        parser.add_argument('--compare', help="Baseline JSON file to compare the results against.")
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help="Allowed regression as a fraction of the baseline.")
+
+    def handle(self, *args, **options):
+        try:
+            levels = [int(level) for level in options['connections'].split(',')]
+        except ValueError:
+            raise CommandError("--connections must be a comma separated list of integers.")
+        endpoints = options['endpoints'].split(',')
+        unknown = set(endpoints) - set(ENDPOINTS)
+        if unknown:
+            raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+        tag = uuid.uuid4().hex[:12]
+        self.user = User.objects.create_user(
+            username=f"bench-{tag}", email=f"bench-{tag}@example.com", password=None
+        )
+        self.headers = {'Authorization': f"Bearer {AccessToken.for_user(self.user)}", 'Host': 'localhost'}
+        # Seed files to read back; status and list requests are spread over them
+        self.file_ids = [
+            str(FileUpload.objects.create(user=self.user, file_size=n).fileId) for n in range(20)
+        ]
+        # See benchmark_api: reset_urlconf races between request threads
+        request_finished.disconnect(reset_urlconf)
+        try:
+            # Uploads are measured without the broker round trip
+            with mock.patch('files.views.enqueue_upload'):
+                results = asyncio.run(self._run(levels, endpoints, options, tag))
+        finally:
+            request_finished.connect(reset_urlconf)
+            for upload in FileUpload.objects.filter(user=self.user):
+                upload.file.delete(save=False)
+            self.user.delete()
+
+        for name, summary in results.items():
+            self._report(name, summary)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({
+                    'created_at': timezone.now().isoformat(),
+                    'options': {
+                        'connections': levels, 'requests': options['requests'],
+                        'uploads': options['uploads'], 'rows': options['rows'], 'endpoints': endpoints,
+                    },
+                    'database': connection.vendor,
+                    'cache': settings.CACHES['default']['BACKEND'],
+                    'results': results,
+                }, f, indent=2)
+            self.stdout.write(f"Baseline written to {options['output']}")
+
+        if options['compare']:
+            regressions = compare_to_baseline(results, load_baseline(options['compare']), options['tolerance'])
+            if regressions:
+                raise CommandError("Regressions against baseline:\n" + "\n".join(regressions))
+            self.stdout.write(f"No regressions against {options['compare']}")
+
+    async def _run(self, levels, endpoints, options, tag):
+        app = ASGIHandler()
+        results = {}
+        for level in levels:
+            for endpoint in endpoints:
+                for variant, url_name in zip(('sync', 'async'), ENDPOINTS[endpoint]):
+                    if endpoint == 'upload':
+                        items = [f"{tag}-{variant}-{level}-{n}-" for n in range(options['uploads'])]
+                    else:
+                        items = [random.choice(self.file_ids) for _ in range(options['requests'])]
+                    request = self._request_for(app, endpoint, url_name, options['rows'])
+                    latencies, errors, elapsed, peak_threads = await run_concurrently_async(request, items, level)
+                    summary = summarize(latencies, elapsed, errors)
+                    summary['peak_threads'] = peak_threads
+                    results[f"{endpoint}.{variant}@{level}"] = summary
+        return results
+
+    def _request_for(self, app, endpoint, url_name, rows):
+        if endpoint == 'upload':
+            async def request(tag):
+                body = encode_multipart(BOUNDARY, {
+                    'file': SimpleUploadedFile("bench.csv", synthetic_csv(rows, tag=tag), content_type="text/csv"),
+                })
+                headers = {**self.headers, 'Content-Type': MULTIPART_CONTENT, 'Content-Length': str(len(body))}
+                status, _ = await asgi_request(app, 'POST', reverse(url_name), headers=headers, body=body)
+                return status == 201
+        elif endpoint == 'status':
+            async def request(file_id):
+                path = reverse(url_name, kwargs={'fileId': file_id})
+                status, _ = await asgi_request(app, 'GET', path, headers=self.headers)
+                return status == 200
+        else:
+            async def request(_):
+                status, _ = await asgi_request(app, 'GET', reverse(url_name), headers=self.headers)
+                return status == 200
+        return request
+
+    def _report(self, name, summary):
+        if not summary['count']:
+            self.stdout.write(f"{name:<20} no requests")
+            return
+        self.stdout.write(
+            f"{name:<20} n={summary['count']} errors={summary['errors']} "
+            f"p50={summary['p50'] * 1000:.1f}ms p95={summary['p95'] * 1000:.1f}ms "
+            f"p99={summary['p99'] * 1000:.1f}ms {summary['requests_per_sec']:,.1f} req/s "
+            f"threads={summary['peak_threads']}"
+        )
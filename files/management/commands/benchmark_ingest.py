@@ -0,0 +1,55 @@
+import time
+import uuid
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from files.ingest import RowWriter, supports_copy
+from files.models import FileUpload
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Compare rows/sec of COPY and bulk_create ingestion of processed CSV rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--columns', type=int, default=8)
+
+    def handle(self, *args, **options):
+        rows, batch_size = options['rows'], options['batch_size']
+        record = {f"col{i}": f"value-{i}" for i in range(options['columns'])}
+
+        paths = [('bulk_create', False)]
+        if supports_copy():
+            paths.append(('copy', True))
+        else:
+            self.stdout.write("Database is not PostgreSQL; skipping the COPY path.")
+
+        for label, use_copy in paths:
+            elapsed = self._run(use_copy, rows, batch_size, record)
+            self.stdout.write(f"{label:<12} {rows} rows in {elapsed:.2f}s ({rows / elapsed:,.0f} rows/sec)")
+
+    def _run(self, use_copy, rows, batch_size, record):
+        # Everything is written inside a rolled-back transaction so the benchmark
+        # leaves no users, uploads or rows behind.
+        with transaction.atomic():
+            suffix = uuid.uuid4().hex[:12]
+            user = User.objects.create_user(
+                username=f"bench-{suffix}", email=f"bench-{suffix}@example.com", password=None
+            )
+            upload = FileUpload(user=user)
+            upload.file.save("bench.csv", ContentFile(b"col\n"), save=True)
+            writer = RowWriter(upload.fileId, use_copy=use_copy)
+
+            started = time.perf_counter()
+            remaining = rows
+            while remaining > 0:
+                size = min(batch_size, remaining)
+                writer([record] * size)
+                remaining -= size
+            elapsed = time.perf_counter() - started
+
+            upload.file.delete(save=False)
+            transaction.set_rollback(True)
+        return elapsed
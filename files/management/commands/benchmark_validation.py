@@ -0,0 +1,79 @@
+import random
+import time
+from django.core.management.base import BaseCommand, CommandError
+from files.processing import validate_batch
+from files.schema import BatchCoercer, INT
+from files.validation import ErrorReport, compile_rules
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure rows/sec of the width check, type coercion and compiled "
+        "validation rules on synthetic batches, with a share of bad rows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=200000)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--bad-rate', type=float, default=0.01,
+                            help="Fraction of rows with a value that breaks a rule.")
+        parser.add_argument('--report-limit', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rows, batch_size, bad_rate = options['rows'], options['batch_size'], options['bad_rate']
+        if not 0 <= bad_rate <= 1:
+            raise CommandError("--bad-rate must be between 0 and 1.")
+        header = ['id', 'amount', 'email', 'day']
+        rules = compile_rules({
+            'required_columns': ['id', 'email'],
+            'columns': {
+                'id': {'type': INT, 'min': 1, 'unique': True},
+                'amount': {'type': 'float', 'min': 0, 'max': 1000},
+                'email': {'required': True, 'regex': r'[^@\s]+@[^@\s]+'},
+                'day': {'type': 'date'},
+            },
+        })
+        coerce = BatchCoercer(
+            [{'name': name, 'type': rules.types.get(name, 'string')} for name in header], strict=rules.types,
+        )
+        report = ErrorReport(options['report_limit'])
+        batches = self._batches(rows, batch_size, bad_rate)
+
+        totals = {'width': 0.0, 'coerce': 0.0, 'rules': 0.0}
+        accepted = 0
+        for start, batch in batches:
+            numbers = range(start + 1, start + len(batch) + 1)
+            mark = time.perf_counter()
+            batch, numbers, errors = validate_batch(header, batch, numbers)
+            now = time.perf_counter()
+            totals['width'] += now - mark
+            records, numbers, mistyped = coerce(batch, numbers)
+            mark = time.perf_counter()
+            totals['coerce'] += mark - now
+            records, numbers, broken = rules.check(records, numbers)
+            report.add(errors + mistyped + broken)
+            totals['rules'] += time.perf_counter() - mark
+            accepted += len(records)
+
+        for stage, elapsed in totals.items():
+            self.stdout.write(f"{stage:<8} {rows} rows in {elapsed:.2f}s ({rows / elapsed:,.0f} rows/sec)")
+        elapsed = sum(totals.values())
+        self.stdout.write(
+            f"{'total':<8} {rows} rows in {elapsed:.2f}s ({rows / elapsed:,.0f} rows/sec), "
+            f"{accepted} accepted, {report.count} error(s)"
+        )
+
+    def _batches(self, rows, batch_size, bad_rate):
+        # Built up front so generating rows is not part of the measurement
+        rng = random.Random(0)
+        bad = ('0', '-5', 'x@', '', '2025-13-01')
+        batches = []
+        for start in range(0, rows, batch_size):
+            batch = []
+            for n in range(start + 1, min(start + batch_size, rows) + 1):
+                row = [str(n), f"{n % 1000}.5", f"user{n}@example.com", "2025-07-06"]
+                if rng.random() < bad_rate:
+                    row[rng.randrange(4)] = rng.choice(bad)
+                batch.append(row)
+            batches.append((start, batch))
+        return batches
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from files.compression import compression_stats
+
+
+class Command(BaseCommand):
+    help = "Report upload bytes as CSV, as transferred and as stored, per compression."
+
+    def handle(self, *args, **options):
+        for compression, stats in compression_stats().items():
+            self.stdout.write(
+                f"{compression:<6} uploads={stats['uploads']} csv={stats['csv_bytes']} "
+                f"transferred={stats['transfer_bytes']} stored={stats['stored_bytes']} "
+                f"saved={stats['saved_bytes']}"
+            )
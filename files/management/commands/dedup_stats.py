@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from files.dedup import dedup_stats
+
+
+class Command(BaseCommand):
+    help = "Report how many uploads were deduplicated by content hash and the bytes involved."
+
+    def handle(self, *args, **options):
+        stats = dedup_stats()
+        self.stdout.write(f"Hashed uploads:      {stats['uploads']}")
+        self.stdout.write(f"Deduplicated:        {stats['duplicates']} ({stats['hit_rate']:.1%})")
+        self.stdout.write(f"Bytes uploaded:      {stats['bytes_total']}")
+        self.stdout.write(f"Bytes not processed: {stats['bytes_deduplicated']}")
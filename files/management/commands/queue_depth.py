@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from files.scheduling import queue_depths
+
+
+class Command(BaseCommand):
+    help = "Report processing jobs waiting in the fair queue and on the broker, per queue."
+
+    def handle(self, *args, **options):
+        for queue, depth in queue_depths().items():
+            self.stdout.write(
+                f"{queue:<12} deferred={depth['deferred']} ({depth['deferred_users']} user(s)) "
+                f"broker={depth['broker']}"
+            )
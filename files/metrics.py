@@ -0,0 +1,138 @@
+import os
+import time
+import logging
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.http import HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+    start_http_server,
+)
+
+
+logger = logging.getLogger(__name__)
+
+# Metric values are written per process when PROMETHEUS_MULTIPROC_DIR is set
+# (preforking web servers, Celery prefork pool) and merged at scrape time.
+
+REQUEST_LATENCY = Histogram(
+    'files_request_latency_seconds', 'API request latency by view.', ['view', 'method', 'status'],
+)
+TASK_STAGE_DURATION = Histogram(
+    'process_csv_file_stage_seconds', 'Time spent in each stage of process_csv_file.', ['stage'],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600),
+)
+QUEUE_WAIT = Histogram(
+    'process_csv_file_queue_wait_seconds', 'Time from FileUpload.created_at until processing started.',
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600),
+)
+STATUS_CHANGES = Counter(
+    'file_status_transitions_total', 'FileUpload status transitions applied.', ['status'],
+)
+STUCK_RECOVERIES = Counter(
+    'stuck_file_recoveries_total', 'Uploads re-enqueued by retry_stuck_files.',
+)
+CACHE_REQUESTS = Counter(
+    'files_cache_requests_total', 'Cache lookups by cache and result.', ['cache', 'result'],
+)
+DESIRED_WORKERS = Gauge(
+    'files_desired_workers', 'Worker processes the autoscaler wants per queue.', ['queue'],
+    multiprocess_mode='mostrecent',
+)
+QUEUE_DEPTH = Gauge(
+    'files_queue_depth', 'Processing jobs waiting, deferred in the fair queue or on the broker.',
+    ['queue', 'stage'], multiprocess_mode='mostrecent',
+)
+
+
+def record_cache(cache_name, hit, count=1):
+    if count:
+        CACHE_REQUESTS.labels(cache=cache_name, result='hit' if hit else 'miss').inc(count)
+
+
+class StageTimer:
+    """
+    Accumulates wall time per stage name so a stage that runs many times (one
+    persist per batch) is observed once with its total.
+    """
+
+    def __init__(self):
+        self.totals = {}
+
+    def add(self, stage, seconds):
+        self.totals[stage] = self.totals.get(stage, 0.0) + seconds
+
+    def wrap(self, stage, func):
+        if func is None:
+            return None
+
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(stage, time.perf_counter() - started)
+        return timed
+
+    def observe(self):
+        for stage, seconds in self.totals.items():
+            TASK_STAGE_DURATION.labels(stage=stage).observe(seconds)
+
+
+def get_registry():
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def metrics_view(request):
+    return HttpResponse(generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST)
+
+
+def start_worker_exporter(port):
+    # Runs in the Celery parent process; in multiprocess mode it serves the
+    # merged values written by every pool child.
+    start_http_server(port, registry=get_registry())
+    logger.info(f"[METRICS] Worker metrics exporter listening on port {port}")
+
+
+def mark_process_dead(pid):
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        multiprocess.mark_process_dead(pid)
+
+
+class RequestLatencyMiddleware:
+    """
+    Observes request latency labelled with the resolved URL name. Works for
+    both the sync views and the async event stream under ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _observe(self, request, response, started):
+        match = getattr(request, 'resolver_match', None)
+        if match is None or not match.url_name:
+            return
+        REQUEST_LATENCY.labels(
+            view=match.url_name, method=request.method, status=response.status_code,
+        ).observe(time.perf_counter() - started)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self._observe(request, response, started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self._observe(request, response, started)
+        return response
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0004_fileupload_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fileupload',
+            name='rows_processed',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='fileupload',
+            name='rows_rejected',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0005_fileupload_row_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessedRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('row_number', models.PositiveIntegerField()),
+                ('data', models.JSONField()),
+                ('upload', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rows', to='files.fileupload')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('upload', 'row_number'), name='unique_processed_row_per_upload')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0007_chunkedupload'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='fileupload',
+            index=models.Index(fields=['user', '-created_at', '-fileId'], name='fileupload_user_created_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0009_fileupload_lease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fileupload',
+            name='content_sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='fileupload',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='files.fileupload'),
+        ),
+        migrations.AddField(
+            model_name='fileupload',
+            name='file_size',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0010_fileupload_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fileupload',
+            name='profile',
+            field=models.BooleanField(default=False),
+        ),
+    ]
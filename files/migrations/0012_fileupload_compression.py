@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0011_fileupload_profile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fileupload',
+            name='compression',
+            field=models.CharField(blank=True, default='', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='fileupload',
+            name='stored_size',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='fileupload',
+            name='transfer_size',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0012_fileupload_compression'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fileupload',
+            name='schema',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
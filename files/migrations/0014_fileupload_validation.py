@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0013_fileupload_schema'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fileupload',
+            name='error_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='fileupload',
+            name='error_report',
+            field=models.FileField(blank=True, upload_to='error_reports/'),
+        ),
+        migrations.AddField(
+            model_name='fileupload',
+            name='spec_sha256',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='fileupload',
+            name='validation_rules',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0014_fileupload_validation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fileupload',
+            name='transform',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -1,7 +1,8 @@
 import uuid
 from django.db import models
+from django.utils import timezone
 from users.models import User
-from .choices import UPLOAD_STATUS_CHOICES, PENDING
+from .choices import UPLOAD_STATUS_CHOICES, STATUS_TRANSITIONS, PENDING, PROCESSING
 
 # Create your models here.
 class FileUpload(models.Model):
@@ -11,6 +12,104 @@ class FileUpload(models.Model):
     status = models.CharField(max_length=20, choices=UPLOAD_STATUS_CHOICES, default=PENDING)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    rows_processed = models.PositiveIntegerField(default=0)
+    rows_rejected = models.PositiveIntegerField(default=0)
+    lease_token = models.UUIDField(null=True, blank=True, editable=False)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    # file_size is the CSV size after decompression; transfer_size is what was
+    # uploaded and stored_size what is kept at rest, in ``compression`` format.
+    file_size = models.PositiveBigIntegerField(default=0)
+    transfer_size = models.PositiveBigIntegerField(default=0)
+    stored_size = models.PositiveBigIntegerField(default=0)
+    compression = models.CharField(max_length=10, blank=True, default='')
+    content_sha256 = models.CharField(max_length=64, null=True, blank=True, db_index=True)
+    duplicate_of = models.ForeignKey(
+        'self', on_delete=models.SET_NULL, null=True, blank=True, related_name='duplicates'
+    )
+    # Column names and types inferred from the head of the file, as
+    # [{"name": ..., "type": ...}]; null until the first processing run
+    schema = models.JSONField(null=True, blank=True)
+    # Declarative rules checked against every row; see files.validation
+    validation_rules = models.JSONField(null=True, blank=True)
+    # Select/rename, filter, derive and dedupe steps; see files.transforms
+    transform = models.JSONField(null=True, blank=True)
+    # Hash of the processing specs (rules, transform), so deduplication only links
+    # uploads that would produce the same results; '' when there are none
+    spec_sha256 = models.CharField(max_length=64, blank=True, default='')
+    # CSV of rejected rows, capped at VALIDATION_ERROR_REPORT_MAX_ROWS lines
+    error_report = models.FileField(upload_to='error_reports/', blank=True)
+    error_count = models.PositiveIntegerField(default=0)
+    # Set from the admin to capture a cProfile of the next processing run
+    profile = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # Serves the keyset-paginated my-files listing
+            models.Index(fields=['user', '-created_at', '-fileId'], name='fileupload_user_created_idx'),
+            # Only in-flight uploads are indexed, so lease recovery touches O(stuck jobs)
+            models.Index(
+                fields=['lease_expires_at'],
+                condition=models.Q(status__in=[PENDING, PROCESSING]),
+                name='fileupload_inflight_lease_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return self.file.name
+
+    @property
+    def results_upload(self):
+        # Deduplicated uploads share the processed rows of the upload they link to
+        return self.duplicate_of or self
+
+    def transition(self, new_status, expected, condition=None, **fields):
+        """
+        Move to ``new_status`` with one conditional
+        ``UPDATE ... WHERE status IN (<expected>)`` touching only the status,
+        ``updated_at`` and ``fields``. Returns True if this call won the race; the
+        instance is only updated when it did.
+        """
+        expected = (expected,) if isinstance(expected, str) else tuple(expected)
+        for status in expected:
+            if new_status not in STATUS_TRANSITIONS[status]:
+                raise ValueError(f"Invalid status transition: {status} -> {new_status}")
+
+        changes = {'status': new_status, 'updated_at': timezone.now(), **fields}
+        queryset = FileUpload.objects.filter(pk=self.pk, status__in=expected)
+        if condition is not None:
+            queryset = queryset.filter(condition)
+        if not queryset.update(**changes):
+            return False
+        for field, value in changes.items():
+            setattr(self, field, value)
+        return True
+
+
+class ProcessedRow(models.Model):
+    upload = models.ForeignKey(FileUpload, on_delete=models.CASCADE, related_name='rows')
+    row_number = models.PositiveIntegerField()
+    data = models.JSONField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['upload', 'row_number'], name='unique_processed_row_per_upload'),
+        ]
+
+    def __str__(self):
+        return f"{self.upload_id}:{self.row_number}"
+
+
+
+class ChunkedUpload(models.Model):
+    uploadId = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    file = models.FileField(upload_to='uploads/')
+    offset = models.PositiveBigIntegerField(default=0)
+    total_size = models.PositiveBigIntegerField(null=True, blank=True)
+    upload = models.OneToOneField(FileUpload, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return self.file.name
\ No newline at end of file
+        return self.filename
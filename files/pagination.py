@@ -0,0 +1,90 @@
+import base64
+import uuid
+from collections import OrderedDict
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Forward-only keyset pagination over ``(-created_at, -fileId)``. The cursor is
+    the key of the last row on the previous page, so every page is an index
+    range scan of the same cost no matter how deep into the history it is.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, settings.MY_FILES_PAGE_SIZE))
+        except ValueError:
+            size = settings.MY_FILES_PAGE_SIZE
+        return max(1, min(size, settings.MY_FILES_MAX_PAGE_SIZE))
+
+    def encode_cursor(self, instance):
+        raw = f"{instance.created_at.isoformat()}|{instance.fileId}"
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            created_at, file_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+            created_at = parse_datetime(created_at)
+            file_id = uuid.UUID(file_id)
+        except (ValueError, UnicodeDecodeError):
+            raise NotFound("Invalid cursor.")
+        if created_at is None:
+            raise NotFound("Invalid cursor.")
+        return created_at, file_id
+
+    def _page_window(self, queryset, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        queryset = queryset.order_by('-created_at', '-fileId')
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            created_at, file_id = self.decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, fileId__lt=file_id)
+            )
+        # One extra row tells us whether a next page exists without a COUNT query
+        return queryset[:self.page_size + 1]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self._take_page(list(self._page_window(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request):
+        return self._take_page([row async for row in self._page_window(queryset, request)])
+
+    def _take_page(self, page):
+        self.has_next = len(page) > self.page_size
+        page = page[:self.page_size]
+        self.next_cursor = self.encode_cursor(page[-1]) if self.has_next else None
+        return page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
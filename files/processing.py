@@ -0,0 +1,302 @@
+import csv
+import io
+import time
+from dataclasses import dataclass
+from operator import itemgetter
+from django.conf import settings
+from .compression import DECOMPRESSION_ERRORS, compression_for, open_decompressed
+from .schema import STRING, BatchCoercer, infer_schema
+from .transforms import TransformError, parse_transform
+from .validation import compile_rules
+
+
+class CSVProcessingError(Exception):
+    pass
+
+
+@dataclass
+class ProcessingStats:
+    rows_processed: int = 0
+    rows_rejected: int = 0
+    # Dropped on purpose by a transform's filters and dedupe
+    rows_filtered: int = 0
+    # Inferred columns widened to hold values the sample did not show
+    widened: dict | None = None
+    batches: int = 0
+    # Wall time spent reading and parsing, validating and transforming; the
+    # sink and heartbeat are timed by the caller.
+    read_seconds: float = 0.0
+    validate_seconds: float = 0.0
+    coerce_seconds: float = 0.0
+    transform_seconds: float = 0.0
+
+
+class _RangeReader(io.RawIOBase):
+    # Exposes bytes [start, end) of a seekable binary file as its own stream.
+    def __init__(self, raw, start, end):
+        self.raw = raw
+        self.remaining = None if end is None else end - start
+        self.raw.seek(start)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = len(buffer)
+        if self.remaining is not None:
+            size = min(size, self.remaining)
+        if size <= 0:
+            return 0
+        data = self.raw.read(size)
+        buffer[:len(data)] = data
+        if self.remaining is not None:
+            self.remaining -= len(data)
+        return len(data)
+
+
+def _open_rows(field_file):
+    # Binary stream of the CSV text, decompressed on the fly for .gz/.zst files
+    field_file.open('rb')
+    compression = compression_for(field_file.name)
+    if compression:
+        return open_decompressed(field_file.file, compression)
+    return field_file.file
+
+
+def read_header(field_file):
+    """
+    Return the parsed header row and the byte offset at which the data rows
+    start. For compressed files the offset is into the decompressed stream.
+    """
+    try:
+        line = _open_rows(field_file).readline()
+    except DECOMPRESSION_ERRORS as e:
+        if not compression_for(field_file.name):
+            raise
+        raise CSVProcessingError(f"Could not decompress file: {e}") from e
+    finally:
+        field_file.close()
+    try:
+        header = next(csv.reader([line.decode('utf-8-sig')]), None)
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise CSVProcessingError(f"Could not parse CSV file: {e}") from e
+    if not header:
+        raise CSVProcessingError("CSV file is empty or has no header row.")
+    return [column.strip() for column in header], len(line)
+
+
+def iter_row_batches(field_file, batch_size=None, byte_range=None):
+    # Streams the stored upload as lists of raw rows so only one batch is held in
+    # memory at a time, regardless of the file size. ``byte_range`` restricts the
+    # data rows to a row-aligned (start, end) slice of the file; compressed
+    # files can only be read from the start.
+    batch_size = batch_size or settings.CSV_BATCH_SIZE
+    header, data_start = read_header(field_file)
+    compression = compression_for(field_file.name)
+
+    if compression:
+        if byte_range:
+            raise CSVProcessingError("Compressed files cannot be read in byte ranges.")
+        stream = _open_rows(field_file)
+        stream.readline()
+    else:
+        start, end = byte_range or (data_start, None)
+        field_file.open('rb')
+        stream = io.BufferedReader(_RangeReader(field_file.file, start, end))
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    try:
+        batch = []
+        for row in csv.reader(text):
+            if not row:
+                continue
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield header, batch
+                batch = []
+        if batch:
+            yield header, batch
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise CSVProcessingError(f"Could not parse CSV file: {e}") from e
+    except DECOMPRESSION_ERRORS as e:
+        if not compression:
+            raise
+        raise CSVProcessingError(f"Could not decompress file: {e}") from e
+    finally:
+        text.close()
+        field_file.close()
+
+
+def _record_ends(raw):
+    # Yields the byte offset just past each CSV record. The csv reader pulls
+    # lines only until a record is complete, so a quoted field spanning lines
+    # stays inside one record.
+    position = raw.tell()
+
+    def lines():
+        nonlocal position
+        for line in iter(raw.readline, b''):
+            position += len(line)
+            yield line.decode('utf-8')
+
+    for _ in csv.reader(lines()):
+        yield position
+
+
+def compute_shard_ranges(field_file, shard_size):
+    """
+    Split the data rows of ``field_file`` into (start, end) byte ranges of roughly
+    ``shard_size`` bytes. Boundaries are found with one csv reader pass, so
+    every range starts on a record even when quoted fields contain newlines.
+    """
+    _, data_start = read_header(field_file)
+    total = field_file.size
+    ranges = []
+    field_file.open('rb')
+    try:
+        raw = field_file.file
+        raw.seek(data_start)
+        start = data_start
+        for end in _record_ends(raw):
+            if end - start >= shard_size:
+                ranges.append((start, end))
+                start = end
+        if start < total:
+            ranges.append((start, total))
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise CSVProcessingError(f"Could not parse CSV file: {e}") from e
+    finally:
+        field_file.close()
+    return ranges
+
+
+def infer_file_schema(field_file, sample_rows=None):
+    # Types are inferred from the head of the file only, so inference costs one
+    # batch no matter how large the file is.
+    sample_rows = sample_rows or settings.CSV_SCHEMA_SAMPLE_ROWS
+    for header, rows in iter_row_batches(field_file, batch_size=sample_rows):
+        return infer_schema(header, [row for row in rows if len(row) == len(header)])
+    return None
+
+
+def validate_batch(header, rows, numbers):
+    # Rows whose field count does not match the header cannot be mapped to columns.
+    width = len(header)
+    valid = [row for row in rows if len(row) == width]
+    if len(valid) == len(rows):
+        return valid, numbers, []
+    errors = [
+        (number, '', '', f"expected {width} fields, got {len(row)}")
+        for number, row in zip(numbers, rows) if len(row) != width
+    ]
+    return valid, [number for number, row in zip(numbers, rows) if len(row) == width], errors
+
+
+def transform_batch(header, rows):
+    return [dict(zip(header, (value.strip() for value in row))) for row in rows]
+
+
+def _projector(header, needed):
+    # Returns the kept header and a function keeping only the ``needed``
+    # columns of each row, so later stages never convert or copy the rest.
+    # The function is None when every column is needed.
+    indexes = [index for index, name in enumerate(header) if name in needed]
+    if not indexes or len(indexes) == len(header):
+        return header, None
+    pick = itemgetter(*indexes)
+    if len(indexes) == 1:
+        return [header[indexes[0]]], lambda rows: [(pick(row),) for row in rows]
+    return [header[index] for index in indexes], lambda rows: list(map(pick, rows))
+
+
+def _coercer_for(header, schema, rules):
+    # Rule types override the inferred ones, and only they reject rows
+    types = {column['name']: column['type'] for column in schema or ()}
+    strict = rules.types if rules is not None else {}
+    types.update(strict)
+    if not types:
+        return None
+    return BatchCoercer([{'name': name, 'type': types.get(name, STRING)} for name in header], strict=strict)
+
+
+def run_pipeline(upload, sink=None, batch_size=None, byte_range=None, heartbeat=None, report=None):
+    """
+    Parse, validate and transform ``upload.file`` batch by batch, handing each
+    transformed batch to ``sink`` and calling ``heartbeat`` after every batch.
+    When the upload has a schema, values are coerced to its column types, and
+    its validation rules are applied to the coerced rows. Its transform then
+    runs over the rows that passed, reading only the columns it needs. Rejected
+    rows are written to the ErrorReport ``report``, numbered from the first
+    data row. Returns the accumulated ProcessingStats.
+    """
+    stats = ProcessingStats()
+    rules = compile_rules(upload.validation_rules) if upload.validation_rules else None
+    spec = parse_transform(upload.transform) if upload.transform else None
+    coerce = transform = project = columns = None
+    seen = 0
+    mark = time.perf_counter()
+    for header, rows in iter_row_batches(upload.file, batch_size=batch_size, byte_range=byte_range):
+        now = time.perf_counter()
+        stats.read_seconds += now - mark
+        if not stats.batches:
+            missing = rules.missing_columns(header) if rules is not None else []
+            if missing:
+                if report is not None:
+                    report.add((0, name, '', "missing required column") for name in missing)
+                raise CSVProcessingError(f"Missing required column(s): {', '.join(missing)}")
+            columns = header
+            if spec is not None:
+                try:
+                    transform = spec.compile(header)
+                except TransformError as e:
+                    if report is not None:
+                        report.add([(0, '', '', str(e))])
+                    raise CSVProcessingError(f"Invalid transform: {e}")
+                needed = set(transform.input_columns) | (rules.columns if rules is not None else set())
+                columns, project = _projector(header, needed)
+            coerce = _coercer_for(columns, upload.schema, rules)
+        numbers = range(seen + 1, seen + len(rows) + 1)
+        seen += len(rows)
+        received = len(rows)
+
+        rows, numbers, errors = validate_batch(header, rows, numbers)
+        if project is not None:
+            rows = project(rows)
+        mark = time.perf_counter()
+        stats.validate_seconds += mark - now
+        if coerce is not None:
+            records, numbers, mistyped = coerce(rows, numbers)
+            errors += mistyped
+            now = time.perf_counter()
+            stats.coerce_seconds += now - mark
+        else:
+            records = transform_batch(columns, rows)
+            now = time.perf_counter()
+            stats.transform_seconds += now - mark
+        if rules is not None:
+            records, numbers, broken = rules.check(records, numbers)
+            errors += broken
+            mark = time.perf_counter()
+            stats.validate_seconds += mark - now
+        filtered = 0
+        if transform is not None:
+            now = time.perf_counter()
+            valid = len(records)
+            records, numbers, failed = transform(records, numbers)
+            errors += failed
+            filtered = valid - len(records) - len(failed)
+            stats.rows_filtered += filtered
+            stats.transform_seconds += time.perf_counter() - now
+        if errors and report is not None:
+            report.add(errors)
+
+        if sink is not None and records:
+            sink(records)
+        stats.batches += 1
+        stats.rows_processed += len(records)
+        stats.rows_rejected += received - len(records) - filtered
+        if heartbeat is not None:
+            heartbeat()
+        mark = time.perf_counter()
+    if coerce is not None and coerce.widened:
+        stats.widened = coerce.widened
+    return stats
@@ -0,0 +1,163 @@
+import logging
+import redis
+from celery import current_app
+from django.conf import settings
+from .events import get_redis
+from .metrics import QUEUE_DEPTH
+
+
+logger = logging.getLogger(__name__)
+
+# Fair scheduling keeps each user's pending jobs in their own Redis list, in
+# upload order, and a ring of users with pending work. The dispatcher walks the
+# ring releasing one job per user per turn, and only releases as many jobs as
+# keep the broker queue at FAIR_QUEUE_TARGET_DEPTH, so a burst from one user
+# waits behind its owner instead of in front of everyone else.
+
+
+def queue_for(upload):
+    if upload.file_size > settings.CSV_SMALL_FILE_MAX_BYTES:
+        return settings.CSV_LARGE_QUEUE
+    return settings.CSV_SMALL_QUEUE
+
+
+def processing_queues():
+    return [settings.CSV_SMALL_QUEUE, settings.CSV_LARGE_QUEUE]
+
+
+def _user_key(queue, user_id):
+    return f"fair_queue:{queue}:user:{user_id}"
+
+
+def _ring_key(queue):
+    return f"fair_queue:{queue}:ring"
+
+
+def _members_key(queue):
+    return f"fair_queue:{queue}:members"
+
+
+def _lock_key(queue):
+    return f"fair_queue:{queue}:dispatching"
+
+
+def send_to_worker(file_id, queue):
+    # Imported here because the tasks module schedules through this one
+    from .tasks import process_csv_file
+
+    process_csv_file.apply_async((str(file_id),), queue=queue)
+
+
+def broker_queue_depth(queue, app=None):
+    app = app or current_app
+    if app.conf.task_always_eager:
+        return 0
+    with app.pool.acquire(block=True) as connection:
+        channel = connection.channel()
+        try:
+            return channel.queue_declare(queue=queue, passive=True).message_count
+        except connection.channel_errors:
+            # Not declared yet, so nothing has been published to it
+            return 0
+        finally:
+            channel.close()
+
+
+def enqueue_upload(upload):
+    """
+    Route ``upload`` to the small or large queue by size, through the per-user
+    fair queue when it is enabled.
+    """
+    queue = queue_for(upload)
+    if not settings.FAIR_SCHEDULING_ENABLED:
+        send_to_worker(upload.fileId, queue)
+        return
+    try:
+        client = get_redis()
+        client.rpush(_user_key(queue, upload.user_id), str(upload.fileId))
+        if client.sadd(_members_key(queue), upload.user_id):
+            client.lpush(_ring_key(queue), upload.user_id)
+    except redis.RedisError as e:
+        logger.warning(f"[SCHEDULER] Fair queue unavailable, sending file {upload.fileId} directly: {str(e)}")
+        send_to_worker(upload.fileId, queue)
+        return
+    dispatch_quietly(queue)
+
+
+def dispatch(queue):
+    """
+    Release deferred jobs for ``queue`` round-robin across users until the
+    broker queue reaches FAIR_QUEUE_TARGET_DEPTH. Returns the number released.
+    """
+    client = get_redis()
+    # One dispatcher per queue at a time; the lock expires if its holder dies
+    if not client.set(_lock_key(queue), 1, nx=True, px=settings.FAIR_DISPATCH_LOCK_MS):
+        return 0
+    released = 0
+    try:
+        budget = settings.FAIR_QUEUE_TARGET_DEPTH - broker_queue_depth(queue)
+        while released < budget:
+            # Rotate the ring: the user who waited longest gets the next turn
+            user_id = client.rpoplpush(_ring_key(queue), _ring_key(queue))
+            if user_id is None:
+                break
+            user_id = user_id.decode()
+            file_id = client.lpop(_user_key(queue, user_id))
+            if file_id is None:
+                _retire_user(client, queue, user_id)
+                continue
+            send_to_worker(file_id.decode(), queue)
+            released += 1
+    finally:
+        client.delete(_lock_key(queue))
+    if released:
+        logger.info(f"[SCHEDULER] Released {released} job(s) to {queue}")
+    return released
+
+
+def _retire_user(client, queue, user_id):
+    client.lrem(_ring_key(queue), 0, user_id)
+    client.srem(_members_key(queue), user_id)
+    # An upload may have been pushed after the list was found empty
+    if client.llen(_user_key(queue, user_id)) and client.sadd(_members_key(queue), user_id):
+        client.lpush(_ring_key(queue), user_id)
+
+
+def dispatch_quietly(queue):
+    try:
+        return dispatch(queue)
+    except redis.RedisError as e:
+        logger.warning(f"[SCHEDULER] Could not dispatch {queue}: {str(e)}")
+        return 0
+
+
+def deferred_depth(queue):
+    client = get_redis()
+    user_ids = [user_id.decode() for user_id in client.lrange(_ring_key(queue), 0, -1)]
+    return {user_id: client.llen(_user_key(queue, user_id)) for user_id in user_ids}
+
+
+def deferred_file_ids(queue):
+    client = get_redis()
+    user_ids = {user_id.decode() for user_id in client.lrange(_ring_key(queue), 0, -1)}
+    return {
+        file_id.decode() for user_id in user_ids for file_id in client.lrange(_user_key(queue, user_id), 0, -1)
+    }
+
+
+def queue_depths():
+    """
+    Jobs waiting per processing queue: ``deferred`` in the fair queue,
+    ``broker`` already published. Also updates the queue depth gauge.
+    """
+    depths = {}
+    for queue in processing_queues():
+        per_user = deferred_depth(queue) if settings.FAIR_SCHEDULING_ENABLED else {}
+        depths[queue] = {
+            'deferred': sum(per_user.values()),
+            'deferred_users': len(per_user),
+            'broker': broker_queue_depth(queue),
+        }
+        QUEUE_DEPTH.labels(queue=queue, stage='deferred').set(depths[queue]['deferred'])
+        QUEUE_DEPTH.labels(queue=queue, stage='broker').set(depths[queue]['broker'])
+    return depths
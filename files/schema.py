@@ -0,0 +1,186 @@
+import math
+import re
+from datetime import date
+
+
+INT, FLOAT, BOOL, DATE, STRING = 'int', 'float', 'bool', 'date', 'string'
+# Narrowest first: a column gets the first type every sampled value parses as
+INFERENCE_ORDER = (INT, FLOAT, BOOL, DATE)
+# An inferred column that meets a value it cannot hold is widened, never
+# rejected: int -> float -> string, and bool or date -> string
+WIDER = {INT: FLOAT, FLOAT: STRING, BOOL: STRING, DATE: STRING}
+
+# Plain decimal notation only: int() and float() also accept '1_000'
+_INT = re.compile(r'[+-]?\d+')
+_FLOAT = re.compile(r'[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?')
+_DATE = re.compile(r'\d{4}-\d{2}-\d{2}')
+_LEADING_ZERO = re.compile(r'[+-]?0\d')
+
+_BOOLS = {
+    'true': True, 't': True, 'yes': True, 'y': True,
+    'false': False, 'f': False, 'no': False, 'n': False,
+}
+
+
+def _parse_bool(value):
+    try:
+        return _BOOLS[value.lower()]
+    except KeyError:
+        raise ValueError(f"Not a boolean: {value!r}")
+
+
+def _parse_int(value):
+    if not _INT.fullmatch(value):
+        raise ValueError(f"Not an integer: {value!r}")
+    return int(value)
+
+
+def _parse_float(value):
+    if not _FLOAT.fullmatch(value):
+        raise ValueError(f"Not a number: {value!r}")
+    number = float(value)
+    # NaN and infinity cannot be stored as JSON
+    if not math.isfinite(number):
+        raise ValueError(f"Not a finite number: {value!r}")
+    return number
+
+
+def _parse_date(value):
+    # Stored as ISO strings so the rows stay JSON serialisable
+    if not _DATE.fullmatch(value):
+        raise ValueError(f"Not an ISO date: {value!r}")
+    return date.fromisoformat(value).isoformat()
+
+
+def _lossless(parse):
+    # Inferred numbers must not drop leading zeros, as in zip codes or ids
+    def parse_number(value):
+        if _LEADING_ZERO.match(value):
+            raise ValueError(f"Has leading zeros: {value!r}")
+        return parse(value)
+    return parse_number
+
+
+# Used for types declared by validation rules
+PARSERS = {INT: _parse_int, FLOAT: _parse_float, BOOL: _parse_bool, DATE: _parse_date}
+# Used for inferred types, which only hold values that round-trip
+INFERRED_PARSERS = {**PARSERS, INT: _lossless(_parse_int), FLOAT: _lossless(_parse_float)}
+
+
+def _parses_as(parse, value):
+    try:
+        parse(value)
+    except ValueError:
+        return False
+    return True
+
+
+def infer_schema(header, rows):
+    """
+    Infer a type for every column of ``header`` from the sample ``rows``.
+    Empty cells are ignored; a column with no values is a string column.
+    Returns a list of ``{'name': ..., 'type': ...}``.
+    """
+    candidates = [list(INFERENCE_ORDER) for _ in header]
+    seen = [False] * len(header)
+    for row in rows:
+        for index, value in enumerate(row):
+            value = value.strip()
+            if not value:
+                continue
+            seen[index] = True
+            candidates[index] = [t for t in candidates[index] if _parses_as(INFERRED_PARSERS[t], value)]
+    return [
+        {'name': name, 'type': types[0] if seen[index] and types else STRING}
+        for index, (name, types) in enumerate(zip(header, candidates))
+    ]
+
+
+def _widening_chain(type_):
+    chain = [type_]
+    while chain[-1] in WIDER:
+        chain.append(WIDER[chain[-1]])
+    return chain
+
+
+def widen_schema(schema, *widened):
+    """
+    Return ``schema`` with each column set to the widest type any of the
+    ``widened`` mappings gives it. Shards widen the same stored types
+    independently, so their types all lie on the chain of the stored one.
+    """
+    columns = []
+    for column in schema:
+        chain = _widening_chain(column['type'])
+        types = [column['type']] + [each[column['name']] for each in widened if column['name'] in each]
+        columns.append({**column, 'type': max(types, key=lambda type_: chain.index(type_) if type_ in chain else -1)})
+    return columns
+
+
+def _convert_column(values, parse):
+    """
+    Convert one column. The whole column goes through a single ``map()``; only
+    a column containing an empty or unparseable cell is redone cell by cell.
+    Returns the converted values and the indexes of unparseable cells.
+    """
+    try:
+        return list(map(parse, values)), ()
+    except ValueError:
+        pass
+    converted, bad = [], []
+    for index, value in enumerate(values):
+        if not value:
+            converted.append(None)
+            continue
+        try:
+            converted.append(parse(value))
+        except ValueError:
+            converted.append(None)
+            bad.append(index)
+    return converted, bad
+
+
+class BatchCoercer:
+    """
+    Coerces batches of raw rows to the types of ``schema`` column by column.
+    Only the ``strict`` columns, whose types were declared by validation rules,
+    reject rows with a value that does not parse. Any other column is widened
+    for the rest of the run instead, and ``widened`` maps it to its new type.
+    """
+
+    def __init__(self, schema, strict=()):
+        self.names = [column['name'] for column in schema]
+        self.types = [column['type'] for column in schema]
+        self.strict = [column['name'] in strict for column in schema]
+        self.widened = {}
+
+    def _convert(self, index, raw):
+        values = [value.strip() for value in raw]
+        while self.types[index] != STRING:
+            type_ = self.types[index]
+            parse = PARSERS[type_] if self.strict[index] else INFERRED_PARSERS[type_]
+            converted, bad = _convert_column(values, parse)
+            if not bad or self.strict[index]:
+                return converted, bad
+            self.types[index] = self.widened[self.names[index]] = WIDER[type_]
+        return values, ()
+
+    def __call__(self, rows, numbers):
+        """
+        Return the coerced records, the row numbers they came from, and a
+        ``(row_number, column, value, message)`` error for every bad cell.
+        """
+        if not rows:
+            return [], numbers, []
+        columns, errors, bad_rows = [], [], set()
+        for index, raw in enumerate(zip(*rows)):
+            values, bad = self._convert(index, raw)
+            for row in bad:
+                errors.append((numbers[row], self.names[index], raw[row], f"not a valid {self.types[index]}"))
+            bad_rows.update(bad)
+            columns.append(values)
+        records = [dict(zip(self.names, values)) for values in zip(*columns)]
+        if bad_rows:
+            keep = [index for index in range(len(records)) if index not in bad_rows]
+            records, numbers = [records[index] for index in keep], [numbers[index] for index in keep]
+        return records, numbers, errors
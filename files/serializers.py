@@ -1,29 +1,96 @@
 from rest_framework import serializers
-from .models import FileUpload
+from django.conf import settings
+from .models import FileUpload, ChunkedUpload
+from .compression import CompressionError, compression_for, inspect_compressed, is_supported_upload
+from .transforms import TransformError, parse_transform
+from .validation import RuleError, compile_rules
+
+
+def validate_rules(value):
+    if value is not None:
+        try:
+            compile_rules(value)
+        except RuleError as e:
+            raise serializers.ValidationError(str(e))
+    return value
+
+
+def validate_transform(value):
+    if value is not None:
+        try:
+            parse_transform(value)
+        except TransformError as e:
+            raise serializers.ValidationError(str(e))
+    return value
 
 
 class FileUploadSerializer(serializers.ModelSerializer):
+    validation_rules = serializers.JSONField(required=False, allow_null=True, validators=[validate_rules])
+    transform = serializers.JSONField(required=False, allow_null=True, validators=[validate_transform])
+
     class Meta:
         model = FileUpload
-        fields = ['file', 'fileId', 'status']
-        read_only_fields = ['fileId', 'status']
+        fields = ['file', 'fileId', 'status', 'duplicate_of', 'validation_rules', 'transform']
+        read_only_fields = ['fileId', 'status', 'duplicate_of']
 
     def validate_file(self, value):
-        if not value.name.lower().endswith('.csv'):
+        if not is_supported_upload(value.name):
             raise serializers.ValidationError("Only CSV files are allowed.")
-        if value.size > 10 * 1024 * 1024:
-            raise serializers.ValidationError("File size must not exceed 10MB.")
+        limit = settings.UPLOAD_MAX_SIZE
+        if value.size > limit:
+            raise serializers.ValidationError(f"File size must not exceed {limit // (1024 * 1024)}MB.")
+        compression = compression_for(value.name)
+        if compression:
+            # The limit applies to the CSV itself; the digest is of the CSV too,
+            # so compressed and plain copies of a file deduplicate.
+            try:
+                value.decompressed_size, value.sha256 = inspect_compressed(value, compression, limit)
+            except CompressionError as e:
+                raise serializers.ValidationError(str(e))
         return value
 
 
+class ChunkedUploadFinalizeSerializer(serializers.Serializer):
+    validation_rules = serializers.JSONField(required=False, allow_null=True, validators=[validate_rules])
+    transform = serializers.JSONField(required=False, allow_null=True, validators=[validate_transform])
+
+
 class FileStatusSerializer(serializers.ModelSerializer):
     class Meta:
         model = FileUpload
-        fields = ['fileId', 'status', 'created_at', 'file']
+        fields = ['fileId', 'status', 'created_at', 'file', 'rows_processed', 'rows_rejected']
         read_only_fields = fields
 
 
 class FileListSerializer(serializers.ModelSerializer):
     class Meta:
         model = FileUpload
-        fields = ['fileId', 'created_at']
\ No newline at end of file
+        fields = ['fileId', 'created_at']
+
+
+class ChunkedUploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ChunkedUpload
+        fields = ['uploadId', 'filename', 'total_size', 'offset']
+        read_only_fields = ['uploadId', 'offset']
+
+    def validate_filename(self, value):
+        if not is_supported_upload(value):
+            raise serializers.ValidationError("Only CSV files are allowed.")
+        return value
+
+    def validate_total_size(self, value):
+        if value is not None and value > settings.CHUNKED_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                f"File size must not exceed {settings.CHUNKED_UPLOAD_MAX_SIZE} bytes."
+            )
+        return value
+
+
+
+class FileStatusBatchSerializer(serializers.Serializer):
+    fileIds = serializers.ListField(
+        child=serializers.UUIDField(),
+        allow_empty=False,
+        max_length=settings.STATUS_BATCH_MAX_IDS,
+    )
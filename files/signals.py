@@ -0,0 +1,31 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.db.models import Q
+from django.dispatch import receiver
+from .dedup import promote_duplicate
+from .list_cache import bump_user_files_version
+from .models import FileUpload
+from .status_cache import invalidate_status
+
+
+@receiver(post_save, sender=FileUpload)
+def file_upload_saved(sender, instance, **kwargs):
+    # Task transitions write their record through; any other save drops it
+    invalidate_status(instance.fileId)
+    bump_user_files_version(instance.user_id)
+
+
+@receiver(pre_delete, sender=FileUpload)
+def file_upload_deleting(sender, instance, **kwargs):
+    # Runs inside the delete's transaction, before the rows are cascaded away.
+    # Duplicates can belong to other users, so they keep working.
+    heir = promote_duplicate(instance)
+    if heir is not None:
+        for user_id in set(FileUpload.objects.filter(Q(pk=heir.pk) | Q(duplicate_of=heir.pk))
+                           .values_list('user_id', flat=True)):
+            bump_user_files_version(user_id)
+
+
+@receiver(post_delete, sender=FileUpload)
+def file_upload_deleted(sender, instance, **kwargs):
+    invalidate_status(instance.fileId)
+    bump_user_files_version(instance.user_id)
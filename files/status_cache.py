@@ -0,0 +1,83 @@
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.fields import DateTimeField
+
+
+STATUS_RECORD_FIELDS = (
+    'fileId', 'status', 'created_at', 'updated_at', 'rows_processed', 'rows_rejected',
+    'compression', 'file_size', 'transfer_size', 'stored_size', 'error_count',
+)
+# Columns needed to build a record, for use with QuerySet.only()
+STATUS_RECORD_ONLY = STATUS_RECORD_FIELDS + ('file', 'user_id')
+
+
+def status_cache_key(file_id):
+    return f"file_status_record:{file_id}"
+
+_datetime = DateTimeField()
+
+
+def build_status_record(upload):
+    # The owner id travels with the record so cache hits can be authorised
+    # without touching the database. Timestamps are rendered exactly as the
+    # serializers render them so cached and fresh responses are identical.
+    return {
+        'fileId': str(upload.fileId),
+        'status': upload.status,
+        'created_at': _datetime.to_representation(upload.created_at) if upload.created_at else None,
+        'updated_at': _datetime.to_representation(upload.updated_at) if upload.updated_at else None,
+        'rows_processed': upload.rows_processed,
+        'rows_rejected': upload.rows_rejected,
+        'compression': upload.compression,
+        'file_size': upload.file_size,
+        'transfer_size': upload.transfer_size,
+        'stored_size': upload.stored_size,
+        'error_count': upload.error_count,
+        'file': upload.file.name or None,
+        'user_id': upload.user_id,
+    }
+
+
+def public_status(record):
+    return {field: record[field] for field in STATUS_RECORD_FIELDS}
+
+
+def get_status_records(file_ids):
+    keys = {status_cache_key(file_id): str(file_id) for file_id in file_ids}
+    found = cache.get_many(list(keys))
+    return {keys[key]: record for key, record in found.items()}
+
+
+def get_status_record(file_id):
+    return cache.get(status_cache_key(file_id))
+
+
+async def aget_status_record(file_id):
+    return await cache.aget(status_cache_key(file_id))
+
+
+def write_status(upload):
+    # Write-through: called with the upload as it was just persisted.
+    cache.set(status_cache_key(upload.fileId), build_status_record(upload), timeout=settings.STATUS_CACHE_TIMEOUT)
+
+
+# Cache misses only fill an empty slot. A record read from the database can
+# be older than one a task writes through in the meantime, and must not
+# replace it.
+
+def fill_status_records(records):
+    # There is no add_many; misses are rare, since records are written through
+    for record in records:
+        cache.add(status_cache_key(record['fileId']), record, timeout=settings.STATUS_CACHE_TIMEOUT)
+
+
+def fill_status(record):
+    cache.add(status_cache_key(record['fileId']), record, timeout=settings.STATUS_CACHE_TIMEOUT)
+
+
+async def afill_status(record):
+    await cache.aadd(status_cache_key(record['fileId']), record, timeout=settings.STATUS_CACHE_TIMEOUT)
+
+
+def invalidate_status(file_id):
+    cache.delete(status_cache_key(file_id))
@@ -1,36 +1,52 @@
 import time
-import random
 import logging
-from celery import shared_task
-from .models import FileUpload
+import redis
+from celery import shared_task, chord
+from .choices import PENDING, PROCESSING, COMPLETED, FAILED
+from .models import FileUpload, ProcessedRow
+from .ingest import RowWriter
+from .events import publish_status
+from .status_cache import STATUS_RECORD_ONLY, write_status
+from .leases import Lease, LeaseLost
+from .list_cache import bump_user_files_version
+from .metrics import QUEUE_WAIT, STATUS_CHANGES, STUCK_RECOVERIES, StageTimer
+from .processing import run_pipeline, compute_shard_ranges, infer_file_schema, CSVProcessingError
+from .schema import widen_schema
+from .compression import compression_for
+from .transforms import parse_transform
+from .validation import ErrorReport
+from .tracing import TaskProfile, span
+from .scheduling import (
+    deferred_file_ids, dispatch_quietly, enqueue_upload, queue_depths, queue_for, processing_queues, send_to_worker,
+)
 from datetime import timedelta
 from django.core.mail import send_mail
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
 from django.utils import timezone
+from django_celery_results.models import GroupResult, TaskResult
 
 
 
 logger = logging.getLogger(__name__)
 
-@shared_task(name='process_csv_file')
-def process_csv_file(file_id):
-    try:
-        logger.info(f"[START] Received task to process file ID: {file_id}")
-        upload = FileUpload.objects.get(fileId=file_id)
+def _status_changed(upload, **extra):
+    # Transitions are conditional UPDATEs that bypass post_save, so every side
+    # effect of a status change is applied here.
+    STATUS_CHANGES.labels(status=upload.status).inc()
+    write_status(upload)
+    bump_user_files_version(upload.user_id)
+    publish_status(upload.fileId, upload.status, **extra)
 
-        logger.info(f"[PROCESSING] Updating file {file_id} status to 'processing'")
-        upload.status = 'processing'
-        upload.save()
 
-        delay = random.randint(30, 60)
-        logger.info(f"[WAITING] Simulating processing for {delay} seconds for file {file_id}")
-        time.sleep(delay)
+def _held_by(lease_token):
+    return Q(lease_token=lease_token) if lease_token else None
 
-        logger.info(f"[COMPLETED] Updating file {file_id} status to 'completed'")
-        upload.status = 'completed'
-        upload.save()
-        
-        logger.info(f"[EMAIL] Sending email to {upload.user.email} for file {file_id}")
+
+def _notify_user(upload):
+    logger.info(f"[EMAIL] Sending email to {upload.user.email} for file {upload.fileId}")
+    with span('send_mail', file_id=str(upload.fileId)):
         send_mail(
             subject="Your file has been processed",
             message=f"Hello {upload.user.username},\n\nYour uploaded CSV file '{upload.fileId}' has been successfully processed.",
@@ -38,23 +54,312 @@ def process_csv_file(file_id):
             recipient_list=[upload.user.email],
             fail_silently=False,
         )
+
+
+def _pipeline_attributes(stats):
+    return {
+        'rows_processed': stats.rows_processed,
+        'rows_rejected': stats.rows_rejected,
+        'rows_filtered': stats.rows_filtered,
+        'batches': stats.batches,
+        'read_ms': stats.read_seconds * 1000,
+        'validate_ms': stats.validate_seconds * 1000,
+        'coerce_ms': stats.coerce_seconds * 1000,
+        'transform_ms': stats.transform_seconds * 1000,
+    }
+
+
+def _row_sink(upload_id, start_row=1):
+    writer = RowWriter(upload_id, start_row=start_row)
+
+    def persist(records):
+        with span('persist', rows=len(records)):
+            writer(records)
+    return persist
+
+
+def _infer_schema(upload):
+    # Returns True when a schema was inferred and still has to be stored. Once
+    # stored, re-runs and every shard reuse it.
+    if upload.schema is not None or not settings.CSV_SCHEMA_INFERENCE:
+        return False
+    with span('infer_schema'):
+        upload.schema = infer_file_schema(upload.file)
+    return True
+
+
+def _needs_single_pass(upload):
+    # Validation rules (uniqueness, row numbers in the report) and transform
+    # dedupe keep state across the whole file
+    return bool(upload.validation_rules) or bool(upload.transform and parse_transform(upload.transform).stateful)
+
+
+def _should_shard(upload):
+    # Byte-range shards need a seekable plain file
+    return (
+        settings.CSV_SHARDING_ENABLED and not compression_for(upload.file.name)
+        and not _needs_single_pass(upload) and upload.file.size > settings.CSV_SHARD_SIZE
+    )
+
+
+def _store_report(upload, report):
+    # Replaces the report of an earlier attempt; returns the fields to save
+    if upload.error_report:
+        upload.error_report.delete(save=False)
+    report.save(upload.error_report, f"{upload.fileId}-errors.csv")
+    return {'error_report': upload.error_report.name or '', 'error_count': report.count}
+
+
+def _dispatch_shards(upload, lease):
+    ranges = compute_shard_ranges(upload.file, settings.CSV_SHARD_SIZE)
+    file_id, token = str(upload.fileId), str(lease.token)
+    logger.info(f"[SHARDING] Splitting file {file_id} into {len(ranges)} shard(s)")
+    header = [process_csv_shard.s(file_id, start, end, token) for start, end in ranges]
+    callback = finalize_csv_shards.s(file_id, token).on_error(mark_upload_failed.si(file_id, token))
+    chord(header)(callback)
+
+
+@shared_task(name='process_csv_file')
+def process_csv_file(file_id):
+    timer = StageTimer()
+    started = time.perf_counter()
+    root = span('process_csv_file', file_id=str(file_id)).start()
+    profile = failure = upload = report = None
+    try:
+        logger.info(f"[START] Received task to process file ID: {file_id}")
+        upload = FileUpload.objects.select_related('user').get(fileId=file_id)
+        first_attempt = upload.status == PENDING
+        if upload.profile:
+            profile = TaskProfile(f"process_csv_file-{file_id}").start()
+
+        # A pending upload, or one whose previous run lost or released its lease,
+        # can be taken over. Anything else is a duplicate delivery.
+        lease = Lease(upload.fileId)
+        claimable = Q(status=PENDING) | Q(lease_token__isnull=True) | Q(lease_expires_at__lt=timezone.now())
+        if not upload.transition(PROCESSING, expected=(PENDING, PROCESSING), condition=claimable, **lease.fields()):
+            logger.info(f"[SKIP] File {file_id} is already being processed or has finished")
+            return
+        if first_attempt:
+            QUEUE_WAIT.observe((timezone.now() - upload.created_at).total_seconds())
+        timer.add('claim', time.perf_counter() - started)
+        logger.info(f"[PROCESSING] Updated file {file_id} status to 'processing'")
+        _status_changed(upload)
+
+        # Clear rows left behind by an earlier, interrupted attempt before re-ingesting
+        ProcessedRow.objects.filter(upload_id=upload.fileId).delete()
+        schema_changed = _infer_schema(upload)
+
+        if _should_shard(upload):
+            # Shards are processed across the worker fleet; finalize_csv_shards
+            # completes the upload once every shard has reported back.
+            if schema_changed:
+                FileUpload.objects.filter(pk=upload.pk).update(schema=upload.schema)
+            _dispatch_shards(upload, lease)
+            return
+
+        pipeline_started = time.perf_counter()
+        report = ErrorReport(settings.VALIDATION_ERROR_REPORT_MAX_ROWS)
+        with span('run_pipeline', bytes=upload.file.size) as pipeline:
+            stats = run_pipeline(
+                upload, sink=timer.wrap('persist', _row_sink(upload.fileId)), heartbeat=lease.heartbeat, report=report,
+            )
+            pipeline.set(**_pipeline_attributes(stats))
+        timer.add('parse', time.perf_counter() - pipeline_started - timer.totals.get('persist', 0.0))
+        logger.info(
+            f"[PARSED] File {file_id}: {stats.rows_processed} row(s) processed, "
+            f"{stats.rows_rejected} rejected, {stats.rows_filtered} filtered in {stats.batches} batch(es)"
+        )
+
+        # A freshly inferred or widened schema is stored with the completion,
+        # saving a write
+        if stats.widened:
+            upload.schema = widen_schema(upload.schema, stats.widened)
+            schema_changed = True
+        completed = upload.transition(
+            COMPLETED, expected=PROCESSING, condition=_held_by(lease.token),
+            rows_processed=stats.rows_processed, rows_rejected=stats.rows_rejected,
+            lease_token=None, lease_expires_at=None, **_store_report(upload, report),
+            **({'schema': upload.schema} if schema_changed else {}),
+        )
+        if not completed:
+            raise LeaseLost(f"Lease on file {file_id} was reclaimed before completion.")
+        logger.info(f"[COMPLETED] Updated file {file_id} status to 'completed'")
+        _status_changed(upload, rows_processed=stats.rows_processed, rows_rejected=stats.rows_rejected)
+        
+        timer.wrap('notify', _notify_user)(upload)
     except FileUpload.DoesNotExist:
         logger.error(f"[ERROR] FileUpload with ID {file_id} does not exist")
+    except LeaseLost as e:
+        logger.warning(f"[LEASE] Abandoning file {file_id}: {str(e)}")
+    except CSVProcessingError as e:
+        logger.error(f"[FAILED] File {file_id} could not be processed: {str(e)}")
+        failure = e
+        fields = _store_report(upload, report) if report is not None else {}
+        if upload.transition(FAILED, expected=PROCESSING, condition=_held_by(lease.token),
+                             lease_token=None, lease_expires_at=None, **fields):
+            _status_changed(upload)
     except Exception as e:
         logger.error(f"[ERROR] Unexpected error while processing file {file_id}: {str(e)}")
+        failure = e
+    finally:
+        if profile is not None:
+            # A profile that cannot be written must not hide how the run ended
+            try:
+                root.set(profile=profile.stop())
+            except OSError as e:
+                logger.warning(f"[PROFILE] Could not write the profile of file {file_id}: {str(e)}")
+            else:
+                # One profile per flag; tick it again to profile another run
+                FileUpload.objects.filter(pk=upload.pk).update(profile=False)
+        if timer.totals:
+            timer.add('total', time.perf_counter() - started)
+            timer.observe()
+        root.finish(failure)
+        # This worker slot is free again: release the next fair-queued job
+        if upload is not None and settings.FAIR_SCHEDULING_ENABLED:
+            dispatch_quietly(queue_for(upload))
+
+
+# The chord callback is handed the shard results, so shards must store them
+@shared_task(name='process_csv_shard', ignore_result=False)
+def process_csv_shard(file_id, start, end, lease_token=None):
+    logger.info(f"[SHARD] Processing bytes {start}-{end} of file {file_id}")
+    upload = FileUpload.objects.get(fileId=file_id)
+    # Shards heartbeat on the parent's lease so a long fan-out is not reclaimed
+    heartbeat = Lease(upload.fileId, token=lease_token).heartbeat if lease_token else None
+    # A redelivered shard replaces only the rows numbered inside its own byte range
+    ProcessedRow.objects.filter(upload_id=upload.fileId, row_number__gt=start, row_number__lte=end).delete()
+    with span('process_csv_shard', file_id=str(file_id), bytes=end - start) as shard:
+        stats = run_pipeline(
+            upload, sink=_row_sink(upload.fileId, start_row=start + 1), byte_range=(start, end), heartbeat=heartbeat
+        )
+        shard.set(**_pipeline_attributes(stats))
+    return {
+        'rows_processed': stats.rows_processed,
+        'rows_rejected': stats.rows_rejected,
+        'batches': stats.batches,
+        'widened': stats.widened or {},
+    }
+
+
+@shared_task(name='finalize_csv_shards')
+def finalize_csv_shards(results, file_id, lease_token=None):
+    rows_processed = sum(result['rows_processed'] for result in results)
+    rows_rejected = sum(result['rows_rejected'] for result in results)
+    upload = FileUpload.objects.select_related('user').get(fileId=file_id)
+    # Each shard widened the stored types on its own; the widest of each wins
+    widened = [result['widened'] for result in results if result.get('widened')]
+    fields = {'schema': widen_schema(upload.schema, *widened)} if widened and upload.schema else {}
+    # Only the run that still holds the lease may complete the upload
+    completed = upload.transition(
+        COMPLETED, expected=PROCESSING, condition=_held_by(lease_token),
+        rows_processed=rows_processed, rows_rejected=rows_rejected,
+        lease_token=None, lease_expires_at=None, **fields,
+    )
+    if not completed:
+        logger.warning(f"[LEASE] Discarding shard results for file {file_id}; its lease was reclaimed")
+        return
+    logger.info(
+        f"[COMPLETED] File {file_id}: {len(results)} shard(s), {rows_processed} row(s) processed, "
+        f"{rows_rejected} rejected"
+    )
+    _status_changed(upload, rows_processed=rows_processed, rows_rejected=rows_rejected)
+    _notify_user(upload)
+
+
+@shared_task(name='mark_upload_failed')
+def mark_upload_failed(file_id, lease_token=None):
+    upload = FileUpload.objects.get(fileId=file_id)
+    if upload.transition(FAILED, expected=PROCESSING, condition=_held_by(lease_token),
+                         lease_token=None, lease_expires_at=None):
+        logger.error(f"[FAILED] A shard of file {file_id} failed; marking upload as failed")
+        _status_changed(upload)
         
 
 @shared_task(name='retry_stuck_files')
 def retry_stuck_files():
-    stuck_threshold = timezone.now() - timedelta(minutes=30)
-    stuck_files = FileUpload.objects.filter(status='processing', updated_at__lt=stuck_threshold)
-
-    if not stuck_files.exists():
-        logger.info("[RETRY-TASK] No stuck files found.")
-        return
+    # Claims expired leases in one locked read and one update. SKIP LOCKED lets
+    # concurrent recoverers split the work instead of queueing on the same rows,
+    # and the claim pushes the lease forward so nothing is enqueued twice.
+    now = timezone.now()
+    with transaction.atomic():
+        stuck_files = list(
+            FileUpload.objects.select_for_update(skip_locked=True)
+            .filter(status=PROCESSING)
+            .filter(Q(lease_expires_at__lt=now) | Q(lease_expires_at__isnull=True))
+            .only(*STATUS_RECORD_ONLY)[:settings.RETRY_STUCK_BATCH_SIZE]
+        )
+        if not stuck_files:
+            logger.info("[RETRY-TASK] No stuck files found.")
+            return
+        FileUpload.objects.filter(fileId__in=[file.fileId for file in stuck_files]).update(
+            lease_token=None, lease_expires_at=now + timedelta(seconds=settings.FILE_LEASE_DURATION)
+        )
 
-    logger.warning(f"[RETRY-TASK] Retrying {stuck_files.count()} stuck file(s)...")
+    logger.warning(f"[RETRY-TASK] Retrying {len(stuck_files)} stuck file(s)...")
+    STUCK_RECOVERIES.inc(len(stuck_files))
 
     for file in stuck_files:
         logger.warning(f"[RETRY-TASK] Retrying file ID: {file.fileId}")
-        process_csv_file.delay(str(file.fileId))
+        write_status(file)
+        # Recovered jobs were already admitted once, so they skip the fair queue
+        send_to_worker(file.fileId, queue_for(file))
+
+
+@shared_task(name='requeue_lost_uploads')
+def requeue_lost_uploads():
+    # The fair queue lives only in Redis, so a restart or eviction can lose
+    # deferred jobs. Uploads pending for longer than FAIR_QUEUE_RECOVERY_AGE
+    # that are in no per-user list are enqueued again. One that was already
+    # released to the broker is skipped by the claim when it is delivered twice.
+    if not settings.FAIR_SCHEDULING_ENABLED:
+        return
+    cutoff = timezone.now() - timedelta(seconds=settings.FAIR_QUEUE_RECOVERY_AGE)
+    pending = list(
+        FileUpload.objects.filter(status=PENDING, created_at__lt=cutoff)
+        .order_by('created_at').only('fileId', 'user_id', 'file_size')[:settings.RETRY_STUCK_BATCH_SIZE]
+    )
+    if not pending:
+        return
+    try:
+        deferred = set().union(*(deferred_file_ids(queue) for queue in processing_queues()))
+    except redis.RedisError as e:
+        logger.warning(f"[SCHEDULER] Could not read the fair queues to recover lost uploads: {str(e)}")
+        return
+    lost = [upload for upload in pending if str(upload.fileId) not in deferred]
+    if not lost:
+        return
+    logger.warning(f"[SCHEDULER] Re-enqueueing {len(lost)} upload(s) missing from the fair queue")
+    for upload in lost:
+        enqueue_upload(upload)
+
+
+@shared_task(name='dispatch_fair_queues')
+def dispatch_fair_queues():
+    # Backstop for the dispatch that runs on upload and after every job, and
+    # the periodic refresh of the queue depth gauge.
+    if settings.FAIR_SCHEDULING_ENABLED:
+        for queue in processing_queues():
+            dispatch_quietly(queue)
+    try:
+        queue_depths()
+    except redis.RedisError as e:
+        logger.warning(f"[SCHEDULER] Could not read fair queue depth: {str(e)}")
+
+
+def _purge_in_batches(queryset, batch_size):
+    purged = 0
+    while True:
+        ids = list(queryset.order_by().values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return purged
+        purged += queryset.model.objects.filter(id__in=ids).delete()[0]
+
+
+@shared_task(name='purge_task_results')
+def purge_task_results():
+    cutoff = timezone.now() - timedelta(days=settings.TASK_RESULT_RETENTION_DAYS)
+    batch_size = settings.TASK_RESULT_PURGE_BATCH_SIZE
+    purged = _purge_in_batches(TaskResult.objects.filter(date_done__lt=cutoff), batch_size)
+    purged += _purge_in_batches(GroupResult.objects.filter(date_done__lt=cutoff), batch_size)
+    logger.info(f"[PURGE] Deleted {purged} task result row(s) older than {cutoff.isoformat()}")
@@ -0,0 +1,89 @@
+class FakeRedis:
+    # An in-memory stand-in for the Redis commands the fair queue, the
+    # blacklist mirror and the status events use. Every key lives in ``data``.
+    def __init__(self):
+        self.data = {}
+
+    def _list(self, key):
+        return self.data.setdefault(key, [])
+
+    def _set(self, key):
+        return self.data.setdefault(key, set())
+
+    def _zset(self, key):
+        return self.data.setdefault(key, {})
+
+    # Commands queued on a pipeline run straight away
+    def pipeline(self):
+        return self
+
+    def execute(self):
+        pass
+
+    async def aclose(self):
+        pass
+
+    def exists(self, key):
+        return int(key in self.data)
+
+    def set(self, key, value, nx=False, px=None, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def rpush(self, key, value):
+        self._list(key).append(str(value).encode())
+
+    def lpush(self, key, value):
+        self._list(key).insert(0, str(value).encode())
+
+    def lpop(self, key):
+        items = self._list(key)
+        return items.pop(0) if items else None
+
+    def rpoplpush(self, source, destination):
+        items = self._list(source)
+        if not items:
+            return None
+        value = items.pop()
+        self._list(destination).insert(0, value)
+        return value
+
+    def lrem(self, key, count, value):
+        self.data[key] = [item for item in self._list(key) if item != str(value).encode()]
+
+    def llen(self, key):
+        return len(self._list(key))
+
+    def lrange(self, key, start, end):
+        return list(self._list(key))
+
+    def sadd(self, key, value):
+        members = self._set(key)
+        if str(value) in members:
+            return 0
+        members.add(str(value))
+        return 1
+
+    def srem(self, key, value):
+        self._set(key).discard(str(value))
+
+    def zadd(self, key, mapping):
+        self._zset(key).update(mapping)
+
+    def zscore(self, key, member):
+        return self.data.get(key, {}).get(member)
+
+    def zremrangebyscore(self, key, low, high):
+        members = self._zset(key)
+        for member, score in list(members.items()):
+            if score <= high:
+                del members[member]
+
+    def publish(self, channel, message):
+        self._list(channel).append(message)
+        return 0
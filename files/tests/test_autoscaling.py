@@ -0,0 +1,132 @@
+from celery import Celery
+from django.test import TestCase, override_settings
+from unittest.mock import MagicMock
+from files.autoscaling import (
+    AutoscaleController, PoolActuator, QueueSample, ReplicaActuator, ScalingPolicy, desired_workers,
+    in_flight_counts, policy_for,
+)
+from collections import Counter
+import uuid
+
+
+class DesiredWorkersTests(TestCase):
+    def setUp(self):
+        self.policy = ScalingPolicy(
+            queue="csv_small", min_workers=1, max_workers=8, jobs_per_worker=10,
+            target_wait=60, scale_down_cooldown=300,
+        )
+
+    def test_backlog_sets_worker_count_within_bounds(self):
+        self.assertEqual(desired_workers(self.policy, QueueSample("csv_small", 35, 0), current=1), 4)
+        self.assertEqual(desired_workers(self.policy, QueueSample("csv_small", 500, 0), current=1), 8)
+        self.assertEqual(desired_workers(self.policy, QueueSample("csv_small", 0, 0), current=5), 1)
+
+    def test_late_jobs_add_a_worker(self):
+        self.assertEqual(desired_workers(self.policy, QueueSample("csv_small", 5, 120), current=3), 4)
+
+    def test_jobs_on_workers_keep_their_processes(self):
+        self.assertEqual(desired_workers(self.policy, QueueSample("csv_small", 0, 0, in_flight=30), current=3), 3)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class AutoscaleControllerTests(TestCase):
+    def setUp(self):
+        # The in-memory transport keeps messages per process, so every test gets
+        # its own queue names.
+        self.small, self.large = f"small-{uuid.uuid4().hex}", f"large-{uuid.uuid4().hex}"
+        override = override_settings(
+            CSV_SMALL_QUEUE=self.small, CSV_LARGE_QUEUE=self.large, FAIR_SCHEDULING_ENABLED=False,
+            AUTOSCALE_MIN_WORKERS=1, AUTOSCALE_MAX_WORKERS=8, AUTOSCALE_JOBS_PER_WORKER=10,
+            AUTOSCALE_TARGET_WAIT=60, AUTOSCALE_SCALE_DOWN_COOLDOWN=300,
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        self.app = Celery("autoscale-test", broker="memory://", set_as_current=False)
+        self.clock = FakeClock()
+        self.in_flight = Counter()
+
+    def _publish(self, queue, count):
+        for _ in range(count):
+            self.app.send_task("process_csv_file", args=[str(uuid.uuid4())], queue=queue)
+
+    def _purge(self, queue):
+        with self.app.connection_for_write() as connection:
+            connection.default_channel.queue_purge(queue)
+
+    def _controller(self, actuator):
+        policies = [policy_for(self.small), policy_for(self.large)]
+        return AutoscaleController(
+            policies, actuator, app=self.app, clock=self.clock, in_flight=lambda app: self.in_flight,
+        )
+
+    def test_scales_up_from_broker_depth_and_down_after_cooldown(self):
+        self._publish(self.small, 25)
+        controller = self._controller(ReplicaActuator())
+
+        decisions = controller.step()
+        self.assertEqual(decisions[self.small]["depth"], 25)
+        self.assertEqual(decisions[self.small]["desired"], 3)
+        self.assertEqual(decisions[self.large]["desired"], 1)
+
+        self._purge(self.small)
+        self.clock.now = 100
+        self.assertEqual(controller.step()[self.small]["desired"], 3)
+
+        self.clock.now = 400
+        self.assertEqual(controller.step()[self.small]["desired"], 1)
+
+    def test_busy_workers_are_not_scaled_down(self):
+        self._publish(self.small, 25)
+        controller = self._controller(ReplicaActuator())
+        controller.step()
+
+        # The workers took every job off the broker but are still running them
+        self._purge(self.small)
+        self.in_flight[self.small] = 25
+        self.clock.now = 400
+
+        decisions = controller.step()
+        self.assertEqual((decisions[self.small]["depth"], decisions[self.small]["in_flight"]), (0, 25))
+        self.assertEqual(decisions[self.small]["desired"], 3)
+
+    def test_in_flight_counts_active_and_reserved_tasks_per_queue(self):
+        app = MagicMock()
+        app.conf.task_always_eager = False
+        inspect = app.control.inspect.return_value
+        inspect.active.return_value = {
+            "w1@host": [{"delivery_info": {"routing_key": self.small}}],
+            "w2@host": [{"delivery_info": {"routing_key": self.large}}],
+        }
+        inspect.reserved.return_value = {"w1@host": [{"delivery_info": {"routing_key": self.small}}]}
+
+        counts = in_flight_counts(app=app)
+
+        self.assertEqual((counts[self.small], counts[self.large]), (2, 1))
+
+    def test_pool_actuator_spreads_processes_across_workers(self):
+        app = MagicMock()
+        inspect = app.control.inspect.return_value
+        inspect.active_queues.return_value = {
+            "w1@host": [{"name": self.small}],
+            "w2@host": [{"name": self.small}],
+            "w3@host": [{"name": self.large}],
+        }
+        inspect.stats.return_value = {
+            "w1@host": {"pool": {"processes": [1, 2]}},
+            "w2@host": {"pool": {"processes": [3, 4, 5, 6]}},
+            "w3@host": {"pool": {"processes": [7]}},
+        }
+        actuator = PoolActuator(app=app)
+
+        self.assertEqual(actuator.current_workers(self.small, None), 6)
+        actuator.apply(self.small, 6)
+
+        app.control.pool_grow.assert_called_once_with(1, destination=["w1@host"])
+        app.control.pool_shrink.assert_called_once_with(1, destination=["w2@host"])
@@ -0,0 +1,101 @@
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, TransactionTestCase
+from files.benchmark import compare_to_baseline, percentile, summarize
+from files.models import FileUpload
+from users.models import User
+import io
+import json
+import os
+import tempfile
+
+
+class BenchmarkHelperTests(TestCase):
+    def test_percentile_uses_nearest_rank(self):
+        values = list(range(1, 101))
+
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertIsNone(percentile([], 50))
+
+    def test_summarize_reports_rows_per_sec(self):
+        summary = summarize([0.1, 0.2, 0.3, 0.4], elapsed=2.0, rows=1000)
+
+        self.assertEqual(summary['count'], 4)
+        self.assertEqual(summary['requests_per_sec'], 2.0)
+        self.assertEqual(summary['rows_per_sec'], 500.0)
+
+    def test_compare_flags_latency_and_throughput_regressions(self):
+        baseline = {'status': {'p95': 0.010}, 'process': {'p95': 1.0, 'rows_per_sec': 10000}}
+        current = {'status': {'p95': 0.020}, 'process': {'p95': 1.1, 'rows_per_sec': 5000}}
+
+        regressions = compare_to_baseline(current, baseline, tolerance=0.2)
+
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(regressions[0].startswith("status: p95"))
+        self.assertTrue(regressions[1].startswith("process:"))
+        self.assertEqual(compare_to_baseline(current, baseline, tolerance=1.5), [])
+
+
+class BenchmarkCommandTests(TestCase):
+    def test_writes_baseline_and_cleans_up(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, "baseline.json")
+            call_command(
+                'benchmark_api', concurrency=1, uploads=2, requests=3, sizes='5,20', output=output,
+                stdout=io.StringIO(),
+            )
+            with open(output) as f:
+                baseline = json.load(f)
+
+            self.assertEqual(set(baseline['results']), {'upload', 'process', 'status', 'list'})
+            self.assertEqual(baseline['results']['upload']['errors'], 0)
+            self.assertEqual(baseline['results']['process']['rows'], 25)
+            self.assertEqual(baseline['results']['status']['count'], 3)
+
+            with self.assertRaises(CommandError):
+                call_command(
+                    'benchmark_api', concurrency=1, uploads=1, requests=1, sizes='5',
+                    compare=output, tolerance=-1, stdout=io.StringIO(),
+                )
+
+        self.assertFalse(User.objects.filter(username__startswith="bench-").exists())
+        self.assertFalse(FileUpload.objects.exists())
+
+
+class ValidationBenchmarkCommandTests(TestCase):
+    def test_reports_rows_per_sec_per_stage(self):
+        out = io.StringIO()
+
+        call_command('benchmark_validation', rows=500, batch_size=100, bad_rate=0.1, stdout=out)
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual([line.split()[0] for line in lines], ['width', 'coerce', 'rules', 'total'])
+        self.assertIn("rows/sec", lines[-1])
+        self.assertNotIn(" 0 error(s)", lines[-1])
+
+        with self.assertRaises(CommandError):
+            call_command('benchmark_validation', rows=10, bad_rate=2, stdout=io.StringIO())
+
+
+class AsgiBenchmarkCommandTests(TransactionTestCase):
+    # Requests run in the ASGI handler's own threads, so the data they read
+    # has to be committed.
+    def test_compares_sync_and_async_views(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, "asgi.json")
+            call_command(
+                'benchmark_asgi', connections='1,2', requests=4, uploads=2, rows=5, output=output,
+                stdout=io.StringIO(),
+            )
+            with open(output) as f:
+                results = json.load(f)['results']
+
+        self.assertEqual(len(results), 12)
+        for name in ('upload.sync@1', 'upload.async@2', 'status.async@2', 'list.sync@2'):
+            self.assertEqual(results[name]['errors'], 0, name)
+        self.assertEqual(results['status.async@1']['count'], 4)
+        self.assertGreaterEqual(results['list.async@2']['peak_threads'], 1)
+        self.assertFalse(User.objects.filter(username__startswith="bench-").exists())
+        self.assertFalse(FileUpload.objects.exists())
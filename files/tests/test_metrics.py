@@ -0,0 +1,75 @@
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from prometheus_client import REGISTRY
+from rest_framework import status
+from rest_framework.test import APITestCase
+from unittest.mock import patch
+from users.models import User
+from files.models import FileUpload
+from files.tasks import process_csv_file
+import os
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class MetricsTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="metricsuser",
+            email="metricsuser@example.com",
+            password="StrongPass123!"
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def tearDown(self):
+        cache.clear()
+        for upload in FileUpload.objects.all():
+            if upload.file and os.path.exists(upload.file.path):
+                os.remove(upload.file.path)
+
+    def test_metrics_endpoint_exposes_pipeline_metrics(self):
+        response = self.client.get(reverse("metrics"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = response.content.decode()
+        for name in ("files_request_latency_seconds", "process_csv_file_stage_seconds",
+                     "process_csv_file_queue_wait_seconds", "file_status_transitions_total",
+                     "stuck_file_recoveries_total", "files_cache_requests_total"):
+            self.assertIn(name, body)
+
+    def test_request_latency_is_labelled_by_view(self):
+        before = sample("files_request_latency_seconds_count", view="user-file-list", method="GET", status="200")
+
+        self.client.get(reverse("user-file-list"))
+
+        after = sample("files_request_latency_seconds_count", view="user-file-list", method="GET", status="200")
+        self.assertEqual(after - before, 1)
+
+    def test_my_files_cache_hits_and_misses_are_counted(self):
+        hits = sample("files_cache_requests_total", cache="my_files", result="hit")
+        misses = sample("files_cache_requests_total", cache="my_files", result="miss")
+
+        self.client.get(reverse("user-file-list"))
+        self.client.get(reverse("user-file-list"))
+
+        self.assertEqual(sample("files_cache_requests_total", cache="my_files", result="miss") - misses, 1)
+        self.assertEqual(sample("files_cache_requests_total", cache="my_files", result="hit") - hits, 1)
+
+    @patch("files.tasks.send_mail")
+    def test_task_records_stages_queue_wait_and_transitions(self, mock_send_mail):
+        upload = FileUpload.objects.create(
+            user=self.user,
+            file=SimpleUploadedFile("metrics.csv", b"id\n1\n", content_type="text/csv")
+        )
+        completed = sample("file_status_transitions_total", status="completed")
+        waits = sample("process_csv_file_queue_wait_seconds_count")
+        persists = sample("process_csv_file_stage_seconds_count", stage="persist")
+
+        process_csv_file(str(upload.fileId))
+
+        self.assertEqual(sample("file_status_transitions_total", status="completed") - completed, 1)
+        self.assertEqual(sample("process_csv_file_queue_wait_seconds_count") - waits, 1)
+        self.assertEqual(sample("process_csv_file_stage_seconds_count", stage="persist") - persists, 1)
@@ -0,0 +1,837 @@
+from django.test import TestCase, override_settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from unittest.mock import patch
+from users.models import User
+from files.models import FileUpload, ProcessedRow
+from files.ingest import RowWriter
+from files.processing import iter_row_batches, run_pipeline, compute_shard_ranges, CSVProcessingError
+from files.schema import BatchCoercer, infer_schema
+from files.transforms import TransformError, parse_transform
+from files.validation import RuleError, compile_rules
+from files.tasks import (
+    process_csv_file, process_csv_shard, finalize_csv_shards, retry_stuck_files, purge_task_results, _purge_in_batches,
+)
+from django_celery_results.models import GroupResult, TaskResult
+from files.leases import Lease, LeaseLost
+from files.tracing import otlp_payload, span
+from django.utils import timezone
+from datetime import timedelta
+import csv
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import uuid
+
+
+# Uploads and error reports written by these tests land here and are removed
+# with the module
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def tearDownModule():
+    shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class CSVPipelineTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="pipelineuser",
+            email="pipelineuser@example.com",
+            password="StrongPass123!"
+        )
+
+    def _upload(self, content, name="data.csv"):
+        return FileUpload.objects.create(
+            user=self.user,
+            file=SimpleUploadedFile(name, content, content_type="text/csv")
+        )
+
+    def test_iter_row_batches_respects_batch_size(self):
+        rows = "".join(f"{i},value{i}\n" for i in range(25))
+        upload = self._upload(("id,name\n" + rows).encode())
+
+        batches = list(iter_row_batches(upload.file, batch_size=10))
+
+        self.assertEqual([len(rows) for _, rows in batches], [10, 10, 5])
+        self.assertEqual(batches[0][0], ["id", "name"])
+
+    def test_run_pipeline_rejects_malformed_rows(self):
+        upload = self._upload(b"id,name\n1, alice \n2\n3,carol\n")
+        received = []
+
+        stats = run_pipeline(upload, sink=received.extend)
+
+        self.assertEqual(stats.rows_processed, 2)
+        self.assertEqual(stats.rows_rejected, 1)
+        self.assertEqual(received[0], {"id": "1", "name": "alice"})
+
+    def test_iter_row_batches_reads_gzipped_file(self):
+        rows = "".join(f"{i},value{i}\n" for i in range(25))
+        upload = self._upload(gzip.compress(("id,name\n" + rows).encode()), name="data.csv.gz")
+
+        batches = list(iter_row_batches(upload.file, batch_size=10))
+
+        self.assertEqual([len(rows) for _, rows in batches], [10, 10, 5])
+        self.assertEqual(batches[0][1][0], ["0", "value0"])
+
+    def test_run_pipeline_corrupt_gzip_raises(self):
+        upload = self._upload(gzip.compress(b"id,name\n1,a\n" * 100)[:-20], name="data.csv.gz")
+
+        with self.assertRaises(CSVProcessingError):
+            run_pipeline(upload)
+
+    def test_run_pipeline_empty_file_raises(self):
+        upload = self._upload(b"")
+
+        with self.assertRaises(CSVProcessingError):
+            run_pipeline(upload)
+
+    @patch("files.tasks.send_mail")
+    def test_task_records_row_counts(self, mock_send_mail):
+        upload = self._upload(b"id,name\n1,a\n2,b\n3\n")
+
+        process_csv_file(str(upload.fileId))
+
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, "completed")
+        self.assertEqual(upload.rows_processed, 2)
+        self.assertEqual(upload.rows_rejected, 1)
+
+    @patch("files.tasks.publish_status")
+    @patch("files.tasks.send_mail")
+    def test_task_publishes_status_transitions(self, mock_send_mail, mock_publish):
+        upload = self._upload(b"id,name\n1,a\n")
+
+        process_csv_file(str(upload.fileId))
+
+        published = [c.args[1] for c in mock_publish.call_args_list]
+        self.assertEqual(published, ["processing", "completed"])
+
+    @patch("files.tasks.send_mail")
+    def test_task_marks_unparseable_file_failed(self, mock_send_mail):
+        upload = self._upload(b"\xff\xfe\x00bad")
+
+        process_csv_file(str(upload.fileId))
+
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, "failed")
+        mock_send_mail.assert_not_called()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RowIngestionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="ingestuser",
+            email="ingestuser@example.com",
+            password="StrongPass123!"
+        )
+
+    def test_row_writer_numbers_rows_across_batches(self):
+        upload = FileUpload.objects.create(user=self.user)
+        writer = RowWriter(upload.fileId, use_copy=False)
+
+        writer([{"a": "1"}, {"a": "2"}])
+        writer([{"a": "3"}])
+
+        rows = list(ProcessedRow.objects.filter(upload=upload).order_by('row_number'))
+        self.assertEqual([row.row_number for row in rows], [1, 2, 3])
+        self.assertEqual(rows[2].data, {"a": "3"})
+        self.assertEqual(writer.rows_written, 3)
+
+    @patch("files.tasks.send_mail")
+    def test_task_persists_rows_and_replaces_previous_attempt(self, mock_send_mail):
+        upload = FileUpload.objects.create(
+            user=self.user,
+            file=SimpleUploadedFile("rows.csv", b"id,name\n1,a\n2,b\n", content_type="text/csv")
+        )
+        ProcessedRow.objects.create(upload=upload, row_number=1, data={"stale": True})
+
+        process_csv_file(str(upload.fileId))
+
+        data = list(ProcessedRow.objects.filter(upload=upload).order_by('row_number').values_list('data', flat=True))
+        self.assertEqual(data, [{"id": 1, "name": "a"}, {"id": 2, "name": "b"}])
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class SchemaTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="schemauser",
+            email="schemauser@example.com",
+            password="StrongPass123!"
+        )
+
+    def test_infers_narrowest_type_per_column(self):
+        header = ["id", "price", "active", "day", "note", "empty"]
+        rows = [
+            ["1", "1.5", "yes", "2025-07-06", "a", ""],
+            ["2", "", "No", "2025-07-07", "12", ""],
+            ["3", "3", "true", "2025-07-08", "x", ""],
+        ]
+
+        schema = infer_schema(header, rows)
+
+        self.assertEqual([column["type"] for column in schema], ["int", "float", "bool", "date", "string", "string"])
+
+    def test_leading_zeros_and_underscores_are_not_numbers(self):
+        schema = infer_schema(["zip", "count", "price"], [["02134", "1_000", "0.5"], ["10001", "2", "-0.25"]])
+
+        self.assertEqual([column["type"] for column in schema], ["string", "string", "float"])
+
+    def test_coercer_widens_inferred_columns_instead_of_rejecting(self):
+        coerce = BatchCoercer([{"name": "price", "type": "int"}, {"name": "zip", "type": "int"}])
+
+        first = coerce([["10", "12345"]], range(1, 2))
+        records, numbers, errors = coerce([["19.99", "02134"], ["3", "x"]], range(2, 4))
+
+        self.assertEqual(first[0], [{"price": 10, "zip": 12345}])
+        self.assertEqual(errors, [])
+        self.assertEqual(list(numbers), [2, 3])
+        self.assertEqual(records, [{"price": 19.99, "zip": "02134"}, {"price": 3.0, "zip": "x"}])
+        self.assertEqual(coerce.widened, {"price": "float", "zip": "string"})
+
+    def test_coercer_converts_columns_and_rejects_mistyped_rows(self):
+        # Only types declared by validation rules reject rows
+        coerce = BatchCoercer([
+            {"name": "id", "type": "int"}, {"name": "score", "type": "float"},
+            {"name": "ok", "type": "bool"}, {"name": "day", "type": "date"},
+        ], strict={"id", "score", "ok", "day"})
+
+        records, numbers, errors = coerce([
+            [" 1 ", "2.5", "Y", "2025-07-06"],
+            ["2", "", "f", "2025-07-07"],
+            ["three", "1", "t", "2025-07-08"],
+            ["4", "nan", "t", "2025-07-09"],
+        ], range(1, 5))
+
+        self.assertEqual(errors, [(3, "id", "three", "not a valid int"), (4, "score", "nan", "not a valid float")])
+        self.assertEqual(list(numbers), [1, 2])
+        self.assertEqual(records, [
+            {"id": 1, "score": 2.5, "ok": True, "day": "2025-07-06"},
+            {"id": 2, "score": None, "ok": False, "day": "2025-07-07"},
+        ])
+
+    @patch("files.tasks.send_mail")
+    def test_task_stores_schema_and_reuses_it_on_rerun(self, mock_send_mail):
+        upload = FileUpload.objects.create(
+            user=self.user,
+            file=SimpleUploadedFile("typed.csv", b"id,score\n1,2.5\n2,x\n", content_type="text/csv"),
+        )
+
+        process_csv_file(str(upload.fileId))
+
+        upload.refresh_from_db()
+        self.assertEqual(upload.schema, [{"name": "id", "type": "int"}, {"name": "score", "type": "string"}])
+
+        # Re-run with a tighter stored schema: it is used as is, not re-inferred
+        schema = [{"name": "id", "type": "int"}, {"name": "score", "type": "float"}]
+        FileUpload.objects.filter(pk=upload.pk).update(status="pending", schema=schema)
+        with patch("files.tasks.infer_file_schema") as mock_infer:
+            process_csv_file(str(upload.fileId))
+
+        mock_infer.assert_not_called()
+        upload.refresh_from_db()
+        self.assertEqual((upload.rows_processed, upload.rows_rejected), (2, 0))
+
+    @override_settings(CSV_SCHEMA_SAMPLE_ROWS=2, CSV_BATCH_SIZE=2)
+    @patch("files.tasks.send_mail")
+    def test_values_outside_the_sample_widen_the_stored_schema(self, mock_send_mail):
+        upload = FileUpload.objects.create(
+            user=self.user,
+            file=SimpleUploadedFile("late.csv", b"zip,price\n10001,5\n10002,7\n02134,19.99\n", content_type="text/csv"),
+        )
+
+        process_csv_file(str(upload.fileId))
+
+        upload.refresh_from_db()
+        self.assertEqual((upload.rows_processed, upload.rows_rejected), (3, 0))
+        self.assertEqual(upload.schema, [{"name": "zip", "type": "string"}, {"name": "price", "type": "float"}])
+        last = ProcessedRow.objects.filter(upload=upload).order_by("-row_number").first()
+        self.assertEqual(last.data, {"zip": "02134", "price": 19.99})
+
+
+class ValidationRulesTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="rulesuser",
+            email="rulesuser@example.com",
+            password="StrongPass123!"
+        )
+
+    def tearDown(self):
+        for upload in FileUpload.objects.all():
+            for field_file in (upload.file, upload.error_report):
+                if field_file and os.path.exists(field_file.path):
+                    os.remove(field_file.path)
+
+    def _upload(self, content, rules):
+        return FileUpload.objects.create(
+            user=self.user, validation_rules=rules,
+            file=SimpleUploadedFile("rules.csv", content.encode(), content_type="text/csv"),
+        )
+
+    def _report_rows(self, upload):
+        with upload.error_report.open("r") as f:
+            return list(csv.reader(f))
+
+    def test_compile_rejects_invalid_specs(self):
+        for spec in (
+            [], {"columns": {"id": {"min": 1}}}, {"columns": {"id": {"type": "uuid"}}},
+            {"columns": {"id": {"regex": "("}}}, {"columns": {"id": {"maximum": 3}}},
+            {"required_columns": "id"},
+        ):
+            with self.assertRaises(RuleError):
+                compile_rules(spec)
+
+    @patch("files.tasks.send_mail")
+    def test_rejected_rows_are_reported_with_row_numbers(self, mock_send_mail):
+        rules = {
+            "required_columns": ["id"],
+            "columns": {
+                "id": {"type": "int", "min": 1, "unique": True},
+                "email": {"required": True, "regex": "[^@]+@[^@]+"},
+            },
+        }
+        upload = self._upload(
+            "id,email\n1,a@x.io\n0,b@x.io\n1,c@x.io\nx,d@x.io\n2,\n3,nope\n4\n5,e@x.io\n", rules,
+        )
+
+        with override_settings(CSV_BATCH_SIZE=3):
+            process_csv_file(str(upload.fileId))
+
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, "completed")
+        self.assertEqual((upload.rows_processed, upload.rows_rejected), (2, 6))
+        self.assertEqual(upload.error_count, 6)
+        self.assertEqual(self._report_rows(upload), [
+            ["row", "column", "value", "error"],
+            ["2", "id", "0", "below minimum 1"],
+            ["3", "id", "1", "duplicate value"],
+            ["4", "id", "x", "not a valid int"],
+            ["5", "email", "", "required"],
+            ["6", "email", "nope", "does not match [^@]+@[^@]+"],
+            ["7", "", "", "expected 2 fields, got 1"],
+        ])
+        ids = list(ProcessedRow.objects.filter(upload=upload).values_list("data__id", flat=True))
+        self.assertEqual(sorted(ids), [1, 5])
+
+    @override_settings(VALIDATION_ERROR_REPORT_MAX_ROWS=2)
+    @patch("files.tasks.send_mail")
+    def test_report_is_capped(self, mock_send_mail):
+        upload = self._upload("id\n" + "x\n" * 5, {"columns": {"id": {"type": "int"}}})
+
+        process_csv_file(str(upload.fileId))
+
+        upload.refresh_from_db()
+        self.assertEqual(upload.error_count, 5)
+        rows = self._report_rows(upload)
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[-1], ["", "", "", "3 more error(s) not shown"])
+
+    def test_missing_required_column_fails_upload(self):
+        upload = self._upload("id,name\n1,a\n", {"required_columns": ["id", "email"]})
+
+        process_csv_file(str(upload.fileId))
+
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, "failed")
+        self.assertEqual(self._report_rows(upload)[1], ["0", "email", "", "missing required column"])
+
+    @patch("files.tasks.send_mail")
+    def test_clean_file_has_no_report(self, mock_send_mail):
+        upload = self._upload("id\n1\n2\n", {"columns": {"id": {"type": "int", "max": 5}}})
+
+        process_csv_file(str(upload.fileId))
+
+        upload.refresh_from_db()
+        self.assertEqual((upload.status, upload.error_count, upload.error_report.name), ("completed", 0, ""))
+
+
+class TransformTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="transformuser",
+            email="transformuser@example.com",
+            password="StrongPass123!"
+        )
+
+    def tearDown(self):
+        for upload in FileUpload.objects.all():
+            for field_file in (upload.file, upload.error_report):
+                if field_file and os.path.exists(field_file.path):
+                    os.remove(field_file.path)
+
+    def _upload(self, content, steps, **fields):
+        return FileUpload.objects.create(
+            user=self.user, transform={"steps": steps},
+            file=SimpleUploadedFile("transform.csv", content.encode(), content_type="text/csv"), **fields,
+        )
+
+    def test_parse_rejects_unsafe_and_malformed_specs(self):
+        for spec in (
+            {"steps": [{"filter": "__import__('os')"}]}, {"steps": [{"derive": {"x": "name.upper()"}}]},
+            {"steps": [{"filter": "amount ** 2"}]}, {"steps": [{"select": []}]},
+            {"steps": [{"sort": ["id"]}]}, [{"select": ["id"]}],
+        ):
+            with self.assertRaises(TransformError):
+                parse_transform(spec)
+
+    def test_steps_are_fused_and_read_only_needed_columns(self):
+        transform = parse_transform({"steps": [
+            {"filter": "amount > 10"},
+            {"derive": {"total": "amount * qty"}},
+            {"rename": {"amount": "net"}},
+            {"select": ["id", "net", "total"]},
+            {"dedupe": ["id"]},
+        ]}).compile(["id", "name", "amount", "qty", "note"])
+        records = [
+            {"id": 1, "amount": 20, "qty": 2}, {"id": 1, "amount": 30, "qty": 1},
+            {"id": 2, "amount": 5, "qty": 1}, {"id": 3, "amount": 50, "qty": None},
+        ]
+
+        out, numbers, errors = transform(records, range(1, 5))
+
+        self.assertEqual(transform.input_columns, ["id", "amount", "qty"])
+        self.assertEqual(transform.output_columns, ["id", "net", "total"])
+        self.assertEqual(out, [{"id": 1, "net": 20, "total": 40}])
+        self.assertEqual(numbers, [1])
+        self.assertEqual([error[0] for error in errors], [4])
+        # Dedupe remembers keys across batches
+        self.assertEqual(transform([{"id": 1, "amount": 11, "qty": 1}], [5])[0], [])
+
+    def test_oversized_repetition_rejects_the_row(self):
+        transform = parse_transform({"steps": [{"derive": {"pad": "name * n", "twice": "n * 2"}}]}).compile(["name", "n"])
+
+        out, numbers, errors = transform([{"name": "ab", "n": 3}, {"name": "x", "n": 3_000_000_000}], [1, 2])
+
+        self.assertEqual(out, [{"name": "ab", "n": 3, "pad": "ababab", "twice": 6}])
+        self.assertEqual([error[0] for error in errors], [2])
+        self.assertIn("value longer than", errors[0][3])
+
+    def test_formatting_and_nested_repetition_cannot_build_huge_values(self):
+        transform = parse_transform({"steps": [{"derive": {
+            "padded": "len('%0200000000d' % n)", "grown": "len(name + name)", "text": "str(n * n)",
+        }}]}).compile(["name", "n"])
+
+        out, _, errors = transform([{"name": "x" * 60_000, "n": 1}, {"name": "ab", "n": 7}], [1, 2])
+
+        self.assertEqual(out, [])
+        self.assertEqual([error[0] for error in errors], [1, 2])
+        self.assertIn("strings cannot be formatted", errors[1][3])
+        with self.assertRaisesMessage(TransformError, "lists and tuples may only hold constants"):
+            parse_transform({"steps": [{"derive": {"big": "len(str([[1] * 100000] * 300))"}}]})
+        with self.assertRaisesMessage(TransformError, "lists and tuples may only hold constants"):
+            parse_transform({"steps": [{"derive": {"big": "[n] * 3"}}]})
+        self.assertEqual(
+            parse_transform({"steps": [{"filter": "n in [1, -2, 'a']"}]}).compile(["n"])([{"n": -2}], [1])[0],
+            [{"n": -2}],
+        )
+
+    def test_inlined_expressions_are_bounded(self):
+        # Each step doubles the inlined expression
+        steps = [{"derive": {"n": "n + n"}} for _ in range(30)]
+
+        with self.assertRaisesMessage(TransformError, "limited to 500 nodes"):
+            parse_transform({"steps": steps}).compile(["n"])
+
+    def test_unknown_column_is_reported_at_compile_time(self):
+        spec = parse_transform({"steps": [{"rename": {"id": "key"}}, {"filter": "id > 1"}]})
+
+        with self.assertRaisesMessage(TransformError, "Unknown column 'id'"):
+            spec.compile(["id"])
+
+    @patch("files.tasks.send_mail")
+    def test_task_applies_transform_and_projects_before_coercion(self, mock_send_mail):
+        upload = self._upload(
+            "id,name,score,blob\n1,ann,3,x\n2,bob,8,y\n3,cy,oops,z\n4,bob,9,w\n",
+            [{"filter": "score >= 5"}, {"derive": {"name": "upper(name)"}}, {"select": ["name", "score"]},
+             {"dedupe": ["name"]}],
+            schema=[{"name": "id", "type": "int"}, {"name": "name", "type": "string"},
+                    {"name": "score", "type": "int"}, {"name": "blob", "type": "string"}],
+            validation_rules={"columns": {"score": {"type": "int"}}},
+        )
+
+        with patch("files.processing.BatchCoercer", wraps=BatchCoercer) as coercer:
+            process_csv_file(str(upload.fileId))
+
+        self.assertEqual([column["name"] for column in coercer.call_args.args[0]], ["name", "score"])
+        upload.refresh_from_db()
+        self.assertEqual((upload.status, upload.rows_processed, upload.rows_rejected), ("completed", 1, 1))
+        self.assertEqual(upload.error_count, 1)
+        data = list(ProcessedRow.objects.filter(upload=upload).values_list("data", flat=True))
+        self.assertEqual(data, [{"name": "BOB", "score": 8}])
+
+    def test_transform_on_unknown_column_fails_upload(self):
+        upload = self._upload("id\n1\n", [{"select": ["missing"]}])
+
+        process_csv_file(str(upload.fileId))
+
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, "failed")
+
+    @override_settings(CSV_SHARD_SIZE=16)
+    @patch("files.tasks._dispatch_shards")
+    def test_dedupe_is_never_sharded(self, mock_dispatch):
+        content = "id\n" + "".join(f"{i}\n" for i in range(20))
+        stateless = self._upload(content, [{"filter": "id > 3"}])
+        stateful = self._upload(content + "0\n", [{"dedupe": ["id"]}])
+
+        with patch("files.tasks.send_mail"):
+            process_csv_file(str(stateless.fileId))
+            process_csv_file(str(stateful.fileId))
+
+        mock_dispatch.assert_called_once()
+        stateful.refresh_from_db()
+        self.assertEqual((stateful.status, stateful.rows_processed), ("completed", 20))
+
+
+class ShardedProcessingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="sharduser",
+            email="sharduser@example.com",
+            password="StrongPass123!"
+        )
+        content = "id,name\n" + "".join(f"{i},name{i}\n" for i in range(200))
+        self.upload = FileUpload.objects.create(
+            user=self.user,
+            file=SimpleUploadedFile("shards.csv", content.encode(), content_type="text/csv")
+        )
+
+    def tearDown(self):
+        for upload in FileUpload.objects.all():
+            if upload.file and os.path.exists(upload.file.path):
+                os.remove(upload.file.path)
+
+    def test_shard_ranges_are_row_aligned_and_cover_every_row(self):
+        ranges = compute_shard_ranges(self.upload.file, 256)
+
+        self.assertGreater(len(ranges), 1)
+        ids = []
+        for byte_range in ranges:
+            for _, rows in iter_row_batches(self.upload.file, byte_range=byte_range):
+                ids.extend(int(row[0]) for row in rows)
+        self.assertEqual(ids, list(range(200)))
+
+    @patch("files.tasks.send_mail")
+    def test_shards_merge_into_completed_upload(self, mock_send_mail):
+        FileUpload.objects.filter(pk=self.upload.pk).update(status="processing")
+        ranges = compute_shard_ranges(self.upload.file, 256)
+
+        results = [process_csv_shard(str(self.upload.fileId), start, end) for start, end in ranges]
+        finalize_csv_shards(results, str(self.upload.fileId))
+
+        self.upload.refresh_from_db()
+        self.assertEqual(self.upload.status, "completed")
+        self.assertEqual(self.upload.rows_processed, 200)
+        ordered = ProcessedRow.objects.filter(upload=self.upload).order_by('row_number')
+        self.assertEqual([row.data["id"] for row in ordered], [str(i) for i in range(200)])
+        mock_send_mail.assert_called_once()
+
+    @patch("files.tasks.send_mail")
+    def test_quoted_newlines_are_never_split_across_shards(self, mock_send_mail):
+        content = "id,note\n" + "".join(
+            f'{i},"line one\nline two"\n' if i % 7 == 0 else f"{i},plain\n" for i in range(200)
+        )
+        upload = FileUpload.objects.create(
+            user=self.user, status="processing",
+            file=SimpleUploadedFile("quoted.csv", content.encode(), content_type="text/csv"),
+        )
+
+        for shard_size in range(40, 400, 23):
+            ranges = compute_shard_ranges(upload.file, shard_size)
+            rows = [row for byte_range in ranges for _, batch in iter_row_batches(upload.file, byte_range=byte_range)
+                    for row in batch]
+            self.assertEqual([int(row[0]) for row in rows], list(range(200)))
+            self.assertTrue(all(len(row) == 2 for row in rows))
+
+        results = [process_csv_shard(str(upload.fileId), start, end)
+                   for start, end in compute_shard_ranges(upload.file, 256)]
+        finalize_csv_shards(results, str(upload.fileId))
+        upload.refresh_from_db()
+        self.assertEqual((upload.rows_processed, upload.rows_rejected), (200, 0))
+
+    @patch("files.tasks.send_mail")
+    def test_types_widened_by_shards_are_merged_into_the_schema(self, mock_send_mail):
+        rows = [f"{i},{i},{i}" for i in range(60)]
+        rows[10] = "10,10.5,10"
+        rows[50] = "50,oops,50.5"
+        upload = FileUpload.objects.create(
+            user=self.user, status="processing",
+            schema=[{"name": "id", "type": "int"}, {"name": "a", "type": "int"}, {"name": "b", "type": "int"}],
+            file=SimpleUploadedFile("widen.csv", ("id,a,b\n" + "\n".join(rows) + "\n").encode(), content_type="text/csv"),
+        )
+        ranges = compute_shard_ranges(upload.file, 200)
+        self.assertGreater(len(ranges), 1)
+
+        results = [process_csv_shard(str(upload.fileId), start, end) for start, end in ranges]
+        finalize_csv_shards(results, str(upload.fileId))
+
+        upload.refresh_from_db()
+        self.assertEqual((upload.status, upload.rows_processed, upload.rows_rejected), ("completed", 60, 0))
+        self.assertEqual(
+            upload.schema,
+            [{"name": "id", "type": "int"}, {"name": "a", "type": "string"}, {"name": "b", "type": "float"}],
+        )
+
+    @override_settings(CSV_SHARDING_ENABLED=True, CSV_SHARD_SIZE=256)
+    @patch("files.tasks.chord")
+    def test_large_file_is_dispatched_as_chord(self, mock_chord):
+        process_csv_file(str(self.upload.fileId))
+
+        header = mock_chord.call_args[0][0]
+        self.assertEqual(len(header), len(compute_shard_ranges(self.upload.file, 256)))
+        self.upload.refresh_from_db()
+        self.assertEqual(self.upload.status, "processing")
+        # Stored before the fan-out so every shard coerces to the same types
+        self.assertEqual(self.upload.schema, [{"name": "id", "type": "int"}, {"name": "name", "type": "string"}])
+
+
+class LeaseRecoveryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="leaseuser",
+            email="leaseuser@example.com",
+            password="StrongPass123!"
+        )
+
+    def tearDown(self):
+        for upload in FileUpload.objects.all():
+            if upload.file and os.path.exists(upload.file.path):
+                os.remove(upload.file.path)
+
+    def _processing(self, expires_in):
+        return FileUpload.objects.create(
+            user=self.user,
+            file=SimpleUploadedFile("leased.csv", b"id\n1\n", content_type="text/csv"),
+            status="processing",
+            lease_token=uuid.uuid4(),
+            lease_expires_at=timezone.now() + timedelta(seconds=expires_in),
+        )
+
+    @patch("files.tasks.send_to_worker")
+    def test_only_expired_leases_are_claimed_and_only_once(self, mock_delay):
+        expired = self._processing(-60)
+        self._processing(600)
+
+        retry_stuck_files()
+        retry_stuck_files()
+
+        mock_delay.assert_called_once_with(expired.fileId, "csv_small")
+        expired.refresh_from_db()
+        self.assertIsNone(expired.lease_token)
+        self.assertGreater(expired.lease_expires_at, timezone.now())
+
+    def test_heartbeat_renews_and_detects_reclaimed_lease(self):
+        upload = self._processing(1)
+        lease = Lease(upload.fileId, token=upload.lease_token, duration=600)
+
+        lease.heartbeat(force=True)
+        upload.refresh_from_db()
+        self.assertGreater(upload.lease_expires_at, timezone.now() + timedelta(seconds=500))
+
+        FileUpload.objects.filter(pk=upload.pk).update(lease_token=None)
+        with self.assertRaises(LeaseLost):
+            lease.heartbeat(force=True)
+
+    @patch("files.tasks.send_mail")
+    def test_duplicate_delivery_exits_without_reprocessing(self, mock_send_mail):
+        upload = self._processing(600)
+        ProcessedRow.objects.create(upload=upload, row_number=1, data={"id": "1"})
+
+        process_csv_file(str(upload.fileId))
+
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, "processing")
+        self.assertEqual(ProcessedRow.objects.filter(upload=upload).count(), 1)
+        mock_send_mail.assert_not_called()
+
+    @patch("files.tasks.send_mail")
+    def test_completed_upload_is_not_processed_again(self, mock_send_mail):
+        upload = FileUpload.objects.create(
+            user=self.user,
+            file=SimpleUploadedFile("done.csv", b"id\n1\n", content_type="text/csv"),
+        )
+        process_csv_file(str(upload.fileId))
+
+        process_csv_file(str(upload.fileId))
+
+        mock_send_mail.assert_called_once()
+
+    def test_transition_is_conditional_on_expected_status(self):
+        upload = FileUpload.objects.create(user=self.user)
+        stale = FileUpload.objects.get(pk=upload.pk)
+
+        self.assertTrue(upload.transition("processing", expected="pending"))
+        self.assertFalse(stale.transition("processing", expected="pending"))
+        self.assertEqual(stale.status, "pending")
+        with self.assertRaises(ValueError):
+            upload.transition("pending", expected="completed")
+
+    @patch("files.tasks.send_mail")
+    def test_task_loads_user_with_the_upload(self, mock_send_mail):
+        upload = FileUpload.objects.create(
+            user=self.user,
+            file=SimpleUploadedFile("queries.csv", b"id\n1\n", content_type="text/csv"),
+        )
+
+        # get + claim + clear rows + insert batch + complete
+        with self.assertNumQueries(5):
+            process_csv_file(str(upload.fileId))
+
+    @patch("files.tasks.send_mail")
+    def test_completed_task_releases_lease(self, mock_send_mail):
+        upload = FileUpload.objects.create(
+            user=self.user,
+            file=SimpleUploadedFile("release.csv", b"id\n1\n", content_type="text/csv"),
+        )
+
+        process_csv_file(str(upload.fileId))
+
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, "completed")
+        self.assertIsNone(upload.lease_token)
+        self.assertIsNone(upload.lease_expires_at)
+
+    @patch("files.tasks.send_mail")
+    def test_stale_shard_finalizer_does_not_complete_reclaimed_upload(self, mock_send_mail):
+        upload = self._processing(600)
+
+        finalize_csv_shards([{"rows_processed": 1, "rows_rejected": 0, "batches": 1}], str(upload.fileId), str(uuid.uuid4()))
+
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, "processing")
+        mock_send_mail.assert_not_called()
+
+
+class TracingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="traceuser",
+            email="traceuser@example.com",
+            password="StrongPass123!"
+        )
+        self.tmp = tempfile.mkdtemp()
+        self.trace_path = os.path.join(self.tmp, "traces.jsonl")
+
+    def tearDown(self):
+        for upload in FileUpload.objects.all():
+            if upload.file and os.path.exists(upload.file.path):
+                os.remove(upload.file.path)
+        shutil.rmtree(self.tmp)
+
+    def _upload(self, **fields):
+        rows = "".join(f"{i},value{i}\n" for i in range(25))
+        return FileUpload.objects.create(
+            user=self.user,
+            file=SimpleUploadedFile("trace.csv", ("id,name\n" + rows).encode(), content_type="text/csv"),
+            **fields,
+        )
+
+    def _spans(self):
+        with open(self.trace_path) as f:
+            return [json.loads(line) for line in f]
+
+    @patch("files.tasks.send_mail")
+    def test_task_writes_nested_spans(self, mock_send_mail):
+        upload = self._upload()
+
+        with override_settings(TRACING_EXPORTER="jsonl", TRACING_JSONL_PATH=self.trace_path, CSV_BATCH_SIZE=10):
+            process_csv_file(str(upload.fileId))
+
+        spans = {}
+        for record in self._spans():
+            spans.setdefault(record["name"], []).append(record)
+        root = spans["process_csv_file"][0]
+        pipeline = spans["run_pipeline"][0]
+        self.assertIsNone(root["parent_id"])
+        self.assertEqual(pipeline["parent_id"], root["span_id"])
+        self.assertEqual(pipeline["attributes"]["rows_processed"], 25)
+        self.assertEqual(pipeline["attributes"]["bytes"], upload.file.size)
+        self.assertEqual([s["attributes"]["rows"] for s in spans["persist"]], [10, 10, 5])
+        self.assertTrue(all(s["parent_id"] == pipeline["span_id"] for s in spans["persist"]))
+        self.assertEqual(spans["send_mail"][0]["parent_id"], root["span_id"])
+        self.assertEqual({s["trace_id"] for s in self._spans()}, {root["trace_id"]})
+
+    @patch("files.tasks.send_mail")
+    def test_failed_task_records_error_on_root_span(self, mock_send_mail):
+        upload = FileUpload.objects.create(
+            user=self.user, file=SimpleUploadedFile("empty.csv", b"", content_type="text/csv")
+        )
+
+        with override_settings(TRACING_EXPORTER="jsonl", TRACING_JSONL_PATH=self.trace_path):
+            process_csv_file(str(upload.fileId))
+
+        root = [s for s in self._spans() if s["name"] == "process_csv_file"][0]
+        self.assertIn("CSVProcessingError", root["error"])
+
+    def test_otlp_payload_encodes_attributes(self):
+        with span("process_csv_file", rows=3, ratio=0.5, ok=True, file_id="abc") as root:
+            pass
+
+        encoded = otlp_payload([root])["resourceSpans"][0]["scopeSpans"][0]["spans"][0]
+        self.assertEqual(encoded["traceId"], root.trace_id)
+        self.assertEqual(len(encoded["traceId"]), 32)
+        self.assertEqual(
+            {a["key"]: a["value"] for a in encoded["attributes"]},
+            {"rows": {"intValue": "3"}, "ratio": {"doubleValue": 0.5}, "ok": {"boolValue": True},
+             "file_id": {"stringValue": "abc"}},
+        )
+
+    @patch("files.tasks.send_mail")
+    def test_flagged_upload_is_profiled(self, mock_send_mail):
+        upload = self._upload(profile=True)
+
+        with override_settings(PROFILE_DIR=self.tmp):
+            process_csv_file(str(upload.fileId))
+
+        profiles = [name for name in os.listdir(self.tmp) if name.endswith(".prof")]
+        self.assertEqual(len(profiles), 1)
+        self.assertIn(str(upload.fileId), profiles[0])
+        upload.refresh_from_db()
+        self.assertFalse(upload.profile)
+
+    @patch("files.tasks.send_mail")
+    def test_unwritable_profile_does_not_fail_the_run(self, mock_send_mail):
+        upload = self._upload(profile=True)
+        blocked = os.path.join(self.tmp, "not-a-directory")
+        open(blocked, "w").close()
+
+        with override_settings(PROFILE_DIR=blocked):
+            process_csv_file(str(upload.fileId))
+
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, "completed")
+        self.assertTrue(upload.profile)
+
+
+class TaskResultStoreTests(TestCase):
+    def _result(self, age_days):
+        result = TaskResult.objects.create(task_id=str(uuid.uuid4()), task_name="process_csv_file", status="SUCCESS")
+        TaskResult.objects.filter(pk=result.pk).update(date_done=timezone.now() - timedelta(days=age_days))
+        return result
+
+    def test_only_chord_headers_store_results(self):
+        self.assertTrue(process_csv_file.ignore_result)
+        self.assertTrue(retry_stuck_files.ignore_result)
+        self.assertTrue(finalize_csv_shards.ignore_result)
+        self.assertFalse(process_csv_shard.ignore_result)
+
+    @override_settings(TASK_RESULT_RETENTION_DAYS=7, TASK_RESULT_PURGE_BATCH_SIZE=2)
+    def test_purge_deletes_old_results_in_batches(self):
+        for _ in range(5):
+            self._result(age_days=30)
+        recent = self._result(age_days=1)
+        GroupResult.objects.create(group_id=str(uuid.uuid4()))
+        GroupResult.objects.update(date_done=timezone.now() - timedelta(days=30))
+
+        with patch("files.tasks._purge_in_batches", wraps=_purge_in_batches) as purge:
+            purge_task_results()
+
+        self.assertEqual(list(TaskResult.objects.values_list("pk", flat=True)), [recent.pk])
+        self.assertFalse(GroupResult.objects.exists())
+        self.assertEqual(purge.call_count, 2)
@@ -0,0 +1,105 @@
+from django.test import TestCase, override_settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from unittest.mock import patch
+from users.models import User
+from files.models import FileUpload
+from files.tests.fakes import FakeRedis
+from files.scheduling import dispatch, enqueue_upload, queue_depths, queue_for
+from files.tasks import requeue_lost_uploads
+from django.utils import timezone
+from datetime import timedelta
+import os
+import redis
+
+
+@override_settings(FAIR_SCHEDULING_ENABLED=True, CSV_SMALL_FILE_MAX_BYTES=100)
+class FairSchedulingTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username="alice", email="alice@example.com", password="StrongPass123!")
+        self.bob = User.objects.create_user(username="bob", email="bob@example.com", password="StrongPass123!")
+        self.redis = FakeRedis()
+        patcher = patch("files.scheduling.get_redis", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.sent = []
+        patcher = patch("files.scheduling.send_to_worker", side_effect=lambda file_id, queue: self.sent.append((str(file_id), queue)))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch("files.scheduling.broker_queue_depth", return_value=0)
+        self.broker_depth = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        for upload in FileUpload.objects.all():
+            if upload.file and os.path.exists(upload.file.path):
+                os.remove(upload.file.path)
+
+    def _upload(self, user, size=10):
+        return FileUpload.objects.create(
+            user=user, file_size=size,
+            file=SimpleUploadedFile("data.csv", b"id\n1\n", content_type="text/csv"),
+        )
+
+    def test_uploads_are_routed_by_size(self):
+        self.assertEqual(queue_for(self._upload(self.alice, size=100)), "csv_small")
+        self.assertEqual(queue_for(self._upload(self.alice, size=101)), "csv_large")
+
+    def test_jobs_are_released_round_robin_and_fifo_per_user(self):
+        with self.settings(FAIR_QUEUE_TARGET_DEPTH=0):
+            alice = [self._upload(self.alice) for _ in range(4)]
+            bob = [self._upload(self.bob) for _ in range(2)]
+            for upload in alice + bob:
+                enqueue_upload(upload)
+        self.assertEqual(self.sent, [])
+
+        with self.settings(FAIR_QUEUE_TARGET_DEPTH=10):
+            released = dispatch("csv_small")
+
+        expected = [alice[0], bob[0], alice[1], bob[1], alice[2], alice[3]]
+        self.assertEqual(released, 6)
+        self.assertEqual(self.sent, [(str(upload.fileId), "csv_small") for upload in expected])
+
+    def test_dispatch_tops_the_broker_queue_up_to_target_depth(self):
+        # Released jobs land on the broker queue
+        self.broker_depth.side_effect = lambda queue: 18 + len(self.sent)
+        with self.settings(FAIR_QUEUE_TARGET_DEPTH=20):
+            for _ in range(5):
+                enqueue_upload(self._upload(self.alice))
+
+        self.assertEqual(len(self.sent), 2)
+        self.assertEqual(queue_depths()["csv_small"]["deferred"], 3)
+
+    def test_large_files_use_their_own_fair_queue(self):
+        with self.settings(FAIR_QUEUE_TARGET_DEPTH=10):
+            enqueue_upload(self._upload(self.alice, size=1000))
+
+        self.assertEqual(self.sent[0][1], "csv_large")
+
+    def test_redis_outage_sends_directly(self):
+        with patch.object(self.redis, "rpush", side_effect=redis.ConnectionError("down")):
+            upload = self._upload(self.alice)
+            enqueue_upload(upload)
+
+        self.assertEqual(self.sent, [(str(upload.fileId), "csv_small")])
+
+    def test_disabled_fair_scheduling_sends_directly(self):
+        with self.settings(FAIR_SCHEDULING_ENABLED=False, FAIR_QUEUE_TARGET_DEPTH=0):
+            upload = self._upload(self.alice)
+            enqueue_upload(upload)
+
+        self.assertEqual(self.sent, [(str(upload.fileId), "csv_small")])
+        self.assertEqual(self.redis.data, {})
+
+    def test_pending_uploads_lost_from_redis_are_requeued(self):
+        with self.settings(FAIR_QUEUE_TARGET_DEPTH=0):
+            waiting, lost, recent = self._upload(self.alice), self._upload(self.bob), self._upload(self.bob)
+            enqueue_upload(waiting)
+        FileUpload.objects.exclude(pk=recent.pk).update(created_at=timezone.now() - timedelta(hours=1))
+
+        with self.settings(FAIR_QUEUE_TARGET_DEPTH=0, FAIR_QUEUE_RECOVERY_AGE=600):
+            requeue_lost_uploads()
+
+        self.assertEqual(queue_depths()["csv_small"]["deferred"], 2)
+        with self.settings(FAIR_QUEUE_TARGET_DEPTH=10):
+            dispatch("csv_small")
+        self.assertEqual(self.sent, [(str(waiting.fileId), "csv_small"), (str(lost.fileId), "csv_small")])
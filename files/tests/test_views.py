@@ -1,4 +1,6 @@
+from django.test import TestCase
 from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework import status
 from django.utils import timezone
 from datetime import timedelta
@@ -7,9 +9,19 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
 from unittest.mock import patch
 from users.models import User
-from files.models import FileUpload
+from files.models import FileUpload, ChunkedUpload, ProcessedRow
 from files.tasks import process_csv_file, retry_stuck_files
+from files.list_cache import user_files_page_key
+from files.status_cache import get_status_record, write_status
+from files.views import FileUploadStatusView
+from files.dedup import dedup_stats
+from files.compression import compression_stats
+from files.tests.fakes import FakeRedis
+import gzip
 import tempfile
+import hashlib
+import json
+import uuid
 import os 
 
 
@@ -29,7 +41,7 @@ class FileUploadViewTests(APITestCase):
             if upload.file and os.path.exists(upload.file.path):
                 os.remove(upload.file.path)
 
-    @patch('files.views.process_csv_file.delay')
+    @patch('files.views.enqueue_upload')
     def test_upload_valid_csv_file(self, mock_process_task):
         csv_file = SimpleUploadedFile("test.csv", b"col1,col2\nval1,val2\n", content_type="text/csv")
 
@@ -71,8 +83,7 @@ class FileUploadViewTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
     @patch("files.tasks.send_mail")
-    @patch("files.tasks.time.sleep", return_value=None)
-    def test_email_sent_after_task_completion(self, mock_sleep, mock_send_mail):
+    def test_email_sent_after_task_completion(self, mock_send_mail):
         # Upload file through model (simulate view logic already tested)
         test_file = SimpleUploadedFile("email_test.csv", b"col1,col2\nval1,val2", content_type="text/csv")
         upload = FileUpload.objects.create(user=self.user, file=test_file)
@@ -92,7 +103,7 @@ class FileUploadViewTests(APITestCase):
         self.assertIn(self.user.email, kwargs['recipient_list'])
         self.assertIn("Your uploaded CSV file", kwargs['message'])
 
-    @patch("files.tasks.process_csv_file.delay")
+    @patch("files.tasks.send_to_worker")
     def test_retry_stuck_files_triggers_for_old_processing_files(self, mock_process_delay):
         # Create a stuck file in "processing" state older than 30 minutes
         stuck_time = timezone.now() - timedelta(minutes=31)
@@ -108,17 +119,19 @@ class FileUploadViewTests(APITestCase):
         retry_stuck_files()
 
         # Assert: Check if task was retried
-        mock_process_delay.assert_called_once_with(str(stuck_file.fileId))
+        mock_process_delay.assert_called_once_with(stuck_file.fileId, "csv_small")
 
-    @patch("files.tasks.process_csv_file.delay")
+    @patch("files.tasks.send_to_worker")
     def test_retry_stuck_files_ignores_recent_processing_files(self, mock_process_delay):
-        # Create a file still "processing" but updated recently
+        # Create a file still "processing" under a lease that has not expired
         recent_time = timezone.now() - timedelta(minutes=5)
         FileUpload.objects.create(
             user=self.user,
             file=SimpleUploadedFile("recent.csv", b"col1,col2", content_type="text/csv"),
             status="processing",
-            updated_at=recent_time
+            updated_at=recent_time,
+            lease_token=uuid.uuid4(),
+            lease_expires_at=timezone.now() + timedelta(minutes=5),
         )
         
         # Call the retry task
@@ -181,31 +194,76 @@ class FileUploadListViewTests(APITestCase):
             if upload.file and os.path.exists(upload.file.path):
                 os.remove(upload.file.path)
 
-    def test_list_files_without_cache(self):
+    def test_list_files_first_page(self):
         file1 = FileUpload.objects.create(user=self.user)
         file2 = FileUpload.objects.create(user=self.user)
 
         response = self.client.get(self.url)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)
-        returned_ids = [file["fileId"] for file in response.data]
-        self.assertIn(str(file1.fileId), returned_ids)
-        self.assertIn(str(file2.fileId), returned_ids)
+        self.assertEqual(len(response.data["results"]), 2)
+        returned_ids = [file["fileId"] for file in response.data["results"]]
+        self.assertEqual(returned_ids, [str(file2.fileId), str(file1.fileId)])
+        self.assertIsNone(response.data["next"])
 
-    def test_list_files_with_cache(self):
-        file1 = FileUpload.objects.create(user=self.user)
-        file2 = FileUpload.objects.create(user=self.user)
+    def test_list_files_follows_cursor_through_every_page(self):
+        uploads = [FileUpload.objects.create(user=self.user) for _ in range(5)]
+        # Identical timestamps force the fileId tie-breaker to be used
+        FileUpload.objects.filter(fileId__in=[u.fileId for u in uploads[:3]]).update(created_at=timezone.now())
+        FileUpload.objects.create(user=User.objects.create_user(
+            username="listother", email="listother@example.com", password="StrongPass123!"
+        ))
+
+        seen, url = [], f"{self.url}?page_size=2"
+        while url:
+            response = self.client.get(url)
+            self.assertLessEqual(len(response.data["results"]), 2)
+            seen.extend(file["fileId"] for file in response.data["results"])
+            url = response.data["next"]
+
+        self.assertEqual(sorted(seen), sorted(str(u.fileId) for u in uploads))
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_list_files_page_query_count_is_constant(self):
+        for _ in range(30):
+            FileUpload.objects.create(user=self.user)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(f"{self.url}?page_size=10")
+
+        self.assertEqual(len(response.data["results"]), 10)
+        self.assertIsNotNone(response.data["next"])
+
+    def test_list_files_cache_hit_runs_no_queries(self):
+        FileUpload.objects.create(user=self.user)
+        first = self.client.get(self.url)
+
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+
+        self.assertEqual(first.data, second.data)
 
-        # Set cache manually
-        cache_key = f"user_file_ids:{self.user.id}"
-        cache.set(cache_key, [str(file1.fileId)], timeout=120)
+    def test_list_files_cache_invalidated_on_create_status_change_and_delete(self):
+        upload = FileUpload.objects.create(user=self.user)
+        self.client.get(self.url)
 
+        newer = FileUpload.objects.create(user=self.user)
         response = self.client.get(self.url)
+        self.assertEqual(len(response.data["results"]), 2)
 
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]["fileId"], str(file1.fileId))
+        key_before = user_files_page_key(self.user.id, {})
+        upload.status = "completed"
+        upload.save()
+        self.assertNotEqual(user_files_page_key(self.user.id, {}), key_before)
+
+        newer.delete()
+        response = self.client.get(self.url)
+        self.assertEqual([f["fileId"] for f in response.data["results"]], [str(upload.fileId)])
+
+    def test_list_files_invalid_cursor(self):
+        response = self.client.get(f"{self.url}?cursor=not-a-cursor")
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
     def test_list_files_unauthenticated(self):
         self.client.force_authenticate(user=None)
@@ -213,3 +271,817 @@ class FileUploadListViewTests(APITestCase):
 
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
+
+
+class ChunkedUploadViewTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="chunkuser",
+            email="chunkuser@example.com",
+            password="StrongPass123!"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.content = b"id,name\n" + "".join(f"{i},name{i}\n" for i in range(50)).encode()
+
+    def tearDown(self):
+        for upload in ChunkedUpload.objects.all():
+            if upload.file and os.path.exists(upload.file.path):
+                os.remove(upload.file.path)
+
+    def _init(self, **payload):
+        payload.setdefault("filename", "chunked.csv")
+        payload.setdefault("total_size", len(self.content))
+        return self.client.post(reverse("chunked-upload-init"), payload, format="json")
+
+    def _put(self, upload_id, start, data, total=None):
+        total = total or len(self.content)
+        return self.client.put(
+            reverse("chunked-upload-detail", kwargs={"uploadId": upload_id}),
+            data,
+            content_type="application/octet-stream",
+            HTTP_CONTENT_RANGE=f"bytes {start}-{start + len(data) - 1}/{total}",
+        )
+
+    @patch("files.views.enqueue_upload")
+    def test_chunks_are_appended_and_finalize_enqueues_processing(self, mock_process_task):
+        upload_id = self._init().data["uploadId"]
+
+        for start in range(0, len(self.content), 100):
+            response = self._put(upload_id, start, self.content[start:start + 100])
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        mock_process_task.assert_not_called()
+
+        url = reverse("chunked-upload-finalize", kwargs={"uploadId": upload_id})
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url)
+        again = self.client.post(url)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        upload = FileUpload.objects.get(fileId=response.data["fileId"])
+        with upload.file.open("rb") as f:
+            self.assertEqual(gzip.decompress(f.read()), self.content)
+        mock_process_task.assert_called_once_with(upload)
+        self.assertEqual(again.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(FileUpload.objects.count(), 1)
+
+    def _upload(self):
+        upload_id = self._init().data["uploadId"]
+        chunked = ChunkedUpload.objects.get(uploadId=upload_id)
+        self._put(upload_id, 0, self.content)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("chunked-upload-finalize", kwargs={"uploadId": upload_id}))
+        return FileUpload.objects.get(fileId=response.data["fileId"]), chunked
+
+    @patch("files.views.enqueue_upload")
+    def test_plain_upload_is_gzipped_at_rest_and_the_assembled_file_removed(self, mock_process_task):
+        upload, chunked = self._upload()
+
+        self.assertTrue(upload.file.name.endswith(".csv.gz"))
+        self.assertEqual(upload.compression, "gzip")
+        self.assertEqual(upload.transfer_size, len(self.content))
+        self.assertEqual(upload.file_size, len(self.content))
+        self.assertEqual(upload.stored_size, upload.file.size)
+        self.assertLess(upload.stored_size, len(self.content))
+        self.assertFalse(os.path.exists(chunked.file.path))
+
+    @patch("files.views.enqueue_upload")
+    def test_shardable_plain_upload_is_stored_uncompressed(self, mock_process_task):
+        with self.settings(CSV_SHARDING_ENABLED=True, CSV_SHARD_SIZE=100):
+            upload, chunked = self._upload()
+
+        self.assertEqual(upload.file.name, chunked.file.name)
+        self.assertEqual(upload.compression, "")
+        self.assertEqual(upload.stored_size, len(self.content))
+
+    def test_chunk_at_wrong_offset_returns_current_offset(self):
+        upload_id = self._init().data["uploadId"]
+        self._put(upload_id, 0, self.content[:100])
+
+        response = self._put(upload_id, 200, self.content[200:300])
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data["offset"], 100)
+
+    def test_resume_reports_offset(self):
+        upload_id = self._init().data["uploadId"]
+        self._put(upload_id, 0, self.content[:100])
+
+        response = self.client.get(reverse("chunked-upload-detail", kwargs={"uploadId": upload_id}))
+
+        self.assertEqual(response.data["offset"], 100)
+
+    def test_finalize_incomplete_upload_rejected(self):
+        upload_id = self._init().data["uploadId"]
+        self._put(upload_id, 0, self.content[:100])
+
+        response = self.client.post(reverse("chunked-upload-finalize", kwargs={"uploadId": upload_id}))
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(FileUpload.objects.count(), 0)
+
+    def test_init_rejects_non_csv_and_oversized_files(self):
+        response = self._init(filename="data.txt")
+        self.assertIn("filename", response.data)
+
+        with self.settings(CHUNKED_UPLOAD_MAX_SIZE=10):
+            response = self._init()
+        self.assertIn("total_size", response.data)
+
+    def test_other_users_upload_not_found(self):
+        upload_id = self._init().data["uploadId"]
+        other = User.objects.create_user(username="other", email="other@example.com", password="StrongPass123!")
+        self.client.force_authenticate(user=other)
+
+        response = self._put(upload_id, 0, self.content[:100])
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class FakePubSub:
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.closed = False
+
+    async def get_message(self, ignore_subscribe_messages=True, timeout=None):
+        return self.messages.pop(0) if self.messages else None
+
+    async def unsubscribe(self):
+        pass
+
+    async def aclose(self):
+        self.closed = True
+
+
+class FileStatusEventsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="sseuser",
+            email="sseuser@example.com",
+            password="StrongPass123!"
+        )
+        self.upload = FileUpload.objects.create(user=self.user, status="processing")
+        self.url = reverse("file-status-events", kwargs={"fileId": str(self.upload.fileId)})
+        self.token = str(AccessToken.for_user(self.user))
+
+    async def _collect(self, response):
+        return b"".join([chunk async for chunk in response.streaming_content]).decode()
+
+    async def test_streams_transitions_until_terminal_status(self):
+        pubsub = FakePubSub([
+            {"data": json.dumps({"fileId": str(self.upload.fileId), "status": "completed"})},
+        ])
+        with patch("files.views.subscribe_status", return_value=(FakeRedis(), pubsub)):
+            response = await self.async_client.get(self.url, headers={"Authorization": f"Bearer {self.token}"})
+            body = await self._collect(response)
+
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        events = [line for line in body.splitlines() if line.startswith("data: ")]
+        self.assertEqual([json.loads(e[6:])["status"] for e in events], ["processing", "completed"])
+        self.assertTrue(pubsub.closed)
+
+    async def test_accepts_token_query_parameter(self):
+        await FileUpload.objects.filter(pk=self.upload.pk).aupdate(status="completed")
+        with patch("files.views.subscribe_status", return_value=(FakeRedis(), FakePubSub([]))):
+            response = await self.async_client.get(self.url, {"access_token": self.token})
+            body = await self._collect(response)
+
+        self.assertIn('"status": "completed"', body)
+
+    async def test_requires_authentication(self):
+        response = await self.async_client.get(self.url)
+
+        self.assertEqual(response.status_code, 401)
+
+    async def test_other_users_file_not_found(self):
+        other = await User.objects.acreate(username="ssother", email="ssother@example.com")
+        token = str(AccessToken.for_user(other))
+        with patch("files.views.subscribe_status", return_value=(FakeRedis(), FakePubSub([]))):
+            response = await self.async_client.get(self.url, headers={"Authorization": f"Bearer {token}"})
+
+        self.assertEqual(response.status_code, 404)
+
+
+class FileUploadStatusBatchViewTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="batchuser",
+            email="batchuser@example.com",
+            password="StrongPass123!"
+        )
+        self.url = reverse("file-status-batch")
+        self.client.force_authenticate(user=self.user)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_returns_statuses_in_request_order(self):
+        first = FileUpload.objects.create(user=self.user, status="completed")
+        second = FileUpload.objects.create(user=self.user)
+
+        response = self.client.post(self.url, {"fileIds": [str(second.fileId), str(first.fileId)]}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(r["fileId"], r["status"]) for r in response.data["results"]],
+            [(str(second.fileId), "pending"), (str(first.fileId), "completed")],
+        )
+        self.assertEqual(response.data["not_found"], [])
+
+    def test_cache_hits_skip_the_database(self):
+        uploads = [FileUpload.objects.create(user=self.user) for _ in range(3)]
+        payload = {"fileIds": [str(upload.fileId) for upload in uploads]}
+        self.client.post(self.url, payload, format="json")
+
+        with self.assertNumQueries(0):
+            response = self.client.post(self.url, payload, format="json")
+
+        self.assertEqual(len(response.data["results"]), 3)
+
+    def test_other_users_and_unknown_ids_are_not_found(self):
+        other = User.objects.create_user(username="batchother", email="batchother@example.com", password="StrongPass123!")
+        foreign = FileUpload.objects.create(user=other)
+        # Populate the cache as the owner would, then ask as a different user
+        self.client.force_authenticate(user=other)
+        self.client.post(self.url, {"fileIds": [str(foreign.fileId)]}, format="json")
+        self.client.force_authenticate(user=self.user)
+        unknown = "aaaaaaaa-bbbb-cccc-dddd-eeeeeeeeeeee"
+
+        response = self.client.post(self.url, {"fileIds": [str(foreign.fileId), unknown]}, format="json")
+
+        self.assertEqual(response.data["results"], [])
+        self.assertEqual(response.data["not_found"], [str(foreign.fileId), unknown])
+
+    def test_rejects_too_many_ids(self):
+        ids = [str(uuid.uuid4()) for _ in range(1001)]
+
+        response = self.client.post(self.url, {"fileIds": ids}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class FileStatusCacheTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="statuscacheuser",
+            email="statuscacheuser@example.com",
+            password="StrongPass123!"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.upload = FileUpload.objects.create(
+            user=self.user,
+            file=SimpleUploadedFile("cached.csv", b"id,name\n1,a\n", content_type="text/csv")
+        )
+        self.url = reverse('file-status-view', kwargs={'fileId': str(self.upload.fileId)})
+
+    def tearDown(self):
+        cache.clear()
+        for upload in FileUpload.objects.all():
+            if upload.file and os.path.exists(upload.file.path):
+                os.remove(upload.file.path)
+
+    def test_miss_repopulates_and_hit_skips_database(self):
+        first = self.client.get(self.url)
+
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+
+        self.assertEqual(first.data, second.data)
+        self.assertTrue(second.data["file"].endswith(self.upload.file.name))
+
+    @patch("files.tasks.publish_status")
+    @patch("files.tasks.send_mail")
+    def test_task_writes_transitions_through(self, mock_send_mail, mock_publish):
+        self.client.get(self.url)
+
+        process_csv_file(str(self.upload.fileId))
+
+        record = get_status_record(self.upload.fileId)
+        self.assertEqual(record["status"], "completed")
+        self.assertEqual(record["rows_processed"], 1)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data["status"], "completed")
+
+    def test_saves_and_deletes_outside_the_tasks_drop_the_record(self):
+        batch_url = reverse("file-status-batch")
+        self.client.get(self.url)
+
+        self.upload.status = "failed"
+        self.upload.save()
+
+        self.assertEqual(self.client.get(self.url).data["status"], "failed")
+        batch = self.client.post(batch_url, {"fileIds": [str(self.upload.fileId)]}, format="json")
+        self.assertEqual(batch.data["results"][0]["status"], "failed")
+
+        self.upload.delete()
+
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_miss_does_not_replace_a_newer_write_through(self):
+        # The task writes a transition between the view's cache miss and its fill
+        stale = FileUpload.objects.get(pk=self.upload.pk)
+        FileUpload.objects.filter(pk=self.upload.pk).update(status="completed")
+        write_status(FileUpload.objects.get(pk=self.upload.pk))
+
+        with patch("files.views.get_status_record", return_value=None), \
+                patch.object(FileUploadStatusView, "get_object", return_value=stale):
+            self.client.get(self.url)
+        with patch("files.views.get_status_records", return_value={}):
+            self.client.post(reverse("file-status-batch"), {"fileIds": [str(self.upload.fileId)]}, format="json")
+
+        self.assertEqual(get_status_record(self.upload.fileId)["status"], "completed")
+
+    def test_cached_record_of_other_user_not_found(self):
+        self.client.get(self.url)
+        other = User.objects.create_user(username="statusother", email="statusother@example.com", password="StrongPass123!")
+        self.client.force_authenticate(user=other)
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class UploadDeduplicationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="dedupuser",
+            email="dedupuser@example.com",
+            password="StrongPass123!"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.content = b"id,name\n1,a\n2,b\n"
+
+    def tearDown(self):
+        for upload in FileUpload.objects.all():
+            if upload.file and os.path.exists(upload.file.path):
+                os.remove(upload.file.path)
+
+    def _post(self):
+        csv_file = SimpleUploadedFile("same.csv", self.content, content_type="text/csv")
+        return self.client.post(reverse('file-upload'), {"file": csv_file}, format="multipart")
+
+    @patch('files.views.enqueue_upload')
+    def test_upload_records_streaming_hash(self, mock_process_task):
+        response = self._post()
+
+        upload = FileUpload.objects.get(fileId=response.data["fileId"])
+        self.assertEqual(upload.content_sha256, hashlib.sha256(self.content).hexdigest())
+        self.assertEqual(upload.file_size, len(self.content))
+        mock_process_task.assert_called_once()
+
+    @patch('files.views.enqueue_upload')
+    def test_identical_completed_upload_is_linked_not_reprocessed(self, mock_process_task):
+        first = self._post()
+        schema = [{"name": "id", "type": "int"}, {"name": "name", "type": "string"}]
+        FileUpload.objects.filter(fileId=first.data["fileId"]).update(status="completed", rows_processed=2, schema=schema)
+
+        second = self._post()
+
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.data["status"], "completed")
+        self.assertEqual(str(second.data["duplicate_of"]), first.data["fileId"])
+        duplicate = FileUpload.objects.get(fileId=second.data["fileId"])
+        self.assertEqual(duplicate.rows_processed, 2)
+        self.assertEqual(duplicate.schema, schema)
+        self.assertEqual(duplicate.results_upload.fileId, duplicate.duplicate_of_id)
+        mock_process_task.assert_called_once()
+
+    @patch('files.views.enqueue_upload')
+    def test_identical_upload_still_in_flight_is_processed(self, mock_process_task):
+        self._post()
+        self._post()
+
+        self.assertEqual(mock_process_task.call_count, 2)
+
+    @patch('files.views.enqueue_upload')
+    def test_shared_blob_reuses_stored_file(self, mock_process_task):
+        first = self._post()
+        FileUpload.objects.filter(fileId=first.data["fileId"]).update(status="completed")
+
+        with self.settings(UPLOAD_DEDUP_SHARE_BLOB=True):
+            second = self._post()
+
+        original = FileUpload.objects.get(fileId=first.data["fileId"])
+        duplicate = FileUpload.objects.get(fileId=second.data["fileId"])
+        self.assertEqual(duplicate.file.name, original.file.name)
+
+    def test_deleting_an_original_hands_its_rows_to_the_oldest_duplicate(self):
+        others = [
+            User.objects.create_user(username=f"dedup{n}", email=f"dedup{n}@example.com", password="StrongPass123!")
+            for n in range(2)
+        ]
+        original = FileUpload.objects.create(user=self.user, status="completed", rows_processed=2)
+        ProcessedRow.objects.bulk_create([ProcessedRow(upload=original, row_number=n, data={"id": n}) for n in (1, 2)])
+        heir, other = [
+            FileUpload.objects.create(user=user, status="completed", rows_processed=2, duplicate_of=original)
+            for user in others
+        ]
+
+        # Deleting the owner cascades to the original
+        self.user.delete()
+
+        heir.refresh_from_db()
+        other.refresh_from_db()
+        self.assertIsNone(heir.duplicate_of)
+        self.assertEqual(other.duplicate_of, heir)
+        self.assertEqual(other.results_upload.rows.count(), 2)
+        self.assertEqual(list(heir.rows.order_by("row_number").values_list("data", flat=True)), [{"id": 1}, {"id": 2}])
+
+        heir.delete()
+
+        other.refresh_from_db()
+        self.assertIsNone(other.duplicate_of)
+        self.assertEqual(other.rows.count(), 2)
+
+    @patch('files.views.enqueue_upload')
+    def test_dedup_stats_reports_hit_rate(self, mock_process_task):
+        first = self._post()
+        FileUpload.objects.filter(fileId=first.data["fileId"]).update(status="completed")
+        self._post()
+
+        stats = dedup_stats()
+
+        self.assertEqual(stats["uploads"], 2)
+        self.assertEqual(stats["duplicates"], 1)
+        self.assertEqual(stats["hit_rate"], 0.5)
+        self.assertEqual(stats["bytes_deduplicated"], len(self.content))
+
+
+class CompressedUploadTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="gzipuser",
+            email="gzipuser@example.com",
+            password="StrongPass123!"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.content = b"id,name\n" + "".join(f"{i},name{i}\n" for i in range(200)).encode()
+
+    def tearDown(self):
+        for upload in FileUpload.objects.all():
+            if upload.file and os.path.exists(upload.file.path):
+                os.remove(upload.file.path)
+
+    def _post(self, name, data):
+        csv_file = SimpleUploadedFile(name, data, content_type="application/gzip")
+        return self.client.post(reverse('file-upload'), {"file": csv_file}, format="multipart")
+
+    @patch('files.tasks.send_mail')
+    @patch('files.views.enqueue_upload', side_effect=lambda upload: process_csv_file(str(upload.fileId)))
+    def test_gzipped_upload_is_processed(self, mock_enqueue, mock_send_mail):
+        compressed = gzip.compress(self.content)
+
+        response = self._post("data.csv.gz", compressed)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        upload = FileUpload.objects.get(fileId=response.data["fileId"])
+        self.assertEqual(upload.status, "completed")
+        self.assertEqual(upload.rows_processed, 200)
+        self.assertEqual(upload.compression, "gzip")
+        self.assertEqual(upload.file_size, len(self.content))
+        self.assertEqual(upload.transfer_size, len(compressed))
+        self.assertEqual(upload.content_sha256, hashlib.sha256(self.content).hexdigest())
+
+    @patch('files.views.enqueue_upload')
+    def test_plain_upload_is_gzipped_at_rest(self, mock_process_task):
+        response = self._post("data.csv", self.content)
+
+        upload = FileUpload.objects.get(fileId=response.data["fileId"])
+        self.assertTrue(upload.file.name.endswith(".csv.gz"))
+        with upload.file.open("rb") as f:
+            self.assertEqual(gzip.decompress(f.read()), self.content)
+        self.assertEqual(upload.transfer_size, len(self.content))
+        self.assertLess(upload.stored_size, len(self.content))
+
+        status_response = self.client.get(reverse('file-status-view', kwargs={'fileId': str(upload.fileId)}))
+        self.assertEqual(status_response.data["compression"], "gzip")
+        self.assertEqual(status_response.data["stored_size"], upload.stored_size)
+        self.assertEqual(compression_stats()["gzip"]["saved_bytes"], len(self.content) - upload.stored_size)
+
+    @patch('files.views.enqueue_upload')
+    def test_shardable_plain_upload_is_stored_uncompressed(self, mock_process_task):
+        with self.settings(CSV_SHARDING_ENABLED=True, CSV_SHARD_SIZE=100):
+            response = self._post("data.csv", self.content)
+
+        upload = FileUpload.objects.get(fileId=response.data["fileId"])
+        self.assertEqual(upload.compression, "")
+        self.assertEqual(upload.stored_size, len(self.content))
+
+    @patch('files.views.enqueue_upload')
+    def test_decompression_bomb_is_rejected(self, mock_process_task):
+        with self.settings(UPLOAD_MAX_SIZE=1024 * 1024):
+            response = self._post("bomb.csv.gz", gzip.compress(b"0" * (8 * 1024 * 1024)))
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("file", response.data)
+        mock_process_task.assert_not_called()
+
+    def test_corrupt_gzip_is_rejected(self):
+        response = self._post("data.csv.gz", b"not gzip at all")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(FileUpload.objects.count(), 0)
+
+    @patch('files.views.enqueue_upload')
+    def test_gzipped_and_plain_copies_deduplicate(self, mock_process_task):
+        first = self._post("data.csv", self.content)
+        FileUpload.objects.filter(fileId=first.data["fileId"]).update(status="completed")
+
+        second = self._post("data.csv.gz", gzip.compress(self.content))
+
+        self.assertEqual(str(second.data["duplicate_of"]), first.data["fileId"])
+
+
+class ValidationRulesViewTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="rulesviewuser",
+            email="rulesviewuser@example.com",
+            password="StrongPass123!"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.rules = {"columns": {"id": {"type": "int", "min": 1}}}
+
+    def tearDown(self):
+        for upload in FileUpload.objects.all():
+            for field_file in (upload.file, upload.error_report):
+                if field_file and os.path.exists(field_file.path):
+                    os.remove(field_file.path)
+
+    def _post(self, content, rules):
+        data = {"file": SimpleUploadedFile("rules.csv", content, content_type="text/csv")}
+        if rules is not None:
+            data["validation_rules"] = json.dumps(rules)
+        return self.client.post(reverse('file-upload'), data, format="multipart")
+
+    def test_invalid_rules_are_rejected(self):
+        response = self._post(b"id\n1\n", {"columns": {"id": {"min": 1}}})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("validation_rules", response.data)
+        self.assertFalse(FileUpload.objects.exists())
+
+    def test_invalid_transform_is_rejected(self):
+        csv_file = SimpleUploadedFile("rules.csv", b"id\n1\n", content_type="text/csv")
+        transform = json.dumps({"steps": [{"filter": "open('/etc/passwd')"}]})
+
+        response = self.client.post(
+            reverse('file-upload'), {"file": csv_file, "transform": transform}, format="multipart",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("transform", response.data)
+
+    @patch('files.tasks.send_mail')
+    @patch('files.views.enqueue_upload', side_effect=lambda upload: process_csv_file(str(upload.fileId)))
+    def test_error_report_is_downloadable_by_owner_only(self, mock_enqueue, mock_send_mail):
+        response = self._post(b"id\n1\n0\n", self.rules)
+        file_id = response.data["fileId"]
+        url = reverse('file-error-report', kwargs={"fileId": file_id})
+
+        status_response = self.client.get(reverse('file-status-view', kwargs={"fileId": file_id}))
+        report = self.client.get(url)
+
+        self.assertEqual(status_response.data["error_count"], 1)
+        self.assertEqual(report.status_code, status.HTTP_200_OK)
+        self.assertEqual(b"".join(report.streaming_content), b"row,column,value,error\r\n2,id,0,below minimum 1\r\n")
+
+        other = User.objects.create_user(username="other", email="other@example.com", password="StrongPass123!")
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+    @patch('files.tasks.send_mail')
+    @patch('files.views.enqueue_upload', side_effect=lambda upload: process_csv_file(str(upload.fileId)))
+    def test_same_content_with_other_rules_is_not_deduplicated(self, mock_enqueue, mock_send_mail):
+        first = self._post(b"id\n1\n0\n", self.rules)
+        without_rules = self._post(b"id\n1\n0\n", None)
+        same_rules = self._post(b"id\n1\n0\n", self.rules)
+
+        self.assertIsNone(without_rules.data["duplicate_of"])
+        self.assertEqual(str(same_rules.data["duplicate_of"]), first.data["fileId"])
+        duplicate = FileUpload.objects.get(fileId=same_rules.data["fileId"])
+        self.assertEqual(duplicate.error_count, 1)
+        self.assertEqual(duplicate.error_report.name, FileUpload.objects.get(fileId=first.data["fileId"]).error_report.name)
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="asyncuser",
+            email="asyncuser@example.com",
+            password="StrongPass123!"
+        )
+        self.headers = {"Authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+
+    def tearDown(self):
+        for upload in FileUpload.objects.all():
+            if upload.file and os.path.exists(upload.file.path):
+                os.remove(upload.file.path)
+
+    async def test_upload_creates_and_enqueues(self):
+        csv_file = SimpleUploadedFile("async.csv", b"id,name\n1,a\n", content_type="text/csv")
+        with patch("files.views.enqueue_upload") as mock_enqueue:
+            response = await self.async_client.post(
+                reverse("file-upload-async"), {"file": csv_file}, headers=self.headers,
+            )
+
+        self.assertEqual(response.status_code, 201)
+        upload = await FileUpload.objects.aget(fileId=response.json()["fileId"])
+        self.assertEqual(upload.user_id, self.user.id)
+        self.assertEqual(upload.status, "pending")
+        mock_enqueue.assert_called_once_with(upload)
+
+    async def test_upload_validation_matches_sync_view(self):
+        txt_file = SimpleUploadedFile("async.txt", b"invalid", content_type="text/plain")
+
+        response = await self.async_client.post(
+            reverse("file-upload-async"), {"file": txt_file}, headers=self.headers,
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"file": ["Only CSV files are allowed."]})
+
+    async def test_status_matches_sync_view(self):
+        upload = await FileUpload.objects.acreate(user=self.user, status="processing", rows_processed=3)
+        await cache.aclear()
+
+        response = await self.async_client.get(
+            reverse("file-status-async", kwargs={"fileId": str(upload.fileId)}), headers=self.headers,
+        )
+        cached = await self.async_client.get(
+            reverse("file-status-async", kwargs={"fileId": str(upload.fileId)}), headers=self.headers,
+        )
+        sync = await self.async_client.get(
+            reverse("file-status-view", kwargs={"fileId": str(upload.fileId)}), headers=self.headers,
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["rows_processed"], 3)
+        self.assertEqual(cached.json(), response.json())
+        self.assertEqual(sync.json(), response.json())
+
+    async def test_status_of_other_users_file_not_found(self):
+        other = await User.objects.acreate(username="asyncother", email="asyncother@example.com")
+        upload = await FileUpload.objects.acreate(user=other)
+
+        response = await self.async_client.get(
+            reverse("file-status-async", kwargs={"fileId": str(upload.fileId)}), headers=self.headers,
+        )
+
+        self.assertEqual(response.status_code, 404)
+
+    async def test_list_pages_match_sync_view(self):
+        for _ in range(3):
+            await FileUpload.objects.acreate(user=self.user)
+
+        first = await self.async_client.get(reverse("user-file-list-async"), {"page_size": 2}, headers=self.headers)
+        sync = await self.async_client.get(reverse("user-file-list"), {"page_size": 2}, headers=self.headers)
+        self.assertEqual([r["fileId"] for r in first.json()["results"]], [r["fileId"] for r in sync.json()["results"]])
+
+        second = await self.async_client.get(first.json()["next"], headers=self.headers)
+        self.assertEqual(len(second.json()["results"]), 1)
+        self.assertIsNone(second.json()["next"])
+
+    async def test_requires_authentication(self):
+        response = await self.async_client.get(reverse("user-file-list-async"))
+
+        self.assertEqual(response.status_code, 401)
+
+    async def test_malformed_authorization_header_is_unauthorized(self):
+        upload = await FileUpload.objects.acreate(user=self.user, status="completed")
+        urls = [
+            reverse("user-file-list-async"),
+            reverse("file-status-async", kwargs={"fileId": str(upload.fileId)}),
+            reverse("file-status-events", kwargs={"fileId": str(upload.fileId)}),
+            reverse("file-export", kwargs={"fileId": str(upload.fileId)}),
+        ]
+        for url in urls:
+            response = await self.async_client.get(url, headers={"Authorization": "Bearer a b"})
+            self.assertEqual(response.status_code, 401, url)
+
+
+class ExportViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="exportuser",
+            email="exportuser@example.com",
+            password="StrongPass123!"
+        )
+        self.upload = FileUpload.objects.create(
+            user=self.user, status="completed",
+            schema=[{"name": "id", "type": "int"}, {"name": "name", "type": "string"}, {"name": "ok", "type": "bool"}],
+        )
+        ProcessedRow.objects.bulk_create([
+            ProcessedRow(upload=self.upload, row_number=n, data={"id": n, "name": f"name {n}", "ok": n % 2 == 0})
+            for n in range(1, 301)
+        ])
+        self.url = reverse("file-export", kwargs={"fileId": str(self.upload.fileId)})
+        self.headers = {"Authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+        self.csv = "id,name,ok\r\n" + "".join(f"{n},name {n},{n % 2 == 0}\r\n" for n in range(1, 301))
+
+    async def _get(self, url=None, data=None, headers=None):
+        response = await self.async_client.get(url or self.url, data, headers={**self.headers, **(headers or {})})
+        if not response.streaming:
+            return response, [response.content]
+        return response, [chunk async for chunk in response.streaming_content]
+
+    async def test_streams_csv_in_bounded_chunks(self):
+        with self.settings(EXPORT_CHUNK_SIZE=1024, EXPORT_FETCH_SIZE=50):
+            response, chunks = await self._get()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertEqual(b"".join(chunks).decode(), self.csv)
+        self.assertGreater(len(chunks), 3)
+        self.assertTrue(all(len(chunk) < 2048 for chunk in chunks))
+
+    async def test_csv_columns_follow_the_header_and_transform(self):
+        await FileUpload.objects.filter(pk=self.upload.pk).aupdate(
+            schema=[{"name": "ok", "type": "bool"}, {"name": "id", "type": "int"}, {"name": "name", "type": "string"}],
+        )
+        _, chunks = await self._get()
+        self.assertEqual(b"".join(chunks).decode().splitlines()[:2], ["ok,id,name", "False,1,name 1"])
+
+        transformed = await FileUpload.objects.acreate(
+            user=self.user, status="completed", schema=[{"name": "a", "type": "int"}, {"name": "b", "type": "int"}],
+            transform={"steps": [{"derive": {"total": "a + b"}}, {"rename": {"a": "first"}}]},
+        )
+        await ProcessedRow.objects.acreate(upload=transformed, row_number=1, data={"total": 3, "b": 2, "first": 1})
+        _, chunks = await self._get(reverse("file-export", kwargs={"fileId": str(transformed.fileId)}))
+        self.assertEqual(b"".join(chunks).decode(), "first,b,total\r\n1,2,3\r\n")
+
+    async def test_empty_csv_still_has_a_header(self):
+        await ProcessedRow.objects.filter(upload=self.upload).adelete()
+
+        _, chunks = await self._get()
+
+        self.assertEqual(b"".join(chunks).decode(), "id,name,ok\r\n")
+
+    async def test_streams_ndjson(self):
+        response, chunks = await self._get(data={"output": "ndjson"})
+
+        lines = b"".join(chunks).decode().splitlines()
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertEqual(json.loads(lines[1]), {"id": 2, "name": "name 2", "ok": True})
+        self.assertEqual(len(lines), 300)
+
+    async def test_gzips_when_accepted(self):
+        response, chunks = await self._get(headers={"Accept-Encoding": "gzip, deflate"})
+        refused, plain = await self._get(headers={"Accept-Encoding": "gzip;q=0, identity"})
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(b"".join(chunks)).decode(), self.csv)
+        self.assertFalse(refused.has_header("Content-Encoding"))
+        self.assertEqual(b"".join(plain).decode(), self.csv)
+
+    async def test_range_requests_resume_the_same_bytes(self):
+        for accept_encoding in ("identity", "gzip"):
+            response, chunks = await self._get(headers={"Accept-Encoding": accept_encoding})
+            full, etag = b"".join(chunks), response["ETag"]
+
+            response, chunks = await self._get(headers={"Range": "bytes=100-", "Accept-Encoding": accept_encoding})
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(response["Content-Range"], f"bytes 100-{len(full) - 1}/{len(full)}")
+            self.assertEqual(b"".join(chunks), full[100:])
+
+            response, chunks = await self._get(
+                headers={"Range": "bytes=10-19", "If-Range": etag, "Accept-Encoding": accept_encoding},
+            )
+            self.assertEqual(b"".join(chunks), full[10:20])
+
+            _, chunks = await self._get(headers={"Range": "bytes=-5", "Accept-Encoding": accept_encoding})
+            self.assertEqual(b"".join(chunks), full[-5:])
+
+    async def test_range_without_cached_length_and_edge_cases(self):
+        await cache.aclear()
+        response, chunks = await self._get(headers={"Range": "bytes=0-9"})
+        self.assertEqual((response.status_code, b"".join(chunks)), (206, self.csv.encode()[:10]))
+
+        response, _ = await self._get(headers={"Range": f"bytes={len(self.csv)}-"})
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], f"bytes */{len(self.csv)}")
+
+        # A changed representation gets the whole body again
+        response, chunks = await self._get(headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+        self.assertEqual((response.status_code, b"".join(chunks).decode()), (200, self.csv))
+
+    async def test_duplicate_exports_its_originals_rows(self):
+        duplicate = await FileUpload.objects.acreate(user=self.user, status="completed", duplicate_of=self.upload)
+
+        _, chunks = await self._get(reverse("file-export", kwargs={"fileId": str(duplicate.fileId)}))
+
+        self.assertEqual(b"".join(chunks).decode(), self.csv)
+
+    async def test_rejects_unfinished_foreign_and_unauthenticated_requests(self):
+        pending = await FileUpload.objects.acreate(user=self.user)
+        other = await User.objects.acreate(username="exportother", email="exportother@example.com")
+
+        response, _ = await self._get(reverse("file-export", kwargs={"fileId": str(pending.fileId)}))
+        self.assertEqual(response.status_code, 409)
+        response, _ = await self._get(data={"output": "xml"})
+        self.assertEqual(response.status_code, 400)
+        response, _ = await self._get(headers={"Authorization": f"Bearer {AccessToken.for_user(other)}"})
+        self.assertEqual(response.status_code, 404)
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, 401)
+
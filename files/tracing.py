@@ -0,0 +1,171 @@
+import cProfile
+import contextvars
+import io
+import json
+import logging
+import os
+import pstats
+import secrets
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+_file_lock = threading.Lock()
+
+
+class Span:
+    """
+    One timed operation. Spans opened while another span is current become its
+    children; the finished spans of a trace are exported together when the root
+    span ends, so a task produces one write or one request.
+    """
+
+    def __init__(self, name, **attributes):
+        self.name = name
+        self.attributes = attributes
+        self.parent = _current_span.get()
+        self.root = self.parent.root if self.parent else self
+        self.trace_id = self.root.trace_id if self.parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.error = None
+        self.finished = [] if self.root is self else None
+        self._token = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def start(self):
+        self.start_ns = time.time_ns()
+        self._started = time.perf_counter_ns()
+        self._token = _current_span.set(self)
+        return self
+
+    def finish(self, error=None):
+        self.duration_ns = time.perf_counter_ns() - self._started
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        _current_span.reset(self._token)
+        self.root.finished.append(self)
+        if self.root is self:
+            export_spans(self.finished)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.finish(exc)
+        return False
+
+    def as_record(self):
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent.span_id if self.parent else None,
+            'name': self.name,
+            'start': datetime.fromtimestamp(self.start_ns / 1e9, tz=timezone.utc).isoformat(),
+            'duration_ms': self.duration_ns / 1e6,
+            'attributes': self.attributes,
+            'error': self.error,
+        }
+
+
+def span(name, **attributes):
+    return Span(name, **attributes)
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def otlp_payload(spans):
+    # OTLP/HTTP JSON encoding of one batch of spans
+    return {
+        'resourceSpans': [{
+            'resource': {'attributes': [
+                {'key': 'service.name', 'value': {'stringValue': settings.TRACING_SERVICE_NAME}},
+            ]},
+            'scopeSpans': [{
+                'scope': {'name': __name__},
+                'spans': [{
+                    'traceId': s.trace_id,
+                    'spanId': s.span_id,
+                    'parentSpanId': s.parent.span_id if s.parent else '',
+                    'name': s.name,
+                    'kind': 1,
+                    'startTimeUnixNano': str(s.start_ns),
+                    'endTimeUnixNano': str(s.start_ns + s.duration_ns),
+                    'attributes': [{'key': k, 'value': _otlp_value(v)} for k, v in s.attributes.items()],
+                    'status': {'code': 2, 'message': s.error} if s.error else {'code': 1},
+                } for s in spans],
+            }],
+        }],
+    }
+
+
+def _export_jsonl(spans):
+    lines = "".join(json.dumps(s.as_record(), default=str) + "\n" for s in spans)
+    with _file_lock, open(settings.TRACING_JSONL_PATH, 'a') as f:
+        f.write(lines)
+
+
+def _export_otlp(spans):
+    request = urllib.request.Request(
+        settings.TRACING_OTLP_ENDPOINT,
+        data=json.dumps(otlp_payload(spans), default=str).encode(),
+        headers={'Content-Type': 'application/json'},
+        method='POST',
+    )
+    with urllib.request.urlopen(request, timeout=5):
+        pass
+
+
+EXPORTERS = {'jsonl': _export_jsonl, 'otlp': _export_otlp}
+
+
+def export_spans(spans):
+    exporter = EXPORTERS.get(settings.TRACING_EXPORTER)
+    if exporter is None or not spans:
+        return
+    # Tracing is diagnostic only and must never fail the job it observes
+    try:
+        exporter(spans)
+    except (OSError, urllib.error.URLError) as e:
+        logger.warning(f"[TRACING] Could not export {len(spans)} span(s): {str(e)}")
+
+
+class TaskProfile:
+    """
+    cProfile capture for a single task run. The raw stats are dumped to
+    PROFILE_DIR for snakeviz/pstats and the top entries are logged.
+    """
+
+    def __init__(self, label):
+        self.label = label
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+        return self
+
+    def stop(self):
+        self.profile.disable()
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        path = os.path.join(settings.PROFILE_DIR, f"{self.label}-{time.strftime('%Y%m%d%H%M%S')}.prof")
+        self.profile.dump_stats(path)
+        summary = io.StringIO()
+        pstats.Stats(self.profile, stream=summary).sort_stats('cumulative').print_stats(15)
+        logger.info(f"[PROFILE] Wrote {path}\n{summary.getvalue()}")
+        return path
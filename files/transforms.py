@@ -0,0 +1,293 @@
+import ast
+import copy
+
+
+# A transform is a list of steps applied in order, e.g.
+#   {"steps": [{"filter": "amount is not None and amount > 10"},
+#              {"derive": {"total": "amount * qty", "name": "upper(name)"}},
+#              {"rename": {"amount": "net"}},
+#              {"select": ["id", "name", "net", "total"]},
+#              {"dedupe": ["id"]}]}
+# Expressions are a small, safe subset of Python over the current columns.
+STEPS = {'select', 'rename', 'filter', 'derive', 'dedupe'}
+
+
+# Expressions run on the workers over values from the file, so anything that
+# could build a huge value is checked before it is built. Running out of
+# memory is not a row error.
+# Longest string or bytes an expression may build
+MAX_VALUE_LENGTH = 100_000
+# Largest integer a multiplication may build
+MAX_INT_BITS = 64 * 1024
+# Most nodes an expression may have once column references are inlined
+MAX_EXPRESSION_NODES = 500
+
+
+def _check_length(length):
+    if length > MAX_VALUE_LENGTH:
+        raise ValueError(f"value longer than {MAX_VALUE_LENGTH}")
+
+
+def _coalesce(*values):
+    return next((value for value in values if value is not None), None)
+
+
+def _str(value):
+    # Lists and tuples are literals, but their repr could still be long
+    if isinstance(value, (list, tuple)):
+        raise TypeError("str() takes a single value")
+    text = str(value)
+    _check_length(len(text))
+    return text
+
+
+def _multiply(left, right):
+    if isinstance(left, (list, tuple)) or isinstance(right, (list, tuple)):
+        raise TypeError("lists and tuples cannot be repeated")
+    for sequence, count in ((left, right), (right, left)):
+        if isinstance(sequence, (str, bytes)) and isinstance(count, int):
+            _check_length(len(sequence) * count)
+    if isinstance(left, int) and isinstance(right, int) and left.bit_length() + right.bit_length() > MAX_INT_BITS:
+        raise ValueError(f"integer larger than {MAX_INT_BITS} bits")
+    return left * right
+
+
+def _add(left, right):
+    if isinstance(left, (str, bytes)) and isinstance(right, (str, bytes)):
+        _check_length(len(left) + len(right))
+    return left + right
+
+
+def _modulo(left, right):
+    # printf-style formatting can pad to any width
+    if isinstance(left, (str, bytes)):
+        raise TypeError("strings cannot be formatted with %")
+    return left % right
+
+
+FUNCTIONS = {
+    'upper': str.upper, 'lower': str.lower, 'strip': str.strip, 'len': len, 'abs': abs, 'round': round,
+    'min': min, 'max': max, 'str': _str, 'int': int, 'float': float, 'coalesce': _coalesce,
+}
+# Operators that go through the checked helpers above
+CHECKED_OPERATORS = {ast.Mult: '_multiply', ast.Add: '_add', ast.Mod: '_modulo'}
+ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare, ast.IfExp, ast.Call, ast.Name, ast.Load,
+    ast.Constant, ast.Tuple, ast.List,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.And, ast.Or, ast.Not, ast.USub, ast.UAdd,
+    ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.In, ast.NotIn, ast.Is, ast.IsNot,
+)
+# Raised by expressions on values they cannot handle; the row is rejected
+ROW_ERRORS = (ArithmeticError, TypeError, ValueError)
+
+_TEMPLATE = """
+def _transform(records, numbers, errors, seen, out, kept):
+    for number, row in zip(numbers, records):
+        try:
+            pass
+        except _ROW_ERRORS as e:
+            _fail(errors, number, e)
+"""
+
+
+class TransformError(ValueError):
+    pass
+
+
+def _fail(errors, number, error):
+    errors.append((number, '', '', f"transform failed: {error}"))
+
+
+class _Checked(ast.NodeTransformer):
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        helper = CHECKED_OPERATORS.get(type(node.op))
+        if helper is None:
+            return node
+        return ast.Call(ast.Name(helper, ast.Load()), [node.left, node.right], [])
+
+
+def _literal(node):
+    return isinstance(node, ast.Constant) or (
+        isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd))
+        and isinstance(node.operand, ast.Constant)
+    )
+
+
+def _bounded(tree):
+    if sum(1 for _ in ast.walk(tree)) > MAX_EXPRESSION_NODES:
+        raise TransformError(f"Expressions are limited to {MAX_EXPRESSION_NODES} nodes once columns are inlined.")
+    return tree
+
+
+def _parse_expression(source):
+    if not isinstance(source, str):
+        raise TransformError("Expressions must be strings.")
+    try:
+        tree = ast.parse(source, mode='eval')
+    except SyntaxError as e:
+        raise TransformError(f"Invalid expression '{source}': {e.msg}")
+    for node in ast.walk(tree):
+        if not isinstance(node, ALLOWED_NODES):
+            raise TransformError(f"Invalid expression '{source}': {type(node).__name__} is not allowed.")
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS or node.keywords:
+                raise TransformError(
+                    f"Invalid expression '{source}': only {', '.join(sorted(FUNCTIONS))} can be called."
+                )
+        if isinstance(node, (ast.List, ast.Tuple)) and not all(_literal(element) for element in node.elts):
+            raise TransformError(f"Invalid expression '{source}': lists and tuples may only hold constants.")
+    return _Checked().visit(tree).body
+
+
+def _names(value, step):
+    if not isinstance(value, list) or not value or not all(isinstance(name, str) for name in value):
+        raise TransformError(f"'{step}' must be a non-empty list of column names.")
+    return value
+
+
+def _mapping(value, step):
+    if not isinstance(value, dict) or not value or not all(isinstance(name, str) for name in value):
+        raise TransformError(f"'{step}' must map column names to {'names' if step == 'rename' else 'expressions'}.")
+    return value
+
+
+def parse_transform(spec):
+    """
+    Check ``spec`` and return a TransformSpec. Raises TransformError naming the
+    first problem found. Column names are checked when it is compiled against
+    a header.
+    """
+    if not isinstance(spec, dict) or set(spec) != {'steps'} or not isinstance(spec['steps'], list):
+        raise TransformError("A transform must be an object with a list of 'steps'.")
+    steps = []
+    for step in spec['steps']:
+        if not isinstance(step, dict) or len(step) != 1 or next(iter(step)) not in STEPS:
+            raise TransformError(f"Each step must be one of {', '.join(sorted(STEPS))}.")
+        kind, value = next(iter(step.items()))
+        if kind in ('select', 'dedupe'):
+            steps.append((kind, _names(value, kind)))
+        elif kind == 'rename':
+            if not all(isinstance(name, str) for name in _mapping(value, kind).values()):
+                raise TransformError("'rename' must map column names to names.")
+            steps.append((kind, dict(value)))
+        elif kind == 'derive':
+            steps.append((kind, [(name, _parse_expression(source)) for name, source in _mapping(value, kind).items()]))
+        else:
+            steps.append((kind, _parse_expression(value)))
+    return TransformSpec(steps)
+
+
+def _require(columns, names):
+    for name in names:
+        if name not in columns:
+            raise TransformError(f"Unknown column '{name}'.")
+
+
+class _Inline(ast.NodeTransformer):
+    # Replaces column references with the expression currently producing them
+    def __init__(self, columns):
+        self.columns = columns
+
+    def visit_Call(self, node):
+        node.args = [self.visit(arg) for arg in node.args]
+        return node
+
+    def visit_Name(self, node):
+        if node.id not in self.columns:
+            raise TransformError(f"Unknown column '{node.id}'.")
+        return copy.deepcopy(self.columns[node.id])
+
+
+class _Fill(ast.NodeTransformer):
+    # Fills the placeholder names of a statement template
+    def __init__(self, replacements):
+        self.replacements = replacements
+
+    def visit_Name(self, node):
+        return self.replacements.get(node.id, node)
+
+
+def _statement(source, **replacements):
+    return _Fill(replacements).visit(ast.parse(source).body[0])
+
+
+class TransformSpec:
+    def __init__(self, steps):
+        self.steps = steps
+        # Dedupe remembers every key it has seen, across batches
+        self.stateful = any(kind == 'dedupe' for kind, _ in steps)
+
+    def compile(self, header):
+        """
+        Compile the steps for ``header`` into a CompiledTransform. Every step
+        is inlined into a single loop over the rows of a batch: select and
+        rename only change which expressions build the output row, and
+        filters and dedupe become early ``continue`` statements.
+        """
+        columns = {name: ast.Subscript(ast.Name('row', ast.Load()), ast.Constant(name), ast.Load()) for name in header}
+        guards, dedupes = [], 0
+        for kind, value in self.steps:
+            if kind == 'select':
+                _require(columns, value)
+                columns = {name: columns[name] for name in value}
+            elif kind == 'rename':
+                _require(columns, value)
+                columns = {value.get(name, name): expression for name, expression in columns.items()}
+            elif kind == 'derive':
+                for name, tree in value:
+                    columns[name] = _bounded(_Inline(columns).visit(copy.deepcopy(tree)))
+            elif kind == 'filter':
+                condition = _bounded(_Inline(columns).visit(copy.deepcopy(value)))
+                guards.append(_statement("if not _condition: continue", _condition=condition))
+            else:
+                _require(columns, value)
+                key = ast.Tuple([copy.deepcopy(columns[name]) for name in value], ast.Load())
+                index = ast.Constant(dedupes)
+                guards += [
+                    _statement("key = _key", _key=key),
+                    _statement("if key in seen[_index]: continue", _index=index),
+                    _statement("seen[_index].add(key)", _index=index),
+                ]
+                dedupes += 1
+
+        output = ast.Dict([ast.Constant(name) for name in columns], list(columns.values()))
+        module = ast.parse(_TEMPLATE)
+        attempt = module.body[0].body[0].body[0]
+        attempt.body = guards + [_statement("out.append(_output)", _output=output), _statement("kept.append(number)")]
+        ast.fix_missing_locations(module)
+
+        namespace = {
+            '__builtins__': {}, 'zip': zip, '_ROW_ERRORS': ROW_ERRORS, '_fail': _fail,
+            '_multiply': _multiply, '_add': _add, '_modulo': _modulo, **FUNCTIONS,
+        }
+        exec(compile(module, '<transform>', 'exec'), namespace)
+        inputs = {
+            node.slice.value for node in ast.walk(module)
+            if isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name) and node.value.id == 'row'
+        }
+        return CompiledTransform(
+            namespace['_transform'], [name for name in header if name in inputs], list(columns), dedupes,
+        )
+
+
+class CompiledTransform:
+    """
+    A transform compiled for one header. ``input_columns`` are the only
+    columns it reads, so the rest can be dropped before coercion.
+    """
+
+    def __init__(self, function, input_columns, output_columns, dedupes):
+        self._function = function
+        self.input_columns = input_columns
+        self.output_columns = output_columns
+        self._seen = [set() for _ in range(dedupes)]
+
+    def __call__(self, records, numbers):
+        """
+        Return the transformed records that passed every filter, their row
+        numbers, and an error for every row an expression failed on.
+        """
+        errors, out, kept = [], [], []
+        self._function(records, numbers, errors, self._seen, out, kept)
+        return out, kept, errors
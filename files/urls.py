@@ -1,9 +1,23 @@
 from django.urls import path
-from files.views import FileUploadView, FileUploadStatusView, FileUploadListView
+from files.views import (
+    FileUploadView, FileUploadStatusView, FileUploadListView,
+    ChunkedUploadInitView, ChunkedUploadDetailView, ChunkedUploadFinalizeView,
+    FileUploadStatusBatchView, FileErrorReportView, file_export, file_status_events, file_list_async, file_status_async, file_upload_async,
+)
 
 
 urlpatterns = [
     path('upload/', FileUploadView.as_view(), name="file-upload"),
+    path('upload/chunked/', ChunkedUploadInitView.as_view(), name="chunked-upload-init"),
+    path('upload/chunked/<uuid:uploadId>/', ChunkedUploadDetailView.as_view(), name="chunked-upload-detail"),
+    path('upload/chunked/<uuid:uploadId>/finalize/', ChunkedUploadFinalizeView.as_view(), name="chunked-upload-finalize"),
+    path('status/batch/', FileUploadStatusBatchView.as_view(), name="file-status-batch"),
     path('status/<uuid:fileId>/', FileUploadStatusView.as_view(), name="file-status-view"),
+    path('status/<uuid:fileId>/errors/', FileErrorReportView.as_view(), name="file-error-report"),
+    path('status/<uuid:fileId>/events/', file_status_events, name="file-status-events"),
+    path('export/<uuid:fileId>/', file_export, name="file-export"),
     path('my-files/', FileUploadListView.as_view(), name="user-file-list"),
+    path('async/upload/', file_upload_async, name="file-upload-async"),
+    path('async/status/<uuid:fileId>/', file_status_async, name="file-status-async"),
+    path('async/my-files/', file_list_async, name="user-file-list-async"),
 ]
\ No newline at end of file
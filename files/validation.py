@@ -0,0 +1,206 @@
+import csv
+import io
+import re
+import tempfile
+from django.core.files import File
+from .schema import DATE, FLOAT, INT, PARSERS, STRING
+
+
+# A rule set is a JSON object such as
+#   {"required_columns": ["id"],
+#    "columns": {"id": {"type": "int", "min": 1, "unique": true},
+#                "email": {"required": true, "regex": "[^@]+@[^@]+"}}}
+# Types override the inferred schema; min/max need an int, float or date type.
+COLUMN_RULES = {'type', 'required', 'min', 'max', 'regex', 'unique'}
+RANGE_TYPES = (INT, FLOAT, DATE)
+
+
+class RuleError(ValueError):
+    pass
+
+
+def _required(values):
+    return [index for index, value in enumerate(values) if value is None or value == '']
+
+
+def _at_least(bound):
+    def find(values):
+        return [index for index, value in enumerate(values) if value is not None and value < bound]
+    return find
+
+
+def _at_most(bound):
+    def find(values):
+        return [index for index, value in enumerate(values) if value is not None and value > bound]
+    return find
+
+
+def _matching(pattern):
+    fullmatch = pattern.fullmatch
+
+    def find(values):
+        return [
+            index for index, value in enumerate(values)
+            if value is not None and value != '' and fullmatch(str(value)) is None
+        ]
+    return find
+
+
+def _unique():
+    # The only check with state: every value seen in the run is kept, so
+    # memory grows with the number of distinct values.
+    seen = set()
+
+    def find(values):
+        duplicates = []
+        for index, value in enumerate(values):
+            if value is None or value == '':
+                continue
+            if value in seen:
+                duplicates.append(index)
+            else:
+                seen.add(value)
+        return duplicates
+    return find
+
+
+def _bound(name, key, value, type_):
+    if type_ not in RANGE_TYPES:
+        raise RuleError(f"Column '{name}': '{key}' needs a type of int, float or date.")
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise RuleError(f"Column '{name}': '{key}' must be a number or an ISO date.")
+    try:
+        return PARSERS[type_](str(value))
+    except ValueError:
+        raise RuleError(f"Column '{name}': '{key}' is not a valid {type_}.")
+
+
+def compile_rules(spec):
+    """
+    Check ``spec`` and compile it into a RuleSet. Raises RuleError naming the
+    first problem found.
+    """
+    if not isinstance(spec, dict):
+        raise RuleError("Rules must be a JSON object.")
+    unknown = set(spec) - {'required_columns', 'columns'}
+    if unknown:
+        raise RuleError(f"Unknown rule keys: {', '.join(sorted(unknown))}")
+    required_columns = spec.get('required_columns', [])
+    if not isinstance(required_columns, list) or not all(isinstance(c, str) for c in required_columns):
+        raise RuleError("'required_columns' must be a list of column names.")
+    columns = spec.get('columns', {})
+    if not isinstance(columns, dict):
+        raise RuleError("'columns' must map column names to rules.")
+
+    types, checks, required = {}, [], list(required_columns)
+    for name, rule in columns.items():
+        if not isinstance(rule, dict):
+            raise RuleError(f"Column '{name}': rules must be an object.")
+        unknown = set(rule) - COLUMN_RULES
+        if unknown:
+            raise RuleError(f"Column '{name}': unknown rules {', '.join(sorted(unknown))}")
+        type_ = rule.get('type')
+        if type_ is not None:
+            if type_ != STRING and type_ not in PARSERS:
+                raise RuleError(f"Column '{name}': unknown type '{type_}'.")
+            types[name] = type_
+
+        column_checks = []
+        if rule.get('required'):
+            required.append(name)
+            column_checks.append(("required", _required))
+        if 'min' in rule:
+            bound = _bound(name, 'min', rule['min'], type_)
+            column_checks.append((f"below minimum {bound}", _at_least(bound)))
+        if 'max' in rule:
+            bound = _bound(name, 'max', rule['max'], type_)
+            column_checks.append((f"above maximum {bound}", _at_most(bound)))
+        if 'regex' in rule:
+            try:
+                pattern = re.compile(rule['regex'])
+            except (re.error, TypeError) as e:
+                raise RuleError(f"Column '{name}': invalid regex: {e}")
+            column_checks.append((f"does not match {rule['regex']}", _matching(pattern)))
+        if rule.get('unique'):
+            column_checks.append(("duplicate value", _unique()))
+        if column_checks:
+            checks.append((name, column_checks))
+    return RuleSet(list(dict.fromkeys(required)), types, checks)
+
+
+class RuleSet:
+    """
+    Compiled rules. ``check`` runs each column's checks over the whole column
+    of a batch, so the per-row work is a list comprehension per check.
+    """
+
+    def __init__(self, required_columns, types, checks):
+        self.required_columns = required_columns
+        self.types = types
+        self.checks = checks
+        # Every column the rules read
+        self.columns = set(required_columns) | set(types) | {name for name, _ in checks}
+
+    def missing_columns(self, header):
+        present = set(header)
+        return [name for name in self.required_columns if name not in present]
+
+    def check(self, records, numbers):
+        """
+        Return the records that pass every rule, their row numbers, and a
+        ``(row_number, column, value, message)`` error for every failed check.
+        """
+        bad = {}
+        for name, column_checks in self.checks:
+            values = [record.get(name) for record in records]
+            for message, find in column_checks:
+                for index in find(values):
+                    bad.setdefault(index, []).append((name, values[index], message))
+        if not bad:
+            return records, numbers, []
+        errors = [
+            (numbers[index], name, value, message)
+            for index in sorted(bad) for name, value, message in bad[index]
+        ]
+        keep = [index for index in range(len(records)) if index not in bad]
+        return [records[index] for index in keep], [numbers[index] for index in keep], errors
+
+
+class ErrorReport:
+    """
+    CSV of rejected rows (row, column, value, error), written as errors are
+    found. Only the first ``limit`` errors are written; the rest are counted
+    and summarised in a last line.
+    """
+    HEADER = ('row', 'column', 'value', 'error')
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.count = 0
+        self._buffer = None
+
+    def add(self, errors):
+        for row, column, value, message in errors:
+            self.count += 1
+            if self.count > self.limit:
+                continue
+            if self._buffer is None:
+                self._buffer = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+                self._text = io.TextIOWrapper(self._buffer, encoding='utf-8', newline='', write_through=True)
+                self._writer = csv.writer(self._text)
+                self._writer.writerow(self.HEADER)
+            self._writer.writerow((row, column, '' if value is None else value, message))
+
+    def save(self, field_file, name):
+        # Stores the report in ``field_file`` without saving the model
+        if self._buffer is None:
+            return
+        if self.count > self.limit:
+            self._writer.writerow(('', '', '', f"{self.count - self.limit} more error(s) not shown"))
+        self._text.detach()
+        self._buffer.seek(0)
+        try:
+            field_file.save(name, File(self._buffer), save=False)
+        finally:
+            self._buffer.close()
+            self._buffer = None
@@ -1,13 +1,44 @@
+import asyncio
+import json
+from asgiref.sync import sync_to_async
 from rest_framework import generics
+from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.parsers import MultiPartParser, FormParser
-from files.models import FileUpload
-from files.serializers import FileListSerializer, FileUploadSerializer, FileStatusSerializer
+from files.models import FileUpload, ChunkedUpload
+from files.serializers import (
+    FileListSerializer, FileUploadSerializer, FileStatusSerializer, ChunkedUploadSerializer,
+    ChunkedUploadFinalizeSerializer, FileStatusBatchSerializer,
+)
+from files.status_cache import (
+    STATUS_RECORD_ONLY, afill_status, aget_status_record, build_status_record, fill_status, fill_status_records,
+    get_status_record, get_status_records, public_status,
+)
+from files.pagination import KeysetPagination
+from files.list_cache import (
+    aget_user_files_page, aset_user_files_page, auser_files_page_key, get_user_files_page, set_user_files_page,
+    user_files_page_key,
+)
+from files.chunked import ChunkError, append_chunk, parse_content_range
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.exceptions import NotFound
-from files.tasks import process_csv_file
-from django.core.cache import cache
+from rest_framework.exceptions import NotFound, ValidationError
+from files.scheduling import enqueue_upload
+from files.dedup import SPEC_FIELDS, duplicate_fields, find_completed_original, hash_file, spec_digest
+from files.compression import CompressionError, compression_for, inspect_compressed, storage_fields
+from files.choices import COMPLETED
+from files.export import CONTENT_TYPES, CSV, Export, RangeNotSatisfiable, accepts_gzip, parse_range
+from files.metrics import record_cache
+from files.events import TERMINAL_STATUSES, format_sse, subscribe_status
+from users.authentication import CachedJWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
 
 
 class FileUploadView(generics.CreateAPIView):
@@ -17,9 +48,48 @@ class FileUploadView(generics.CreateAPIView):
     permission_classes = [IsAuthenticated]
 
     def perform_create(self, serializer):
-        upload = serializer.save(user=self.request.user)
-        process_csv_file.delay(str(upload.fileId))
-        
+        fields, original = _new_upload_fields(
+            serializer.validated_data['file'], _specs(serializer.validated_data),
+        )
+        upload = serializer.save(user=self.request.user, **fields)
+        if original is None:
+            enqueue_upload(upload)
+
+
+def _specs(data):
+    return {field: data.get(field) for field in SPEC_FIELDS}
+
+
+def _new_upload_fields(file, specs=None):
+    # Returns the FileUpload fields for a validated upload, and the completed
+    # original it duplicates, if any.
+    digest = getattr(file, 'sha256', None) or hash_file(file)
+    specs = specs or {}
+    spec_sha256 = spec_digest(specs)
+    original = find_completed_original(digest, spec_sha256)
+    fields = {
+        'content_sha256': digest,
+        'spec_sha256': spec_sha256,
+        **specs,
+        'file_size': getattr(file, 'decompressed_size', file.size),
+        'transfer_size': file.size,
+    }
+    if original is not None and settings.UPLOAD_DEDUP_SHARE_BLOB:
+        fields.update(file=original.file.name, compression=original.compression, stored_size=0)
+    else:
+        fields.update(storage_fields(file))
+    if original is not None:
+        # Identical content has already been processed: link to its results
+        # instead of queueing the same work again.
+        fields.update(duplicate_fields(original))
+    return fields, original
+
+
+def _status_data(request, record):
+    data = public_status(record)
+    data['file'] = request.build_absolute_uri(default_storage.url(record['file'])) if record['file'] else None
+    return data
+
     
 class FileUploadStatusView(generics.RetrieveAPIView):
     queryset = FileUpload.objects.all()
@@ -29,26 +99,422 @@ class FileUploadStatusView(generics.RetrieveAPIView):
 
     def get_object(self):
         try:
-            return FileUpload.objects.get(fileId=self.kwargs['fileId'], user=self.request.user)
+            return FileUpload.objects.only(*STATUS_RECORD_ONLY).get(fileId=self.kwargs['fileId'], user=self.request.user)
         except FileUpload.DoesNotExist:
             raise NotFound(detail="File not found.")
+
+    def retrieve(self, request, *args, **kwargs):
+        # The processing tasks write the record through on every transition, so
+        # the database is only consulted when the record has expired.
+        record = get_status_record(self.kwargs['fileId'])
+        record_cache('status', record is not None)
+        if record is None:
+            record = build_status_record(self.get_object())
+            fill_status(record)
+        if record['user_id'] != request.user.id:
+            raise NotFound(detail="File not found.")
+        return Response(_status_data(request, record))
+
+
+class FileErrorReportView(generics.GenericAPIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, fileId):
+        upload = FileUpload.objects.only('fileId', 'user_id', 'error_report').filter(
+            fileId=fileId, user=request.user,
+        ).first()
+        if upload is None or not upload.error_report:
+            raise NotFound(detail="No error report for this file.")
+        return FileResponse(
+            upload.error_report.open('rb'), as_attachment=True,
+            filename=f"{upload.fileId}-errors.csv", content_type='text/csv',
+        )
     
 
+class FileUploadStatusBatchView(generics.GenericAPIView):
+    serializer_class = FileStatusBatchSerializer
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        file_ids = list(dict.fromkeys(str(file_id) for file_id in serializer.validated_data['fileIds']))
+
+        # One cache round trip for every id, then a single query for the misses
+        records = get_status_records(file_ids)
+        misses = [file_id for file_id in file_ids if file_id not in records]
+        record_cache('status', True, len(file_ids) - len(misses))
+        record_cache('status', False, len(misses))
+        if misses:
+            uploads = FileUpload.objects.filter(fileId__in=misses, user=request.user).only(*STATUS_RECORD_ONLY)
+            loaded = [build_status_record(upload) for upload in uploads]
+            fill_status_records(loaded)
+            records.update((record['fileId'], record) for record in loaded)
+
+        results, not_found = [], []
+        for file_id in file_ids:
+            record = records.get(file_id)
+            if record is None or record['user_id'] != request.user.id:
+                not_found.append(file_id)
+            else:
+                results.append(public_status(record))
+        return Response({"results": results, "not_found": not_found})
+
+
 class FileUploadListView(generics.ListAPIView):
     serializer_class = FileListSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        user = self.request.user
-        cache_key = f"user_file_ids:{user.id}"
-        
-        # Try cached file IDs
-        cached_file_ids = cache.get(cache_key)
-        if cached_file_ids is not None:
-            return FileUpload.objects.filter(fileId__in=cached_file_ids, user=user).only('fileId', 'created_at')
-
-        # If not cached, fetch from DB
-        queryset = FileUpload.objects.filter(user=user).order_by('-created_at').only('fileId', 'created_at')
-        file_ids = list(queryset.values_list('fileId', flat=True))
-        cache.set(cache_key, file_ids, timeout=120)
-        return queryset
+        return FileUpload.objects.filter(user=self.request.user).only('fileId', 'created_at')
+
+    def list(self, request, *args, **kwargs):
+        # Rendered pages are cached per user and query; any change to the user's
+        # uploads bumps a version counter that is part of the key.
+        key = user_files_page_key(request.user.id, request.query_params)
+        data = get_user_files_page(key)
+        record_cache('my_files', data is not None)
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            set_user_files_page(key, data)
+        return Response(data)
+
+
+class ChunkedUploadInitView(generics.CreateAPIView):
+    serializer_class = ChunkedUploadSerializer
+    permission_classes = [IsAuthenticated]
+
+    def perform_create(self, serializer):
+        chunked = serializer.save(user=self.request.user)
+        # An empty file is reserved up front so every chunk is a plain append
+        chunked.file.save(chunked.filename, ContentFile(b''), save=True)
+
+
+class ChunkedUploadDetailView(generics.RetrieveAPIView):
+    serializer_class = ChunkedUploadSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return ChunkedUpload.objects.filter(user=self.request.user, upload__isnull=True)
+
+    def get_object(self):
+        try:
+            return self.get_queryset().get(uploadId=self.kwargs['uploadId'])
+        except ChunkedUpload.DoesNotExist:
+            raise NotFound(detail="Upload not found.")
+
+    def put(self, request, *args, **kwargs):
+        try:
+            start, length, total = parse_content_range(request.headers.get('Content-Range'))
+        except ChunkError as e:
+            raise ValidationError({"Content-Range": str(e)})
+        if length > settings.CHUNKED_UPLOAD_MAX_CHUNK_SIZE:
+            raise ValidationError({"detail": f"Chunks must not exceed {settings.CHUNKED_UPLOAD_MAX_CHUNK_SIZE} bytes."})
+
+        with transaction.atomic():
+            # The row lock serialises concurrent PUTs for the same upload
+            chunked = self.get_queryset().select_for_update().filter(uploadId=self.kwargs['uploadId']).first()
+            if chunked is None:
+                raise NotFound(detail="Upload not found.")
+            if start != chunked.offset:
+                return Response(
+                    {"detail": "Chunk does not start at the current offset.", "offset": chunked.offset},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            limit = chunked.total_size or total or settings.CHUNKED_UPLOAD_MAX_SIZE
+            if start + length > min(limit, settings.CHUNKED_UPLOAD_MAX_SIZE):
+                raise ValidationError({"detail": "Chunk extends past the declared file size."})
+
+            try:
+                chunked.offset = append_chunk(chunked, request.stream, length)
+            except ChunkError as e:
+                raise ValidationError({"detail": str(e)})
+            if chunked.total_size is None and total is not None:
+                chunked.total_size = total
+            chunked.save(update_fields=['offset', 'total_size', 'updated_at'])
+
+        return Response(self.get_serializer(chunked).data)
+
+
+class ChunkedUploadFinalizeView(ChunkedUploadDetailView):
+    http_method_names = ['post', 'options']
+
+    def post(self, request, *args, **kwargs):
+        options = ChunkedUploadFinalizeSerializer(data=request.data)
+        options.is_valid(raise_exception=True)
+        specs = _specs(options.validated_data)
+
+        with transaction.atomic():
+            # Locked like PUT, so a chunk still being written or a second
+            # finalize waits and then finds the upload changed or gone
+            chunked = self.get_queryset().select_for_update().filter(uploadId=self.kwargs['uploadId']).first()
+            if chunked is None:
+                raise NotFound(detail="Upload not found.")
+            if chunked.offset == 0:
+                raise ValidationError({"detail": "No data has been uploaded."})
+            if chunked.total_size is not None and chunked.offset != chunked.total_size:
+                raise ValidationError(
+                    {"detail": "Upload is incomplete.", "offset": chunked.offset, "total_size": chunked.total_size}
+                )
+
+            # The assembled file is already in place, so the FileUpload just points at it
+            compression = compression_for(chunked.filename)
+            if compression:
+                try:
+                    with chunked.file.open('rb') as f:
+                        file_size, digest = inspect_compressed(f, compression, settings.CHUNKED_UPLOAD_MAX_SIZE)
+                except CompressionError as e:
+                    raise ValidationError({"detail": str(e)})
+            else:
+                file_size, digest = chunked.offset, hash_file(chunked.file)
+            spec_sha256 = spec_digest(specs)
+            original = find_completed_original(digest, spec_sha256)
+            upload = FileUpload(
+                user=request.user, content_sha256=digest, spec_sha256=spec_sha256, **specs,
+                file_size=file_size, transfer_size=chunked.offset, stored_size=chunked.offset,
+                compression=compression or '',
+            )
+            upload.file.name = chunked.file.name
+            if original is not None:
+                for field, value in duplicate_fields(original).items():
+                    setattr(upload, field, value)
+            if original is not None and settings.UPLOAD_DEDUP_SHARE_BLOB:
+                transaction.on_commit(lambda: chunked.file.delete(save=False))
+                upload.file.name = original.file.name
+                upload.compression, upload.stored_size = original.compression, 0
+            elif compression is None:
+                # Kept at rest like a multipart upload: gzipped unless it will be sharded
+                stored = storage_fields(chunked.file)
+                chunked.file.close()
+                if stored['compression']:
+                    upload.file = stored['file']
+                    upload.compression, upload.stored_size = stored['compression'], stored['stored_size']
+                    transaction.on_commit(lambda: chunked.file.delete(save=False))
+            upload.save()
+            chunked.upload = upload
+            chunked.save(update_fields=['upload', 'updated_at'])
+            if original is None:
+                transaction.on_commit(lambda: enqueue_upload(upload))
+
+        return Response(FileUploadSerializer(upload, context=self.get_serializer_context()).data, status=status.HTTP_201_CREATED)
+
+
+
+async def _authenticate_jwt(request, allow_query_token=False):
+    # EventSource cannot set headers, so the event stream also accepts the
+    # access token as an ``access_token`` query parameter.
+    authenticator = CachedJWTAuthentication()
+    header = authenticator.get_header(request)
+    try:
+        if header:
+            # Raises AuthenticationFailed for a malformed header, e.g. "Bearer a b"
+            raw_token = authenticator.get_raw_token(header)
+        else:
+            raw_token = request.GET.get('access_token') if allow_query_token else None
+        if not raw_token:
+            return None
+        validated_token = authenticator.get_validated_token(raw_token)
+        return await authenticator.aget_user(validated_token)
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+def _unauthenticated():
+    return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+
+
+async def _status_event_stream(upload, client, pubsub):
+    loop = asyncio.get_running_loop()
+    try:
+        yield format_sse({'fileId': str(upload.fileId), 'status': upload.status})
+        if upload.status in TERMINAL_STATUSES:
+            return
+
+        deadline = loop.time() + settings.STATUS_EVENTS_TIMEOUT
+        while loop.time() < deadline:
+            message = await pubsub.get_message(
+                ignore_subscribe_messages=True, timeout=settings.STATUS_EVENTS_KEEPALIVE
+            )
+            if message is None:
+                yield ": keepalive\n\n"
+                continue
+            event = json.loads(message['data'])
+            yield format_sse(event)
+            if event['status'] in TERMINAL_STATUSES:
+                return
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.aclose()
+        await client.aclose()
+
+
+async def file_status_events(request, fileId):
+    """
+    Server-Sent Events stream of status transitions for one upload. The stream
+    opens with the current status and closes after a terminal status or
+    STATUS_EVENTS_TIMEOUT seconds. Serve it through the ASGI application.
+    """
+    user = await _authenticate_jwt(request, allow_query_token=True)
+    if user is None:
+        return _unauthenticated()
+
+    # Subscribe before reading the current status so no transition falls in between
+    client, pubsub = await subscribe_status(fileId)
+    try:
+        upload = await FileUpload.objects.only('fileId', 'status').aget(fileId=fileId, user=user)
+    except FileUpload.DoesNotExist:
+        await pubsub.aclose()
+        await client.aclose()
+        return JsonResponse({"detail": "File not found."}, status=404)
+
+    response = StreamingHttpResponse(
+        _status_event_stream(upload, client, pubsub), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def _pull_in_thread(iterator):
+    # Under ASGI a sync iterator would be read to the end before anything is
+    # sent, so chunks are pulled one at a time. Every pull runs on the
+    # request's thread, which keeps the database cursor on one connection.
+    pull = sync_to_async(next)
+    try:
+        while True:
+            chunk = await pull(iterator, None)
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        await sync_to_async(iterator.close)()
+
+
+@require_GET
+async def file_export(request, fileId):
+    """
+    Stream the processed rows of a completed upload as CSV, or NDJSON with
+    ``?output=ndjson``. The body is gzipped when the client accepts it, and a
+    single byte ``Range`` is honoured so interrupted downloads can resume.
+    """
+    user = await _authenticate_jwt(request)
+    if user is None:
+        return _unauthenticated()
+    output = request.GET.get('output', CSV)
+    if output not in CONTENT_TYPES:
+        return JsonResponse({"detail": f"output must be one of {', '.join(CONTENT_TYPES)}."}, status=400)
+    upload = await FileUpload.objects.select_related('duplicate_of').filter(fileId=fileId, user=user).afirst()
+    if upload is None:
+        return JsonResponse({"detail": "File not found."}, status=404)
+    if upload.status != COMPLETED:
+        return JsonResponse({"detail": "File has not finished processing."}, status=409)
+
+    export = Export(upload, output, gzip=accepts_gzip(request.headers.get('Accept-Encoding', '')))
+    byte_range = None
+    # A range is only served from the representation the client already has
+    range_header = request.headers.get('Range')
+    if range_header and request.headers.get('If-Range', export.etag) == export.etag:
+        length = await sync_to_async(export.length)()
+        try:
+            byte_range = parse_range(range_header, length)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f"bytes */{length}"
+            return response
+    else:
+        length = await sync_to_async(export.cached_length)()
+
+    response = StreamingHttpResponse(
+        _pull_in_thread(export.chunks(byte_range)), content_type=export.content_type,
+        status=206 if byte_range else 200,
+    )
+    if byte_range:
+        start, end = byte_range
+        response['Content-Range'] = f"bytes {start}-{end}/{length}"
+        response['Content-Length'] = end - start + 1
+    elif length is not None:
+        response['Content-Length'] = length
+    if export.gzip:
+        response['Content-Encoding'] = 'gzip'
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = export.etag
+    response['Vary'] = 'Accept-Encoding'
+    response['Content-Disposition'] = f'attachment; filename="{upload.fileId}.{output}"'
+    return response
+
+
+# Async versions of the upload, status and my-files endpoints, for the ASGI
+# server. They return the same responses as the DRF views above, but wait on
+# the database, cache and broker without holding a thread.
+
+@csrf_exempt
+@require_POST
+async def file_upload_async(request):
+    user = await _authenticate_jwt(request)
+    if user is None:
+        return _unauthenticated()
+
+    # Parsing the multipart body and validating it (which may decompress the
+    # file) read local temporary files, so they run off the event loop.
+    def validate():
+        data = request.POST.copy()
+        data.update(request.FILES)
+        serializer = FileUploadSerializer(data=data, context={'request': request})
+        serializer.is_valid()
+        return serializer
+
+    serializer = await sync_to_async(validate)()
+    if serializer.errors:
+        return JsonResponse(serializer.errors, status=400)
+
+    fields, original = await sync_to_async(_new_upload_fields)(
+        serializer.validated_data['file'], _specs(serializer.validated_data),
+    )
+    upload = await FileUpload.objects.acreate(user=user, **fields)
+    if original is None:
+        # Publishing to Redis and the broker blocks, but needs no thread affinity
+        await sync_to_async(enqueue_upload, thread_sensitive=False)(upload)
+    data = FileUploadSerializer(upload, context={'request': request}).data
+    return JsonResponse(data, status=201)
+
+
+@require_GET
+async def file_status_async(request, fileId):
+    user = await _authenticate_jwt(request)
+    if user is None:
+        return _unauthenticated()
+
+    record = await aget_status_record(fileId)
+    record_cache('status', record is not None)
+    if record is None:
+        try:
+            upload = await FileUpload.objects.only(*STATUS_RECORD_ONLY).aget(fileId=fileId, user=user)
+        except FileUpload.DoesNotExist:
+            return JsonResponse({"detail": "File not found."}, status=404)
+        record = build_status_record(upload)
+        await afill_status(record)
+    if record['user_id'] != user.id:
+        return JsonResponse({"detail": "File not found."}, status=404)
+    return JsonResponse(_status_data(request, record))
+
+
+@require_GET
+async def file_list_async(request):
+    user = await _authenticate_jwt(request)
+    if user is None:
+        return _unauthenticated()
+
+    key = await auser_files_page_key(user.id, request.GET)
+    data = await aget_user_files_page(key)
+    record_cache('my_files', data is not None)
+    if data is None:
+        paginator = KeysetPagination()
+        queryset = FileUpload.objects.filter(user=user).only('fileId', 'created_at')
+        try:
+            page = await paginator.apaginate_queryset(queryset, Request(request))
+        except NotFound as e:
+            return JsonResponse({"detail": str(e.detail)}, status=404)
+        data = paginator.get_paginated_response(FileListSerializer(page, many=True).data).data
+        await aset_user_files_page(key, data)
+    return JsonResponse(data)
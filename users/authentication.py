@@ -0,0 +1,63 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+
+def user_cache_key(user_id):
+    return f"auth_user:{user_id}"
+
+
+def invalidate_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+def _user_id(validated_token):
+    try:
+        return validated_token[api_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise InvalidToken("Token contained no recognizable user identification")
+
+
+def _cached_fields():
+    # Everything but the password hash, which stays out of the cache
+    return [field.attname for field in get_user_model()._meta.concrete_fields if field.attname != 'password']
+
+
+def _to_cache(user):
+    return {name: getattr(user, name) for name in _cached_fields()}
+
+
+def _from_cache(record):
+    # Built as if loaded with .defer('password'): reading the hash fetches it,
+    # and save() leaves it untouched
+    names = _cached_fields()
+    return get_user_model().from_db('default', names, [record[name] for name in names])
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that keeps the resolved user in the cache for
+    AUTH_USER_CACHE_TIMEOUT seconds, so requests on a warm cache run no
+    authentication queries. Only users that passed the active and revocation
+    checks are cached, without their password hash, and saving or deleting a
+    user drops its entry.
+    """
+
+    def get_user(self, validated_token):
+        key = user_cache_key(_user_id(validated_token))
+        record = cache.get(key)
+        if record is not None:
+            return _from_cache(record)
+        user = super().get_user(validated_token)
+        cache.set(key, _to_cache(user), timeout=settings.AUTH_USER_CACHE_TIMEOUT)
+        return user
+
+    async def aget_user(self, validated_token):
+        record = await cache.aget(user_cache_key(_user_id(validated_token)))
+        if record is not None:
+            return _from_cache(record)
+        return await sync_to_async(self.get_user)(validated_token)
@@ -0,0 +1,73 @@
+import logging
+import redis
+from django.conf import settings
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+
+logger = logging.getLogger(__name__)
+
+# Blacklisted refresh token JTIs are mirrored into a Redis sorted set scored by
+# token expiry, so the blacklist check on refresh is one ZSCORE instead of a
+# join across the blacklist tables. The set is filled from the database when
+# the loaded marker is missing (first use, Redis restart, marker expiry) and
+# new entries are added as tokens are blacklisted.
+BLACKLIST_KEY = "jwt_blacklist:jtis"
+LOADED_KEY = "jwt_blacklist:loaded"
+LOAD_BATCH_SIZE = 1000
+
+_client = None
+
+
+def get_redis():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.REDIS_URL)
+    return _client
+
+
+def load_blacklist(client):
+    # Adds to the set rather than replacing it, so JTIs blacklisted while the
+    # load runs are never lost.
+    now = timezone.now()
+    rows = (
+        BlacklistedToken.objects.filter(token__expires_at__gt=now)
+        .values_list('token__jti', 'token__expires_at')
+        .iterator(chunk_size=LOAD_BATCH_SIZE)
+    )
+    pipe = client.pipeline()
+    batch = {}
+    for jti, expires_at in rows:
+        batch[jti] = expires_at.timestamp()
+        if len(batch) >= LOAD_BATCH_SIZE:
+            pipe.zadd(BLACKLIST_KEY, batch)
+            batch = {}
+    if batch:
+        pipe.zadd(BLACKLIST_KEY, batch)
+    # Expired tokens are rejected on their exp claim alone
+    pipe.zremrangebyscore(BLACKLIST_KEY, '-inf', now.timestamp())
+    pipe.set(LOADED_KEY, 1, ex=settings.JWT_BLACKLIST_RELOAD_SECONDS)
+    pipe.execute()
+
+
+def add_to_blacklist(jti, expires_at):
+    try:
+        get_redis().zadd(BLACKLIST_KEY, {jti: expires_at.timestamp()})
+    except redis.RedisError as e:
+        logger.warning(f"[AUTH] Could not cache blacklisted token {jti}: {str(e)}")
+        try:
+            # Force a reload from the database on the next check
+            get_redis().delete(LOADED_KEY)
+        except redis.RedisError:
+            pass
+
+
+def is_blacklisted(jti):
+    try:
+        client = get_redis()
+        if not client.exists(LOADED_KEY):
+            load_blacklist(client)
+        return client.zscore(BLACKLIST_KEY, jti) is not None
+    except redis.RedisError as e:
+        logger.warning(f"[AUTH] Blacklist cache unavailable, checking the database: {str(e)}")
+        return BlacklistedToken.objects.filter(token__jti=jti).exists()
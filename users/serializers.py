@@ -1,6 +1,8 @@
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer as BaseTokenRefreshSerializer
 from users.models import User
 from users.validators import validate_special_character
+from users.tokens import CachedBlacklistRefreshToken
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -23,3 +25,6 @@ class UserSerializer(serializers.ModelSerializer):
         user = User.objects.create_user(**validated_data)
         return user
 
+
+class TokenRefreshSerializer(BaseTokenRefreshSerializer):
+    token_class = CachedBlacklistRefreshToken
@@ -0,0 +1,26 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from users.authentication import invalidate_user
+from users.blacklist import add_to_blacklist
+from users.models import User
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, **kwargs):
+    # Covers deactivation and password changes. QuerySet.update() sends no
+    # signal, so bulk updates stay cached for up to AUTH_USER_CACHE_TIMEOUT.
+    invalidate_user(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def token_blacklisted(sender, instance, created, **kwargs):
+    if created:
+        token = instance.token
+        transaction.on_commit(lambda: add_to_blacklist(token.jti, token.expires_at))
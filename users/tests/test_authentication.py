@@ -0,0 +1,123 @@
+from datetime import timedelta
+from unittest.mock import patch
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+from files.models import FileUpload
+from files.tests.fakes import FakeRedis
+from users.authentication import CachedJWTAuthentication, user_cache_key
+from users.blacklist import BLACKLIST_KEY, is_blacklisted
+from users.models import User
+import redis
+
+
+class CachedJWTAuthenticationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="authcache", email="authcache@example.com", password="StrongPass123!"
+        )
+        self.upload = FileUpload.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+        self.status_url = reverse("file-status-view", kwargs={"fileId": str(self.upload.fileId)})
+
+    def test_hot_status_and_list_requests_run_no_queries(self):
+        self.client.get(self.status_url)
+        self.client.get(reverse("user-file-list"))
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.status_url).status_code, 200)
+            self.assertEqual(self.client.get(reverse("user-file-list")).status_code, 200)
+
+    def test_password_hash_is_not_cached(self):
+        self.client.get(self.status_url)
+
+        record = cache.get(user_cache_key(self.user.pk))
+        self.assertNotIn("password", record)
+        self.assertEqual(record["email"], "authcache@example.com")
+
+    def test_saving_a_cached_user_keeps_the_password(self):
+        self.client.get(self.status_url)
+        token = AccessToken.for_user(self.user)
+        user = CachedJWTAuthentication().get_user(token)
+
+        user.first_name = "Ann"
+        user.save()
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, "Ann")
+        self.assertTrue(self.user.check_password("StrongPass123!"))
+
+    def test_deactivated_user_is_rejected_immediately(self):
+        self.assertEqual(self.client.get(self.status_url).status_code, 200)
+
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(self.client.get(self.status_url).status_code, 401)
+
+    def test_deleted_user_is_rejected(self):
+        self.client.get(self.status_url)
+
+        self.user.delete()
+
+        self.assertEqual(self.client.get(reverse("user-file-list")).status_code, 401)
+
+
+class BlacklistCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="blacklistcache", email="blacklistcache@example.com", password="TestPass!123"
+        )
+        self.redis = FakeRedis()
+        patcher = patch("users.blacklist.get_redis", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _login(self):
+        response = self.client.post(reverse("token_obtain_pair"), {
+            "email": "blacklistcache@example.com", "password": "TestPass!123",
+        })
+        return response.json()["refresh"]
+
+    def _blacklist(self, jti, expires_in):
+        token = OutstandingToken.objects.create(
+            user=self.user, jti=jti, token="x", expires_at=timezone.now() + expires_in,
+        )
+        return BlacklistedToken.objects.create(token=token)
+
+    def test_first_check_loads_unexpired_entries_from_the_database(self):
+        self._blacklist("live", timedelta(hours=1))
+        self._blacklist("expired", timedelta(hours=-1))
+
+        self.assertTrue(is_blacklisted("live"))
+        self.assertFalse(is_blacklisted("expired"))
+        self.assertEqual(set(self.redis.data[BLACKLIST_KEY]), {"live"})
+
+        with self.assertNumQueries(0):
+            self.assertFalse(is_blacklisted("other"))
+
+    def test_rotated_refresh_token_is_rejected_from_the_cache(self):
+        old_refresh = self._login()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("token_refresh"), {"refresh": old_refresh})
+        self.assertEqual(response.status_code, 200)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse("token_refresh"), {"refresh": old_refresh})
+
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(any("blacklistedtoken" in q["sql"] for q in queries.captured_queries))
+
+    def test_redis_outage_falls_back_to_the_database(self):
+        self._blacklist("live", timedelta(hours=1))
+
+        with patch.object(self.redis, "exists", side_effect=redis.ConnectionError("down")):
+            self.assertTrue(is_blacklisted("live"))
+            self.assertFalse(is_blacklisted("other"))
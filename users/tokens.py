@@ -0,0 +1,11 @@
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from users.blacklist import is_blacklisted
+
+
+class CachedBlacklistRefreshToken(RefreshToken):
+    # Checks the blacklist through the Redis mirror instead of the database
+    def check_blacklist(self):
+        if is_blacklisted(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError("Token is blacklisted")